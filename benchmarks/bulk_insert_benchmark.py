@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+import tempfile
+import time
+
+import pandas as pd
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from market_data_loader import database, models
+from market_data_loader.models import StockPrice
+
+FETCH_LIMIT = 1000
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Compare per-row ORM inserts with bulk inserts"
+    )
+    parser.add_argument(
+        "--symbols", default=10, help="number of symbols (default: 10)", type=int
+    )
+    parser.add_argument(
+        "--years", default=10, help="number of years (default: 10)", type=int
+    )
+    return parser.parse_args()
+
+
+def generate_pages(num_symbols, num_years):
+    end_date = datetime.date(2021, 12, 31)
+    start_date = end_date.replace(year=end_date.year - num_years)
+    dates = [date.date() for date in pd.bdate_range(start_date, end_date)]
+
+    rows = [
+        {
+            "date": date,
+            "symbol": f"SYM{symbol_index}",
+            "close_price": 100.0 + day_index,
+            "exchange": "XNAS",
+        }
+        for symbol_index in range(num_symbols)
+        for day_index, date in enumerate(dates)
+    ]
+
+    return [rows[i : i + FETCH_LIMIT] for i in range(0, len(rows), FETCH_LIMIT)]
+
+
+def insert_per_row(session, rows):
+    for row in rows:
+        session.add(StockPrice(**row))
+
+
+def insert_bulk(session, rows):
+    database.insert_or_ignore(session, StockPrice.__table__, rows)
+
+
+def run(insert_fn, pages):
+    with tempfile.NamedTemporaryFile(suffix=".db") as db_file:
+        engine = sa.create_engine(f"sqlite:///{db_file.name}")
+        models.Base.metadata.create_all(engine)
+        db_sessionmaker = orm.sessionmaker(bind=engine, expire_on_commit=False)
+
+        start_time = time.perf_counter()
+
+        # One transaction per page, like when loading from the API
+        for rows in pages:
+            with database.begin_write(db_sessionmaker) as session:
+                insert_fn(session, rows)
+
+        elapsed = time.perf_counter() - start_time
+
+        engine.dispose()
+
+    return elapsed
+
+
+def main():
+    args = parse_arguments()
+
+    pages = generate_pages(args.symbols, args.years)
+    num_rows = sum(len(rows) for rows in pages)
+
+    print(
+        f"{args.symbols} symbols x {args.years} years: "
+        f"{num_rows} rows in {len(pages)} pages"
+    )
+
+    for name, insert_fn in [("per-row", insert_per_row), ("bulk", insert_bulk)]:
+        elapsed = run(insert_fn, pages)
+        print(f"{name:>8}: {elapsed:7.2f}s {num_rows / elapsed:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+import argparse
+import concurrent.futures
+import datetime
+import os
+import tempfile
+import time
+
+import pandas as pd
+import sqlalchemy as sa
+
+from market_data_loader import coverage, database, models
+from market_data_loader.models import StockPrice, StockPriceCoverage
+
+PAGE_SIZE = 250
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Compare SQLite profiles with concurrent writer processes"
+    )
+    parser.add_argument(
+        "--processes",
+        default=4,
+        help="number of writer processes (default: 4)",
+        type=int,
+    )
+    parser.add_argument(
+        "--years", default=4, help="number of years per process (default: 4)", type=int
+    )
+    return parser.parse_args()
+
+
+def write_symbol(settings, symbol, num_years):
+    # Loads the prices of one symbol page by page, like a separate loader
+    # process would. Returns the number of rows written and lock errors.
+    db_sessionmaker = database.create_sessionmaker(settings)
+
+    end_date = datetime.date(2021, 12, 31)
+    start_date = end_date.replace(year=end_date.year - num_years)
+    dates = [date.date() for date in pd.bdate_range(start_date, end_date)]
+
+    num_rows = 0
+    num_lock_errors = 0
+
+    for i in range(0, len(dates), PAGE_SIZE):
+        page_dates = dates[i : i + PAGE_SIZE]
+        rows = [
+            {"date": date, "symbol": symbol, "close_price": 100.0, "exchange": "XNAS"}
+            for date in page_dates
+        ]
+
+        try:
+            with database.begin_write(db_sessionmaker) as session:
+                database.insert_or_ignore(session, StockPrice.__table__, rows)
+                coverage.add_interval(
+                    session,
+                    StockPriceCoverage.__table__,
+                    page_dates[0],
+                    page_dates[-1],
+                    symbol=symbol,
+                )
+        except sa.exc.OperationalError as err:
+            if "database is locked" not in str(err):
+                raise
+
+            num_lock_errors += 1
+        else:
+            num_rows += len(rows)
+
+    db_sessionmaker.kw["bind"].dispose()
+
+    return num_rows, num_lock_errors
+
+
+def run(sqlite_profile, num_processes, num_years):
+    with tempfile.TemporaryDirectory() as db_dir:
+        settings = dict(
+            database.DEFAULT_SETTINGS,
+            uri=f"sqlite:///{os.path.join(db_dir, 'benchmark.db')}",
+            sqlite_profile=sqlite_profile,
+        )
+
+        engine = database.create_engine(settings)
+        models.Base.metadata.create_all(engine)
+        engine.dispose()
+
+        start_time = time.perf_counter()
+
+        with concurrent.futures.ProcessPoolExecutor(num_processes) as executor:
+            results = list(
+                executor.map(
+                    write_symbol,
+                    [settings] * num_processes,
+                    [f"SYM{index}" for index in range(num_processes)],
+                    [num_years] * num_processes,
+                )
+            )
+
+        elapsed = time.perf_counter() - start_time
+
+    num_rows = sum(rows for rows, _ in results)
+    num_lock_errors = sum(lock_errors for _, lock_errors in results)
+
+    return elapsed, num_rows, num_lock_errors
+
+
+def main():
+    args = parse_arguments()
+
+    print(f"{args.processes} writer processes x {args.years} years")
+
+    for sqlite_profile in ["default", "tuned"]:
+        elapsed, num_rows, num_lock_errors = run(
+            sqlite_profile, args.processes, args.years
+        )
+        print(
+            f"{sqlite_profile:>8}: {elapsed:7.2f}s {num_rows / elapsed:10.0f} rows/s "
+            f"{num_lock_errors:5d} lock errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+import json
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import requests_mock
+
+from market_data_loader import (
+    conversion,
+    currency,
+    database,
+    frame_cache,
+    models,
+    output,
+    scheduler,
+    stock,
+    trading_calendar,
+)
+from market_data_loader.models import StockPrice
+
+FETCH_LIMIT = 1000
+END_DATE = datetime.date(2021, 12, 31)
+# Dates fetched through the mocked MarketStack API after the seeded range
+FETCH_START_DATE = datetime.date(2022, 1, 3)
+FETCH_END_DATE = datetime.date(2022, 12, 30)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "hot_paths.json")
+# Read-only stages are repeated until they ran this long, and the fastest run
+# is reported, so that short stages aren't dominated by noise
+MIN_STAGE_SECONDS = 1.0
+MAX_STAGE_RUNS = 10
+# Relative throughput drop or peak memory growth reported as a regression
+TOLERANCE = 0.5
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Measure the throughput and peak memory of the loader hot paths"
+    )
+    parser.add_argument(
+        "--symbols",
+        default="1,100,1000",
+        help="comma-separated numbers of symbols (default: 1,100,1000)",
+    )
+    parser.add_argument(
+        "--years", default=20, help="number of years (default: 20)", type=int
+    )
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE_PATH,
+        help="baseline results file (default: benchmarks/baselines/hot_paths.json)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as the new baseline",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="measure the peak memory of every stage, which slows the stages down",
+    )
+    parser.add_argument(
+        "--tolerance",
+        default=TOLERANCE,
+        help=f"allowed relative regression (default: {TOLERANCE})",
+        type=float,
+    )
+    return parser.parse_args()
+
+
+class Stages:
+    # Runs the stages in order and records their throughput and peak memory.
+    # Memory is traced while the stage runs, so the throughput is several times
+    # lower than without tracing, but comparable between traced runs.
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def run(self, name, num_items, fn, *args, repeat=False):
+        elapsed = None
+        total_elapsed = 0.0
+        num_runs = 0
+
+        while elapsed is None or (
+            repeat and total_elapsed < MIN_STAGE_SECONDS and num_runs < MAX_STAGE_RUNS
+        ):
+            frame_cache.CACHE.clear()
+
+            if self.trace_memory:
+                tracemalloc.start()
+
+            start_time = time.perf_counter()
+
+            result = fn(*args)
+
+            run_elapsed = time.perf_counter() - start_time
+            peak_memory = None
+
+            if self.trace_memory:
+                _, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            elapsed = run_elapsed if elapsed is None else min(elapsed, run_elapsed)
+            total_elapsed += run_elapsed
+            num_runs += 1
+
+        self.results[name] = {
+            "items": num_items,
+            "seconds": elapsed,
+            "throughput": num_items / elapsed,
+            "peak_memory": peak_memory,
+        }
+
+        memory = f"{peak_memory / 2**20:9.1f} MiB" if self.trace_memory else ""
+
+        print(
+            f"{name:>28}: {num_items:9d} items {elapsed:8.3f}s "
+            f"{num_items / elapsed:12.0f} items/s {memory}"
+        )
+
+        return result
+
+
+def generate_pages(symbols, dates):
+    rows = [
+        {
+            "date": date,
+            "symbol": symbol,
+            "close_price": 100.0 + day_index % 50,
+            "exchange": "XNAS",
+        }
+        for symbol in symbols
+        for day_index, date in enumerate(dates)
+    ]
+
+    return [rows[i : i + FETCH_LIMIT] for i in range(0, len(rows), FETCH_LIMIT)]
+
+
+def generate_eod_pages(symbols, dates):
+    # The pages of the /eod endpoint for the same prices
+    return [
+        [
+            {
+                "close": row["close_price"],
+                "symbol": row["symbol"],
+                "exchange": row["exchange"],
+                "date": f"{row['date']:%Y-%m-%d}T00:00:00+0000",
+            }
+            for row in rows
+        ]
+        for rows in generate_pages(symbols, dates)
+    ]
+
+
+def parse_eod_pages(eod_pages, symbols, dates):
+    # Parses the pages like the loader does, when all their dates are missing
+    missing_dates_by_symbol = {symbol: set(dates) for symbol in symbols}
+    trading_dates = trading_calendar.TradingDates()
+    num_rows = 0
+
+    for paginated_response in eod_pages:
+        columns = stock._price_columns(paginated_response)
+        num_rows += len(stock._stock_price_rows(columns, missing_dates_by_symbol))
+        trading_dates.update_columns(columns)
+
+    return num_rows
+
+
+def insert_pages(db_sessionmaker, pages):
+    # One transaction per page, like when loading from the API
+    for rows in pages:
+        with database.begin_write(db_sessionmaker) as session:
+            database.insert_or_ignore(session, StockPrice.__table__, rows)
+
+
+def compute_missing_dates(cached_dates, start_date, end_date):
+    return {
+        symbol: stock._compute_missing_dates(dates, set(), start_date, end_date)
+        for symbol, dates in cached_dates.items()
+    }
+
+
+def stream_csv(db_sessionmaker, symbols, start_date, end_date):
+    with open(os.devnull, "w") as output_file:
+        return output.write_stock_price_chunks(
+            conversion.iter_converted_stock_prices(
+                db_sessionmaker, symbols, start_date, end_date, "GBP"
+            ),
+            "csv",
+            output_file,
+        )
+
+
+def eod_response(request, context):
+    # Serves the business days of the requested range for every symbol
+    params = request.qs
+    symbols = params["symbols"][0].split(",")
+    limit = int(params["limit"][0])
+    offset = int(params["offset"][0])
+
+    dates = pd.bdate_range(params["date_from"][0], params["date_to"][0])
+    prices = [
+        {
+            "close": 100.0,
+            "symbol": symbol,
+            "exchange": "XNAS",
+            "date": f"{date:%Y-%m-%d}T00:00:00+0000",
+        }
+        for symbol in symbols
+        for date in dates
+    ]
+
+    return {
+        "pagination": {
+            "limit": limit,
+            "offset": offset,
+            "count": len(prices[offset : offset + limit]),
+            "total": len(prices),
+        },
+        "data": prices[offset : offset + limit],
+    }
+
+
+def timeseries_response(request, context):
+    params = request.qs
+    currencies = params["symbols"][0].split(",")
+
+    dates = pd.date_range(params["start_date"][0], params["end_date"][0])
+
+    return {
+        "success": True,
+        "timeseries": True,
+        "start_date": params["start_date"][0],
+        "end_date": params["end_date"][0],
+        "base": params["base"][0],
+        "rates": {
+            f"{date:%Y-%m-%d}": {
+                currency_code: 1.0 + index * 0.1
+                for index, currency_code in enumerate(currencies)
+            }
+            for date in dates
+        },
+    }
+
+
+def run(num_symbols, num_years, trace_memory):
+    print(f"{num_symbols} symbols x {num_years} years")
+
+    start_date = END_DATE.replace(year=END_DATE.year - num_years)
+    dates = [date.date() for date in pd.bdate_range(start_date, END_DATE)]
+    calendar_dates = [date.date() for date in pd.date_range(start_date, END_DATE)]
+    symbols = [f"SYM{index}" for index in range(num_symbols)]
+
+    num_rows = len(symbols) * len(dates)
+
+    stages = Stages(trace_memory)
+
+    eod_pages = generate_eod_pages(symbols, dates)
+    stages.run(
+        "parse_eod_pages",
+        num_rows,
+        parse_eod_pages,
+        eod_pages,
+        symbols,
+        dates,
+        repeat=True,
+    )
+    del eod_pages
+
+    pages = generate_pages(symbols, dates)
+
+    with tempfile.TemporaryDirectory() as db_dir, requests_mock.Mocker(
+        case_sensitive=True
+    ) as mocker:
+        mocker.get(re.compile(r"/eod\b"), json=eod_response)
+        mocker.get(re.compile(r"/timeseries\b"), json=timeseries_response)
+        mocker.get(
+            re.compile(r"/symbols\b"),
+            json={"symbols": {"GBP": "British Pound", "USD": "US Dollar"}},
+        )
+
+        settings = dict(
+            database.DEFAULT_SETTINGS,
+            uri=f"sqlite:///{os.path.join(db_dir, 'benchmark.db')}",
+        )
+        db_sessionmaker = database.create_sessionmaker(settings)
+        models.Base.metadata.create_all(db_sessionmaker.kw["bind"])
+
+        stages.run(
+            "insert_stock_prices", num_rows, insert_pages, db_sessionmaker, pages
+        )
+        del pages
+
+        stages.run(
+            "fill_currency_rates",
+            2 * len(calendar_dates),
+            currency._fill_missing_dates,
+            db_sessionmaker,
+            calendar_dates,
+            "USD",
+            "GBP",
+        )
+
+        cached_dates = stages.run(
+            "query_cached_dates",
+            num_rows,
+            stock._query_cached_dates,
+            db_sessionmaker,
+            symbols,
+            start_date,
+            END_DATE,
+            repeat=True,
+        )
+
+        stages.run(
+            "compute_missing_dates",
+            num_symbols * len(calendar_dates),
+            compute_missing_dates,
+            cached_dates,
+            start_date,
+            END_DATE,
+            repeat=True,
+        )
+        del cached_dates
+
+        stages.run(
+            "get_currency_rates",
+            len(calendar_dates),
+            currency._get_currency_rates,
+            db_sessionmaker,
+            calendar_dates,
+            "USD",
+            "GBP",
+            repeat=True,
+        )
+
+        stages.run(
+            "converted_prices_dataframe",
+            num_rows,
+            conversion._query_converted_stock_prices_as_dataframe,
+            db_sessionmaker,
+            symbols,
+            start_date,
+            END_DATE,
+            "GBP",
+            repeat=True,
+        )
+
+        stages.run(
+            "converted_price_rows",
+            num_rows,
+            conversion.query_converted_stock_price_rows,
+            db_sessionmaker,
+            symbols,
+            start_date,
+            END_DATE,
+            "GBP",
+            repeat=True,
+        )
+
+        # The peak memory of streaming stays the same for any number of rows
+        stages.run(
+            "stream_csv",
+            num_rows,
+            stream_csv,
+            db_sessionmaker,
+            symbols,
+            start_date,
+            END_DATE,
+        )
+
+        stages.run(
+            "fill_stock_prices",
+            num_symbols * len(pd.bdate_range(FETCH_START_DATE, FETCH_END_DATE)),
+            stock._fill_missing_dates,
+            db_sessionmaker,
+            symbols,
+            FETCH_START_DATE,
+            FETCH_END_DATE,
+        )
+
+        db_sessionmaker.kw["bind"].dispose()
+
+    return stages.results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+
+    for size, stage_results in results.items():
+        for name, result in stage_results.items():
+            baseline_result = baseline.get(size, {}).get(name)
+
+            if baseline_result is None:
+                continue
+
+            if result["throughput"] < baseline_result["throughput"] * (1 - tolerance):
+                regressions.append(
+                    f"{size} {name}: throughput {result['throughput']:.0f}/s "
+                    f"(baseline: {baseline_result['throughput']:.0f}/s)"
+                )
+
+            if result["peak_memory"] is None:
+                continue
+
+            if result["peak_memory"] > baseline_result["peak_memory"] * (1 + tolerance):
+                regressions.append(
+                    f"{size} {name}: peak memory {result['peak_memory']} bytes "
+                    f"(baseline: {baseline_result['peak_memory']} bytes)"
+                )
+
+    return regressions
+
+
+def main():
+    args = parse_arguments()
+
+    # The clients require access keys, even though the APIs are mocked
+    for access_key_env in ["MARKET_STACK_ACCESS_KEY", "EXCHANGE_RATES_API_ACCESS_KEY"]:
+        os.environ.setdefault(access_key_env, "0" * 32)
+
+    # The mocked APIs have no rate limits
+    scheduler.configure(
+        settings=dict(
+            scheduler.DEFAULT_SETTINGS, marketstack_rate=0, exchangeratesapi_rate=0
+        )
+    )
+
+    results = {
+        f"{num_symbols}x{args.years}": run(num_symbols, args.years, args.trace_memory)
+        for num_symbols in (int(value) for value in args.symbols.split(","))
+    }
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(
+                {"trace_memory": args.trace_memory, "results": results},
+                baseline_file,
+                indent=2,
+                sort_keys=True,
+            )
+
+        print(f"Stored the baseline in '{args.baseline}'")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline in '{args.baseline}', run with --save-baseline")
+        return
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    if baseline["trace_memory"] != args.trace_memory:
+        print("The baseline was measured with a different --trace-memory setting")
+        return
+
+    regressions = compare(results, baseline["results"], args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    if regressions:
+        raise SystemExit(1)
+
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
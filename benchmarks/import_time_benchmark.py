@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+# Cumulative import time budgets in milliseconds. 'load_data' is all that
+# --help needs, 'market_data_loader.conversion' is what a query answered from
+# the database imports.
+IMPORT_BUDGETS_MS = {
+    "load_data": 100,
+    "market_data_loader.conversion": 600,
+}
+
+# Modules that must not be imported by the above
+HEAVY_MODULES = ["pandas", "numpy", "requests"]
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Measure module import times against their budgets"
+    )
+    parser.add_argument(
+        "--runs", default=5, help="number of runs per module (default: 5)", type=int
+    )
+    return parser.parse_args()
+
+
+def measure(module_name):
+    # Returns the cumulative import time of the module in milliseconds and the
+    # heavy modules it imported
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    cumulative_us = None
+    heavy_modules = set()
+
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+
+        if not match:
+            continue
+
+        imported_name = match.group(3)
+
+        if imported_name.split(".")[0] in HEAVY_MODULES:
+            heavy_modules.add(imported_name.split(".")[0])
+
+        if imported_name == module_name and not match.group(2):
+            cumulative_us = int(match.group(1))
+
+    return cumulative_us / 1000, heavy_modules
+
+
+def main():
+    args = parse_arguments()
+
+    over_budget = False
+
+    for module_name, budget_ms in IMPORT_BUDGETS_MS.items():
+        results = [measure(module_name) for _ in range(args.runs)]
+        elapsed_ms = statistics.median(elapsed for elapsed, _ in results)
+        heavy_modules = set().union(*(modules for _, modules in results))
+
+        status = "ok"
+
+        if elapsed_ms > budget_ms or heavy_modules:
+            status = "OVER BUDGET"
+            over_budget = True
+
+        print(
+            f"{module_name:>30}: {elapsed_ms:7.1f}ms (budget: {budget_ms}ms) {status}"
+        )
+
+        if heavy_modules:
+            print(f"{'':>30}  imports {', '.join(sorted(heavy_modules))}")
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+import os
+import re
+import tempfile
+import time
+
+import pandas as pd
+import requests_mock
+
+from market_data_loader import database, models, parallel, scheduler, stock
+
+START_DATE = datetime.date(2020, 1, 1)
+END_DATE = datetime.date(2021, 12, 31)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Measure the throughput of the parallel loader by number of workers"
+    )
+    parser.add_argument(
+        "--symbols", default=400, help="number of symbols (default: 400)", type=int
+    )
+    parser.add_argument(
+        "--workers",
+        default="1,2,4,8",
+        help="comma-separated numbers of workers (default: 1,2,4,8)",
+    )
+    parser.add_argument(
+        "--latency",
+        default=0.05,
+        help="simulated latency of every page request in seconds (default: 0.05)",
+        type=float,
+    )
+    return parser.parse_args()
+
+
+def eod_page(request, context):
+    # Builds only the requested page, so that the mocked API takes little of
+    # the CPU time that the loader gets
+    params = request.qs
+    symbols = params["symbols"][0].split(",")
+    limit = int(params["limit"][0])
+    offset = int(params["offset"][0])
+
+    dates = pd.bdate_range(params["date_from"][0], params["date_to"][0]).strftime(
+        "%Y-%m-%dT00:00:00+0000"
+    )
+    total = len(symbols) * len(dates)
+
+    return {
+        "pagination": {
+            "limit": limit,
+            "offset": offset,
+            "count": len(range(offset, min(offset + limit, total))),
+            "total": total,
+        },
+        "data": [
+            {
+                "close": 100.0,
+                "symbol": symbols[index // len(dates)].upper(),
+                "exchange": "XNAS",
+                "date": dates[index % len(dates)],
+            }
+            for index in range(offset, min(offset + limit, total))
+        ],
+    }
+
+
+def run(num_symbols, workers, latency):
+    # Loads the prices into an empty database, with the in-process loader when
+    # 'workers' is None
+    symbols = [f"SYM{index}" for index in range(num_symbols)]
+
+    def delayed_eod_response(request, context):
+        time.sleep(latency)
+        return eod_page(request, context)
+
+    with tempfile.TemporaryDirectory() as db_dir, requests_mock.Mocker(
+        case_sensitive=True
+    ) as mocker:
+        mocker.get(re.compile(r"/eod\b"), json=delayed_eod_response)
+
+        settings = dict(
+            database.DEFAULT_SETTINGS,
+            uri=f"sqlite:///{os.path.join(db_dir, 'benchmark.db')}",
+        )
+        db_sessionmaker = database.create_sessionmaker(settings)
+        models.Base.metadata.create_all(db_sessionmaker.kw["bind"])
+
+        start_time = time.perf_counter()
+
+        if workers is None:
+            stock._fill_missing_dates(db_sessionmaker, symbols, START_DATE, END_DATE)
+        else:
+            parallel.fill_missing_stock_prices(
+                db_sessionmaker, symbols, START_DATE, END_DATE, workers=workers
+            )
+
+        elapsed = time.perf_counter() - start_time
+
+        with db_sessionmaker.begin() as session:
+            num_rows = session.query(models.StockPrice).count()
+
+        db_sessionmaker.kw["bind"].dispose()
+
+    return num_rows, elapsed
+
+
+def main():
+    args = parse_arguments()
+
+    # The clients require access keys, even though the API is mocked
+    os.environ.setdefault("MARKET_STACK_ACCESS_KEY", "0" * 32)
+
+    # The mocked API has no rate limits
+    scheduler.configure(
+        settings=dict(
+            scheduler.DEFAULT_SETTINGS, marketstack_rate=0, exchangeratesapi_rate=0
+        )
+    )
+
+    # Forked workers inherit the mocked API
+    parallel.START_METHOD = "fork"
+
+    num_pages = args.symbols * len(pd.bdate_range(START_DATE, END_DATE)) // 1000
+
+    print(
+        f"{args.symbols} symbols, ~{num_pages} pages, "
+        f"{args.latency * 1000:.0f} ms per page request"
+    )
+
+    baseline_throughput = None
+
+    for workers in [None] + [int(value) for value in args.workers.split(",")]:
+        num_rows, elapsed = run(args.symbols, workers, args.latency)
+        throughput = num_rows / elapsed
+
+        if workers is None:
+            name = "in-process"
+            baseline_throughput = throughput
+            speedup = ""
+        else:
+            name = f"{workers} workers"
+            speedup = f"{throughput / baseline_throughput:6.1f}x"
+
+        print(
+            f"{name:>12}: {num_rows:9d} rows {elapsed:8.3f}s "
+            f"{throughput:10.0f} rows/s {speedup}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+import os
+import re
+import tempfile
+
+import requests_mock
+
+from benchmarks.hot_paths_benchmark import Stages, eod_response, timeseries_response
+from market_data_loader import (
+    currency,
+    database,
+    models,
+    replay,
+    response_store,
+    scheduler,
+    stock,
+)
+
+# Range of the generated store
+GENERATE_START_DATE = datetime.date(2021, 1, 4)
+GENERATE_END_DATE = datetime.date(2021, 12, 31)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Measure how fast the database is rebuilt from a response store"
+    )
+    parser.add_argument(
+        "--store",
+        default=os.environ.get(response_store.RESPONSE_STORE_ENV),
+        required=response_store.RESPONSE_STORE_ENV not in os.environ,
+        help=f"response store directory (default: ${response_store.RESPONSE_STORE_ENV})",
+    )
+    parser.add_argument(
+        "--generate",
+        default=None,
+        help="record the responses of the mocked APIs for this many symbols first",
+        type=int,
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="measure the peak memory of every stage, which slows the stages down",
+    )
+    return parser.parse_args()
+
+
+def create_sessionmaker(db_dir):
+    settings = dict(
+        database.DEFAULT_SETTINGS,
+        uri=f"sqlite:///{os.path.join(db_dir, 'benchmark.db')}",
+    )
+    db_sessionmaker = database.create_sessionmaker(settings)
+    models.Base.metadata.create_all(db_sessionmaker.kw["bind"])
+
+    return db_sessionmaker
+
+
+def generate(store_root, num_symbols):
+    # Records the responses of a one year load from the mocked APIs, so that
+    # the same store can be replayed on any machine
+    os.environ[response_store.RESPONSE_STORE_ENV] = store_root
+    symbols = [f"SYM{index}" for index in range(num_symbols)]
+    dates = [
+        GENERATE_START_DATE + datetime.timedelta(days=day)
+        for day in range((GENERATE_END_DATE - GENERATE_START_DATE).days + 1)
+    ]
+
+    with tempfile.TemporaryDirectory() as db_dir, requests_mock.Mocker(
+        case_sensitive=True
+    ) as mocker:
+        mocker.get(re.compile(r"/eod\b"), json=eod_response)
+        mocker.get(re.compile(r"/timeseries\b"), json=timeseries_response)
+        mocker.get(
+            re.compile(r"/symbols\b"),
+            json={"symbols": {"GBP": "British Pound", "USD": "US Dollar"}},
+        )
+
+        db_sessionmaker = create_sessionmaker(db_dir)
+
+        stock._fill_missing_dates(
+            db_sessionmaker, symbols, GENERATE_START_DATE, GENERATE_END_DATE
+        )
+        currency._fill_missing_dates(db_sessionmaker, dates, "USD", "GBP")
+
+        db_sessionmaker.kw["bind"].dispose()
+
+    print(f"Recorded the responses for {num_symbols} symbols in '{store_root}'")
+
+
+def read_responses(store):
+    num_bytes = 0
+
+    for _, _, content in store.iter_responses():
+        num_bytes += len(content)
+
+    return num_bytes
+
+
+def run(store, trace_memory):
+    stages = Stages(trace_memory)
+
+    num_responses = sum(1 for _ in store.iter_responses())
+
+    stages.run("read_responses", num_responses, read_responses, store, repeat=True)
+
+    # A first rebuild counts the rows and warms up the file system cache, so
+    # that the measured rebuild reads the store at disk cache speed
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_sessionmaker = create_sessionmaker(db_dir)
+
+        counts = replay.rebuild_from_store(db_sessionmaker, store)
+
+        db_sessionmaker.kw["bind"].dispose()
+
+    num_rows = counts["stock_prices"] + counts["currency_rates"]
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_sessionmaker = create_sessionmaker(db_dir)
+
+        stages.run(
+            "rebuild_database",
+            num_rows,
+            replay.rebuild_from_store,
+            db_sessionmaker,
+            store,
+        )
+
+        db_sessionmaker.kw["bind"].dispose()
+
+    return stages.results
+
+
+def main():
+    args = parse_arguments()
+
+    # The clients require access keys, even though the APIs are mocked
+    for access_key_env in ["MARKET_STACK_ACCESS_KEY", "EXCHANGE_RATES_API_ACCESS_KEY"]:
+        os.environ.setdefault(access_key_env, "0" * 32)
+
+    # The mocked APIs have no rate limits
+    scheduler.configure(
+        settings=dict(
+            scheduler.DEFAULT_SETTINGS, marketstack_rate=0, exchangeratesapi_rate=0
+        )
+    )
+
+    if args.generate:
+        generate(args.store, args.generate)
+
+    run(response_store.ResponseStore(args.store, replay=True), args.trace_memory)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 
 import logging
 
-from market_data_loader import database, logger, models
+from market_data_loader import database, logger, models, trading_calendar
 
 
 def main():
@@ -13,6 +13,13 @@ def main():
     db_engine = database.create_engine()
     models.Base.metadata.create_all(db_engine)
 
+    logging.info('Seeding the exchange holidays..')
+
+    db_sessionmaker = database.create_sessionmaker()
+
+    with database.begin_write(db_sessionmaker) as session:
+        trading_calendar.seed_holidays(session)
+
 
 if __name__ == "__main__":
     main()
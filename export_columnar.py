@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+
+from market_data_loader import columnar_store, database, logger
+
+
+def main():
+    args = parse_args()
+
+    logger.configure_logger()
+
+    logging.info("Exporting the database to '%s'..", args.root)
+
+    db_sessionmaker = database.create_sessionmaker()
+
+    num_rows = columnar_store.export_from_database(
+        db_sessionmaker, columnar_store.ColumnarStore(args.root), args.chunk_size
+    )
+
+    for table_name, count in num_rows.items():
+        logging.info("Exported %d rows of '%s'", count, table_name)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Export stock prices and currency rates to the columnar store"
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default=os.environ.get(columnar_store.COLUMNAR_STORE_ENV),
+        required=columnar_store.COLUMNAR_STORE_ENV not in os.environ,
+        help=f"store directory (default: ${columnar_store.COLUMNAR_STORE_ENV})",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=columnar_store.EXPORT_CHUNK_SIZE,
+        help=f"rows read from the database at a time (default: {columnar_store.EXPORT_CHUNK_SIZE})",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
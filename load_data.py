@@ -2,38 +2,114 @@
 
 import argparse
 import datetime
+import functools
 import logging
 import sys
 
-import requests
+from market_data_loader import arguments, logger
+from market_data_loader.clients import http_client
 
-from market_data_loader import currency, database, logger, stock
 
-
-def parse_date(arg):
+def parse_workers(arg):
     try:
-        return datetime.datetime.strptime(arg, "%Y-%m-%d").date()
+        workers = int(arg)
     except ValueError:
-        raise argparse.ArgumentTypeError("invalid date value")
+        raise argparse.ArgumentTypeError("invalid workers value")
+
+    if workers < 1:
+        raise argparse.ArgumentTypeError("workers must be at least 1")
+
+    return workers
+
+
+def parse_symbols(arg):
+    symbols = [symbol.strip() for symbol in arg.split(",") if symbol.strip()]
+
+    if not symbols:
+        raise argparse.ArgumentTypeError("no symbols given")
+
+    return symbols
 
 
 def parse_arguments():
     parser = argparse.ArgumentParser(
         description="Fetch and display stock prices in specified currency"
     )
-    parser.add_argument("--symbol", help="stock symbol ('AAPL')", required=True)
-    parser.add_argument("--currency", help="currency symbol ('USD')", required=True)
+    symbols_group = parser.add_mutually_exclusive_group(required=True)
+    symbols_group.add_argument("--symbol", help="stock symbol ('AAPL')")
+    symbols_group.add_argument(
+        "--symbols",
+        help="comma-separated stock symbols ('AAPL,MSFT')",
+        type=parse_symbols,
+    )
+    symbols_group.add_argument(
+        "--symbols-file",
+        help="file with one stock symbol per line",
+        type=arguments.read_symbols_file,
+    )
+    parser.add_argument(
+        "--currency",
+        help="currency symbol or comma-separated currency symbols ('USD,GBP')",
+        required=True,
+        type=arguments.parse_currencies,
+    )
+    parser.add_argument(
+        "--layout",
+        choices=["long", "wide"],
+        default="long",
+        help="a row per price and currency or a column per currency (default: long)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["table", "csv", "ndjson", "parquet"],
+        default="table",
+        dest="output_format",
+        help="output format, all but 'table' are streamed in chunks (default: table)",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="PATH",
+        help="file to stream the results to (default: standard output)",
+    )
     parser.add_argument(
         "--start-date",
         default=datetime.date.today(),
         help="start date ('YYYY-mm-dd', default: today's date)",
-        type=parse_date,
+        type=arguments.parse_date,
     )
     parser.add_argument(
         "--end-date",
         default=datetime.date.today(),
         help="end date ('YYYY-mm-dd', default: today's date)",
-        type=parse_date,
+        type=arguments.parse_date,
+    )
+    arguments.add_fetch_arguments(parser)
+    parser.add_argument(
+        "--pipeline",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="fetch stock prices and currency rates concurrently",
+    )
+    parser.add_argument(
+        "--workers",
+        default=1,
+        help="number of processes that fetch and parse stock prices, with more than one a separate process writes them to the database (default: 1)",
+        type=parse_workers,
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        help="write timings and counters of the run as JSON",
+    )
+    parser.add_argument(
+        "--metrics-prometheus",
+        metavar="PATH",
+        help="write timings and counters of the run in the Prometheus text format",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="write a cProfile dump of the run (see 'python -m pstats')",
     )
     parser.add_argument(
         "--verbose",
@@ -46,55 +122,172 @@ def parse_arguments():
     if args.start_date > args.end_date:
         parser.error("Start date must be before end date")
 
+    if args.pipeline and args.workers > 1:
+        parser.error("--pipeline can't be combined with --workers")
+
+    if args.output and args.output_format == "table":
+        parser.error("--output requires a streamed --format")
+
+    if args.symbol:
+        args.symbols = [args.symbol]
+    elif args.symbols_file:
+        args.symbols = args.symbols_file
+
+    # Drop duplicate symbols while preserving the given order
+    args.symbols = list(dict.fromkeys(args.symbols))
+
     return args
 
 
+def write_streamed_output(db_sessionmaker, args, start_date, end_date):
+    from market_data_loader import conversion, output
+
+    chunks = conversion.iter_converted_stock_prices(
+        db_sessionmaker,
+        args.symbols,
+        start_date,
+        end_date,
+        args.currency,
+        args.layout,
+    )
+
+    binary = args.output_format == "parquet"
+
+    if not args.output:
+        output_file = sys.stdout.buffer if binary else sys.stdout
+
+        return output.write_stock_price_chunks(chunks, args.output_format, output_file)
+
+    with open(args.output, "wb" if binary else "w") as output_file:
+        return output.write_stock_price_chunks(chunks, args.output_format, output_file)
+
+
 def main():
     args = parse_arguments()
 
+    # Imported after parsing the arguments, so that --help and argument errors
+    # don't pay for importing SQLAlchemy
+    from market_data_loader import (
+        conversion,
+        database,
+        frame_cache,
+        metrics,
+        output,
+        scheduler,
+    )
+
+    # Streamed results on the standard output must not be mixed with logs
+    if args.output_format != "table" and not args.output:
+        log_stream = sys.stderr
+    else:
+        log_stream = sys.stdout
+
     if args.verbose:
-        logger.configure_logger(level=logging.DEBUG)
+        logger.configure_logger(level=logging.DEBUG, stream=log_stream)
     else:
-        logger.configure_logger(level=logging.INFO)
+        logger.configure_logger(level=logging.INFO, stream=log_stream)
+
+    http_client.configure(read_timeout=args.read_timeout, max_retries=args.max_retries)
+
+    if args.metrics_json or args.metrics_prometheus:
+        metrics.enable()
+
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
 
     try:
         start_date = min(args.start_date, datetime.date.today())
         end_date = min(args.end_date, datetime.date.today())
 
         db_sessionmaker = database.create_sessionmaker()
+        scheduler.configure(db_sessionmaker)
+        frame_cache.configure()
 
-        stock_prices_df = stock.get_stock_prices(
-            db_sessionmaker, args.symbol, start_date, end_date
-        )
+        if args.pipeline:
+            from market_data_loader import pipeline
 
-        num_rows, _ = stock_prices_df.shape
+            fill_missing_data = pipeline.fill_missing_data
+        elif args.workers > 1:
+            from market_data_loader import parallel
 
-        if num_rows > 0:
-            base_currency = stock_prices_df["currency"][0]
-            target_currency = args.currency
+            fill_missing_data = functools.partial(
+                parallel.fill_missing_data, workers=args.workers
+            )
+        else:
+            fill_missing_data = conversion.fill_missing_data
 
-            if base_currency != target_currency:
-                currency_rates_df = currency.get_currency_rates(
-                    db_sessionmaker,
-                    list(stock_prices_df.index),
-                    base_currency,
-                    target_currency,
-                )
+        with metrics.stage("load_data.fill_missing_data"):
+            fill_missing_data(
+                db_sessionmaker,
+                args.symbols,
+                start_date,
+                end_date,
+                args.currency,
+                args.concurrency,
+            )
 
-                stock_prices_df = stock_prices_df.join(currency_rates_df[["rate"]])
+        if args.output_format != "table":
+            with metrics.stage("load_data.output"):
+                num_rows = write_streamed_output(
+                    db_sessionmaker, args, start_date, end_date
+                )
 
-                stock_prices_df["currency"] = target_currency
-                stock_prices_df["close_price"] = (
-                    stock_prices_df["close_price"] * stock_prices_df["rate"]
+            if not num_rows:
+                logging.info("No data for symbols and date range")
+        elif len(args.currency) == 1 and args.layout == "long":
+            with metrics.stage("load_data.query"):
+                rows = conversion.query_converted_stock_price_rows(
+                    db_sessionmaker,
+                    args.symbols,
+                    start_date,
+                    end_date,
+                    args.currency[0],
                 )
 
-            print(stock_prices_df[["symbol", "currency", "close_price"]])
+            if rows:
+                with metrics.stage("load_data.output"):
+                    print(output.format_stock_prices(rows))
+            else:
+                logging.info("No data for symbols and date range")
         else:
-            logging.info("No data for symbol and date range")
+            # All target currencies are converted in one pass, which needs
+            # pandas anyway
+            with metrics.stage("load_data.query"):
+                stock_prices_df = conversion.query_converted_stock_prices(
+                    db_sessionmaker,
+                    args.symbols,
+                    start_date,
+                    end_date,
+                    args.currency,
+                    args.layout,
+                )
+
+            if len(stock_prices_df):
+                with metrics.stage("load_data.output"):
+                    print(output.format_stock_price_frame(stock_prices_df))
+            else:
+                logging.info("No data for symbols and date range")
     except RuntimeError as err:
         logging.error(err)
 
         sys.exit(1)
+    finally:
+        if args.profile:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+
+        if args.metrics_prometheus:
+            metrics.write_prometheus(args.metrics_prometheus)
+
+        http_client.log_latency_stats()
+        scheduler.log_usage_stats()
+        frame_cache.log_stats()
 
 
 if __name__ == "__main__":
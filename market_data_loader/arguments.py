@@ -0,0 +1,76 @@
+import argparse
+import datetime
+
+from market_data_loader.clients import http_client
+
+CONCURRENCY = 4
+
+
+def parse_date(arg):
+    try:
+        return datetime.datetime.strptime(arg, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid date value")
+
+
+def parse_concurrency(arg):
+    try:
+        concurrency = int(arg)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid concurrency value")
+
+    if concurrency < 1:
+        raise argparse.ArgumentTypeError("concurrency must be at least 1")
+
+    return concurrency
+
+
+def parse_currencies(arg):
+    currencies = [
+        currency.strip().upper() for currency in arg.split(",") if currency.strip()
+    ]
+
+    if not currencies:
+        raise argparse.ArgumentTypeError("no currencies given")
+
+    # Drop duplicate currencies while preserving the given order
+    return list(dict.fromkeys(currencies))
+
+
+def read_symbols_file(path):
+    # One symbol per line, '#' starts a comment
+    try:
+        with open(path) as symbols_file:
+            lines = [line.split("#", 1)[0].strip() for line in symbols_file]
+    except OSError as err:
+        raise argparse.ArgumentTypeError(f"can't read symbols file: {err}")
+
+    # Drop duplicate symbols while preserving the given order
+    symbols = list(dict.fromkeys(line for line in lines if line))
+
+    if not symbols:
+        raise argparse.ArgumentTypeError("no symbols in symbols file")
+
+    return symbols
+
+
+def add_fetch_arguments(parser):
+    # Options shared by the scripts that fetch from the market data provider
+    parser.add_argument(
+        "--concurrency",
+        default=CONCURRENCY,
+        help=f"maximum number of concurrent page requests per fetch (default: {CONCURRENCY})",
+        type=parse_concurrency,
+    )
+    parser.add_argument(
+        "--read-timeout",
+        default=http_client.READ_TIMEOUT,
+        help=f"HTTP read timeout in seconds (default: {http_client.READ_TIMEOUT})",
+        type=float,
+    )
+    parser.add_argument(
+        "--max-retries",
+        default=http_client.MAX_RETRIES,
+        help=f"maximum number of HTTP retries per request (default: {http_client.MAX_RETRIES})",
+        type=int,
+    )
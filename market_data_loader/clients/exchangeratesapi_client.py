@@ -1,19 +1,32 @@
+import asyncio
+import datetime
 import logging
 import os
 
-import requests
+from market_data_loader.clients import http_client
 
 # The free subscription does not support HTTPS
 API_BASE_URL = "http://api.exchangeratesapi.io/v1"
 # The free subscription only supports EUR as base currency
 BASE_CURRENCY = "EUR"
+# The timeseries endpoint accepts a range of at most 365 days per request
+TIMESERIES_MAX_DAYS = 365
+# Name of the provider in the scheduler settings
+PROVIDER = "exchangeratesapi"
 
 
 def currencies():
+    import requests
+
     logging.info("Fetching currency rate symbols")
 
     params = {"access_key": _access_key()}
-    response = requests.get(f"{API_BASE_URL}/symbols", params=params)
+    response = http_client.get(
+        f"{API_BASE_URL}/symbols",
+        params=params,
+        name="exchangeratesapi.symbols",
+        provider=PROVIDER,
+    )
 
     try:
         response.raise_for_status()
@@ -24,6 +37,8 @@ def currencies():
 
 
 def currency_rate(date, currencies):
+    import requests
+
     logging.info(
         "Fetching currency rates from ExchangeRatesAPI at '%s' from '%s' to %s",
         date,
@@ -38,7 +53,12 @@ def currency_rate(date, currencies):
     }
 
     date_str = date.strftime("%Y-%m-%d")
-    response = requests.get(f"{API_BASE_URL}/{date_str}", params=params)
+    response = http_client.get(
+        f"{API_BASE_URL}/{date_str}",
+        params=params,
+        name="exchangeratesapi.historical",
+        provider=PROVIDER,
+    )
 
     try:
         response.raise_for_status()
@@ -48,6 +68,67 @@ def currency_rate(date, currencies):
     return response.json()
 
 
+async def currency_rate_async(date, currencies):
+    return await asyncio.to_thread(currency_rate, date, currencies)
+
+
+def timeseries(start_date, end_date, currencies):
+    import requests
+
+    logging.info(
+        "Fetching currency rates from ExchangeRatesAPI from '%s' to '%s' from '%s' to %s",
+        start_date,
+        end_date,
+        BASE_CURRENCY,
+        currencies,
+    )
+
+    rates = {}
+
+    chunk_start_date = start_date
+
+    while chunk_start_date <= end_date:
+        chunk_end_date = min(
+            chunk_start_date + datetime.timedelta(days=TIMESERIES_MAX_DAYS - 1),
+            end_date,
+        )
+
+        params = {
+            "access_key": _access_key(),
+            "start_date": chunk_start_date.strftime("%Y-%m-%d"),
+            "end_date": chunk_end_date.strftime("%Y-%m-%d"),
+            "base": BASE_CURRENCY,
+            "symbols": ",".join(currencies),
+        }
+
+        response = http_client.get(
+            f"{API_BASE_URL}/timeseries",
+            params=params,
+            name="exchangeratesapi.timeseries",
+            provider=PROVIDER,
+        )
+
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            _handle_http_error("Error while fetching currency rate timeseries", err)
+
+        rates.update(response.json()["rates"])
+
+        chunk_start_date = chunk_end_date + datetime.timedelta(days=1)
+
+    return {
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "base": BASE_CURRENCY,
+        "rates": rates,
+    }
+
+
+async def timeseries_async(start_date, end_date, currencies):
+    return await asyncio.to_thread(timeseries, start_date, end_date, currencies)
+
+
 def _access_key():
     if not "EXCHANGE_RATES_API_ACCESS_KEY" in os.environ:
         raise RuntimeError("EXCHANGE_RATES_API_ACCESS_KEY environment variable missing")
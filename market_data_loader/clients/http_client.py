@@ -0,0 +1,216 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+
+from market_data_loader import latency, metrics, response_store, scheduler
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.5
+MAX_BACKOFF = 60
+POOL_SIZE = 16
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+_config = {
+    "connect_timeout": CONNECT_TIMEOUT,
+    "read_timeout": READ_TIMEOUT,
+    "max_retries": MAX_RETRIES,
+    "backoff_factor": BACKOFF_FACTOR,
+    "max_backoff": MAX_BACKOFF,
+    "pool_size": POOL_SIZE,
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+_latencies = latency.LatencyRecorder()
+
+
+def configure(**kwargs):
+    unknown_options = set(kwargs) - set(_config)
+
+    if unknown_options:
+        raise ValueError(f"Unknown HTTP client options: {sorted(unknown_options)}")
+
+    global _session
+
+    with _session_lock:
+        _config.update(kwargs)
+
+        # The pool size is fixed when the session is created
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get(url, params=None, name=None, provider=None):
+    # Imported on first use, so that runs answered from the database don't
+    # pay for importing requests
+    import requests
+
+    name = name or url
+    store = response_store.get_store()
+
+    # Replayed requests are answered from the store, without counting towards
+    # the rate limits and quotas of the provider
+    if store is not None and store.replay:
+        return _replay(store, url, params, name)
+
+    session = _get_session()
+    timeout = (_config["connect_timeout"], _config["read_timeout"])
+
+    attempt = 0
+
+    while True:
+        # Every attempt counts towards the rate limit and quota of the provider
+        if provider is not None:
+            scheduler.acquire(provider)
+
+        start_time = time.perf_counter()
+
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ) as err:
+            _record_latency(name, time.perf_counter() - start_time)
+            metrics.increment("http_requests_total", name=name, status="error")
+
+            if attempt >= _config["max_retries"]:
+                raise RuntimeError(f"Request to '{name}' failed: {err}") from err
+
+            delay = _backoff(attempt)
+
+            logging.warning(
+                "Request to '%s' failed (%s), retrying in %.1fs", name, err, delay
+            )
+        else:
+            elapsed = time.perf_counter() - start_time
+            _record_latency(name, elapsed)
+            metrics.increment(
+                "http_requests_total", name=name, status=response.status_code
+            )
+            metrics.increment(
+                "http_response_bytes_total", len(response.content), name=name
+            )
+
+            logging.debug(
+                "Request to '%s' returned %d in %.3fs",
+                name,
+                response.status_code,
+                elapsed,
+            )
+
+            if response.status_code == 200 and store is not None:
+                store.put(url, params, response.content)
+
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or attempt >= _config["max_retries"]
+            ):
+                return response
+
+            delay = _retry_after(response)
+
+            if delay is None:
+                delay = _backoff(attempt)
+
+            logging.warning(
+                "Request to '%s' returned %d, retrying in %.1fs",
+                name,
+                response.status_code,
+                delay,
+            )
+
+        metrics.increment("http_retries_total", name=name)
+
+        time.sleep(delay)
+        attempt += 1
+
+
+def latency_stats():
+    return _latencies.stats()
+
+
+def log_latency_stats():
+    _latencies.log_stats("Request")
+
+
+def reset_latency_stats():
+    _latencies.reset()
+
+
+def _get_session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            import requests
+            import requests.adapters
+
+            # Retries are handled in get(), so that Retry-After can be honored
+            # and every attempt shows up in the latency stats.
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=_config["pool_size"],
+                pool_maxsize=_config["pool_size"],
+                max_retries=0,
+            )
+
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+
+        return _session
+
+
+def _replay(store, url, params, name):
+    import requests
+
+    content = store.get(url, params)
+
+    if content is None:
+        raise RuntimeError(f"No stored response for request to '{name}'")
+
+    metrics.increment("http_replayed_total", name=name)
+
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers["Content-Type"] = "application/json"
+    response._content = content
+
+    return response
+
+
+def _backoff(attempt):
+    # Exponential backoff with full jitter, so that concurrent requests that
+    # failed together don't retry together.
+    delay = min(_config["backoff_factor"] * 2**attempt, _config["max_backoff"])
+    return random.uniform(0, delay)
+
+
+def _retry_after(response):
+    retry_after = response.headers.get("Retry-After")
+
+    if retry_after is None:
+        return None
+
+    try:
+        delay = float(retry_after)
+    except ValueError:
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+
+        delay = retry_at.timestamp() - time.time()
+
+    return min(max(delay, 0), _config["max_backoff"])
+
+
+def _record_latency(name, elapsed):
+    _latencies.record(name, elapsed)
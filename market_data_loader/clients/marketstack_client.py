@@ -1,26 +1,46 @@
+import asyncio
+import concurrent.futures
+import contextvars
 import datetime
+import itertools
 import logging
 import os
-import requests
 import sys
 
+from market_data_loader import metrics
+from market_data_loader.clients import http_client
+
 # The free subscription does not support HTTPS
 API_BASE_URL = "http://api.marketstack.com/v1"
 FETCH_LIMIT = 1000
+# The /eod endpoint accepts at most 100 comma-separated symbols per request
+MAX_SYMBOLS_PER_REQUEST = 100
+# Name of the provider in the scheduler settings
+PROVIDER = "marketstack"
+
 
+def end_of_day(symbols, start_date, end_date, concurrency=1):
+    if isinstance(symbols, str):
+        symbols = [symbols]
+
+    if len(symbols) > MAX_SYMBOLS_PER_REQUEST:
+        raise ValueError(
+            f"At most {MAX_SYMBOLS_PER_REQUEST} symbols can be fetched per request"
+        )
 
-def end_of_day(symbol, start_date, end_date):
     logging.info(
-        "Fetching stock prices from MarketStack for '%s' from '%s' to '%s'",
-        symbol,
+        "Fetching stock prices from MarketStack for %s from '%s' to '%s'",
+        symbols,
         start_date,
         end_date,
     )
 
     def request_fn(limit, offset):
+        import requests
+
         params = {
             "access_key": _access_key(),
-            "symbols": [symbol],
+            "symbols": ",".join(symbols),
             "sort": "ASC",
             "date_from": start_date.strftime("%Y-%m-%d"),
             "date_to": end_date.strftime("%Y-%m-%d"),
@@ -28,19 +48,50 @@ def end_of_day(symbol, start_date, end_date):
             "offset": offset,
         }
 
-        response = requests.get(f"{API_BASE_URL}/eod", params=params)
+        response = http_client.get(
+            f"{API_BASE_URL}/eod",
+            params=params,
+            name="marketstack.eod",
+            provider=PROVIDER,
+        )
 
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as err:
             _handle_http_error(err)
 
-        return response.json()
+        page = response.json()
+
+        metrics.increment("pages_fetched_total", client="marketstack")
+        metrics.increment("rows_fetched_total", len(page["data"]), client="marketstack")
+
+        return page
+
+    return _paginate(request_fn, concurrency=concurrency)
+
+
+async def end_of_day_async(symbols, start_date, end_date, concurrency=1):
+    # The pages are fetched in a worker thread, so that the event loop can
+    # carry on with other requests in the meantime.
+    pages = end_of_day(symbols, start_date, end_date, concurrency)
+
+    while True:
+        page = await asyncio.to_thread(next, pages, None)
+
+        if page is None:
+            return
+
+        yield page
+
 
-    return _paginate(request_fn)
+def _paginate(request_fn, limit=FETCH_LIMIT, concurrency=1):
+    if concurrency > 1:
+        return _paginate_concurrently(request_fn, limit, concurrency)
 
+    return _paginate_sequentially(request_fn, limit)
 
-def _paginate(request_fn, limit=FETCH_LIMIT):
+
+def _paginate_sequentially(request_fn, limit):
     offset = 0
     count = 0
     total = sys.maxsize
@@ -56,6 +107,46 @@ def _paginate(request_fn, limit=FETCH_LIMIT):
         total = pagination["total"]
 
 
+def _paginate_concurrently(request_fn, limit, concurrency):
+    # The first response tells us the total number of rows, after which the
+    # offsets of all the remaining pages are known up front. Keep at most
+    # `concurrency` requests in flight and yield the pages in order.
+    response = request_fn(limit, 0)
+    yield response["data"]
+
+    pagination = response["pagination"]
+    limit = pagination["limit"]
+
+    offsets = iter(
+        range(pagination["offset"] + pagination["count"], pagination["total"], limit)
+    )
+
+    # The requests run with the context of the caller, so that they keep its
+    # scheduler priority
+    context = contextvars.copy_context()
+
+    def submit(executor, offset):
+        return executor.submit(context.copy().run, request_fn, limit, offset)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            submit(executor, offset)
+            for offset in itertools.islice(offsets, concurrency)
+        ]
+
+        try:
+            while futures:
+                response = futures.pop(0).result()
+
+                for offset in itertools.islice(offsets, 1):
+                    futures.append(submit(executor, offset))
+
+                yield response["data"]
+        finally:
+            for future in futures:
+                future.cancel()
+
+
 def _access_key():
     if not "MARKET_STACK_ACCESS_KEY" in os.environ:
         raise RuntimeError("MARKET_STACK_ACCESS_KEY environment variable missing")
@@ -0,0 +1,234 @@
+import collections
+import contextlib
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where only the writers of a process are
+    # serialized
+    fcntl = None
+
+import sqlalchemy as sa
+
+from market_data_loader.models import CurrencyRate, StockPrice
+
+# The columnar store is enabled by pointing this environment variable to a
+# directory. It requires the optional 'pyarrow' package.
+COLUMNAR_STORE_ENV = "MARKET_DATA_LOADER_COLUMNAR_STORE"
+
+STOCK_PRICE_COLUMNS = ["date", "symbol", "close_price", "exchange", "currency"]
+CURRENCY_RATE_COLUMNS = ["date", "base_currency", "target_currency", "rate"]
+
+# Number of rows read from the database at a time during an export
+EXPORT_CHUNK_SIZE = 100000
+
+_store = None
+
+_partition_locks = {}
+_partition_locks_lock = threading.Lock()
+
+
+class ColumnarStore:
+    # Stores stock prices and currency rates in Parquet files partitioned by
+    # symbol (or currency pair) and year:
+    #
+    #   <root>/stock_prices/symbol=AAPL/year=2021.parquet
+    #   <root>/currency_rates/pair=EUR-USD/year=2021.parquet
+    #
+    # Files are memory-mapped on read. Writes keep the first row of every date,
+    # like the inserts into the database do.
+
+    def __init__(self, root):
+        self.root = root
+        self._pa, self._pq = _import_pyarrow()
+
+    def write_stock_prices(self, rows):
+        default_currency = StockPrice.__table__.c.currency.default.arg
+
+        rows = [dict({"currency": default_currency}, **row) for row in rows]
+
+        self._write(
+            rows,
+            STOCK_PRICE_COLUMNS,
+            lambda row: self._stock_prices_path(row["symbol"], row["date"].year),
+        )
+
+    def read_stock_prices(self, symbols, start_date, end_date):
+        paths = [
+            self._stock_prices_path(symbol, year)
+            for symbol in sorted(set(symbols))
+            for year in range(start_date.year, end_date.year + 1)
+        ]
+
+        return self._read(paths, STOCK_PRICE_COLUMNS, start_date, end_date)
+
+    def write_currency_rates(self, rows):
+        self._write(
+            rows,
+            CURRENCY_RATE_COLUMNS,
+            lambda row: self._currency_rates_path(
+                row["base_currency"], row["target_currency"], row["date"].year
+            ),
+        )
+
+    def read_currency_rates(self, base_currency, target_currency, start_date, end_date):
+        paths = [
+            self._currency_rates_path(base_currency, target_currency, year)
+            for year in range(start_date.year, end_date.year + 1)
+        ]
+
+        return self._read(paths, CURRENCY_RATE_COLUMNS, start_date, end_date)
+
+    def _stock_prices_path(self, symbol, year):
+        return os.path.join(
+            self.root, "stock_prices", f"symbol={symbol}", f"year={year}.parquet"
+        )
+
+    def _currency_rates_path(self, base_currency, target_currency, year):
+        return os.path.join(
+            self.root,
+            "currency_rates",
+            f"pair={base_currency}-{target_currency}",
+            f"year={year}.parquet",
+        )
+
+    def _write(self, rows, columns, path_fn):
+        import pandas as pd
+
+        rows_by_path = collections.defaultdict(list)
+
+        for row in rows:
+            rows_by_path[path_fn(row)].append(row)
+
+        for path, partition_rows in rows_by_path.items():
+            df = pd.DataFrame(partition_rows, columns=columns)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # The partition is read, merged and replaced by one writer at a
+            # time, so that rows written concurrently aren't lost
+            with _partition_lock(path):
+                if os.path.exists(path):
+                    existing_df = self._pq.read_table(path, memory_map=True).to_pandas()
+                    df = pd.concat([existing_df, df], ignore_index=True)
+
+                df = df.drop_duplicates("date", keep="first").sort_values("date")
+
+                table = self._pa.Table.from_pandas(
+                    df, schema=self._schema(columns), preserve_index=False
+                )
+
+                # Replace the partition atomically, so that readers never see
+                # a partially written file
+                with tempfile.NamedTemporaryFile(
+                    dir=os.path.dirname(path), suffix=".tmp", delete=False
+                ) as tmp_file:
+                    self._pq.write_table(table, tmp_file.name)
+
+                os.replace(tmp_file.name, path)
+
+    def _read(self, paths, columns, start_date, end_date):
+        import pandas as pd
+
+        tables = [
+            self._pq.read_table(path, memory_map=True)
+            for path in paths
+            if os.path.exists(path)
+        ]
+
+        if not tables:
+            return pd.DataFrame(columns=columns).set_index("date")
+
+        table = self._pa.concat_tables(tables)
+
+        dates = table.column("date")
+        pc = self._pa.compute
+        mask = pc.and_(
+            pc.greater_equal(dates, self._pa.scalar(start_date, self._pa.date32())),
+            pc.less_equal(dates, self._pa.scalar(end_date, self._pa.date32())),
+        )
+
+        return table.filter(mask).to_pandas().set_index("date")
+
+    def _schema(self, columns):
+        pa = self._pa
+
+        types = {
+            "date": pa.date32(),
+            "close_price": pa.float64(),
+            "rate": pa.float64(),
+        }
+
+        return pa.schema(
+            [(column, types.get(column, pa.string())) for column in columns]
+        )
+
+
+@contextlib.contextmanager
+def _partition_lock(path):
+    # Threads of this process wait on a lock per partition, and other
+    # processes on an exclusive lock of a file next to the partition
+    with _partition_locks_lock:
+        thread_lock = _partition_locks.setdefault(path, threading.Lock())
+
+    with thread_lock, open(f"{path}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        yield
+
+
+def get_store():
+    global _store
+
+    root = os.environ.get(COLUMNAR_STORE_ENV)
+
+    if not root:
+        return None
+
+    if _store is None or _store.root != root:
+        _store = ColumnarStore(root)
+
+    return _store
+
+
+def export_from_database(db_sessionmaker, store, chunk_size=EXPORT_CHUNK_SIZE):
+    # Copies the stock prices and currency rates of the database to the store.
+    # Rows already in the store are kept, so the export can be re-run to sync
+    # an existing store.
+    num_rows = {}
+
+    for table, columns, write_fn in [
+        (StockPrice.__table__, STOCK_PRICE_COLUMNS, store.write_stock_prices),
+        (CurrencyRate.__table__, CURRENCY_RATE_COLUMNS, store.write_currency_rates),
+    ]:
+        num_rows[table.name] = 0
+
+        with db_sessionmaker.begin() as session:
+            result = session.execute(
+                sa.select(*(table.c[column] for column in columns)).execution_options(
+                    stream_results=True
+                )
+            )
+
+            for chunk in result.mappings().partitions(chunk_size):
+                write_fn([dict(row) for row in chunk])
+                num_rows[table.name] += len(chunk)
+
+    return num_rows
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError as err:
+        raise RuntimeError(
+            "The columnar store requires the 'pyarrow' package to be installed"
+        ) from err
+
+    return pyarrow, pyarrow.parquet
@@ -0,0 +1,35 @@
+import configparser
+import os
+
+# Settings are read from a section of the config file and can be overridden
+# with environment variables, e.g. MARKET_DATA_LOADER_DATABASE_URI for the
+# 'uri' setting of the [database] section.
+CONFIG_PATH_ENV = "MARKET_DATA_LOADER_CONFIG"
+CONFIG_PATH = "market_data_loader.ini"
+
+
+def load_section(section, default_settings, env_prefix, config_path=None):
+    settings = dict(default_settings)
+
+    config_path = config_path or os.environ.get(CONFIG_PATH_ENV, CONFIG_PATH)
+    config = configparser.ConfigParser()
+
+    if config.read(config_path) and config.has_section(section):
+        settings.update(config.items(section))
+
+    for name in default_settings:
+        value = os.environ.get(env_prefix + name.upper())
+
+        if value is not None:
+            settings[name] = value
+
+    unknown_names = settings.keys() - default_settings.keys()
+
+    if unknown_names:
+        raise ValueError(f"Unknown {section} settings: {sorted(unknown_names)}")
+
+    # Values from the config file and the environment are strings
+    for name, default in default_settings.items():
+        settings[name] = type(default)(settings[name])
+
+    return settings
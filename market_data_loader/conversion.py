@@ -0,0 +1,478 @@
+import logging
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+import market_data_loader.clients.exchangeratesapi_client as currency_client
+from market_data_loader import columnar_store, currency, frame_cache, metrics, stock
+from market_data_loader.models import CurrencyRate, StockPrice
+
+# Number of stock prices converted at a time when streaming the results
+STREAM_CHUNK_SIZE = 50000
+
+
+def get_converted_stock_prices(
+    db_sessionmaker,
+    symbols,
+    start_date,
+    end_date,
+    target_currency,
+    concurrency=1,
+    warm_cache=False,
+):
+    fill_missing_data(
+        db_sessionmaker, symbols, start_date, end_date, target_currency, concurrency
+    )
+
+    return _query_converted_stock_prices_as_dataframe(
+        db_sessionmaker, symbols, start_date, end_date, target_currency, warm_cache
+    )
+
+
+def fill_missing_data(
+    db_sessionmaker, symbols, start_date, end_date, target_currencies, concurrency=1
+):
+    if isinstance(target_currencies, str):
+        target_currencies = [target_currencies]
+
+    logging.info(
+        "Get stock prices for %d symbols from '%s' to '%s' in '%s'",
+        len(symbols),
+        start_date,
+        end_date,
+        ",".join(target_currencies),
+    )
+
+    stock._fill_missing_dates(
+        db_sessionmaker, symbols, start_date, end_date, concurrency
+    )
+
+    fill_missing_currency_rates(
+        db_sessionmaker, symbols, start_date, end_date, target_currencies
+    )
+
+
+def fill_missing_currency_rates(
+    db_sessionmaker, symbols, start_date, end_date, target_currencies
+):
+    if isinstance(target_currencies, str):
+        target_currencies = [target_currencies]
+
+    dates_by_currency = _query_stock_dates_by_currency(
+        db_sessionmaker, symbols, start_date, end_date
+    )
+
+    # Every stock currency that differs from a target currency needs the base
+    # currency legs of both. The legs of all currencies are filled together,
+    # so that every missing date is fetched once for all of them.
+    currencies = [
+        currency_code
+        for base_currency in dates_by_currency
+        for target_currency in target_currencies
+        if base_currency != target_currency
+        for currency_code in (base_currency, target_currency)
+    ]
+
+    if not currencies:
+        return
+
+    dates = sorted(
+        {date for base_dates in dates_by_currency.values() for date in base_dates}
+    )
+
+    currency._fill_missing_rates(
+        db_sessionmaker,
+        dates,
+        currencies,
+        [
+            target_currency
+            for target_currency in target_currencies
+            if target_currency in currencies
+        ],
+    )
+
+
+def _query_stock_dates_by_currency(db_sessionmaker, symbols, start_date, end_date):
+    with db_sessionmaker.begin() as session:
+        data_rows = (
+            session.query(StockPrice.currency, StockPrice.date)
+            .filter(StockPrice.symbol.in_(symbols))
+            .filter(StockPrice.date >= start_date, StockPrice.date <= end_date)
+            .distinct()
+            .all()
+        )
+
+    dates_by_currency = {}
+
+    for base_currency, date in data_rows:
+        dates_by_currency.setdefault(base_currency, []).append(date)
+
+    return dates_by_currency
+
+
+def _converted_stock_prices_statement(symbols, start_date, end_date, target_currency):
+    # The currency client that we are using supports only a single base
+    # currency, so the rate from the stock currency to the target currency is
+    # combined from two legs through the base currency. Both legs are joined
+    # in SQL, so that the converted prices come out of a single query.
+    base_rate = orm.aliased(CurrencyRate)
+    target_rate = orm.aliased(CurrencyRate)
+
+    rate = sa.case(
+        (StockPrice.currency == target_currency, 1.0),
+        else_=target_rate.rate / base_rate.rate,
+    )
+
+    return (
+        sa.select(
+            StockPrice.date,
+            StockPrice.symbol,
+            StockPrice.exchange,
+            sa.literal(target_currency).label("currency"),
+            (StockPrice.close_price * rate).label("close_price"),
+            rate.label("rate"),
+        )
+        .outerjoin(
+            base_rate,
+            sa.and_(
+                base_rate.date == StockPrice.date,
+                base_rate.base_currency == currency_client.BASE_CURRENCY,
+                base_rate.target_currency == StockPrice.currency,
+            ),
+        )
+        .outerjoin(
+            target_rate,
+            sa.and_(
+                target_rate.date == StockPrice.date,
+                target_rate.base_currency == currency_client.BASE_CURRENCY,
+                target_rate.target_currency == target_currency,
+            ),
+        )
+        .filter(StockPrice.symbol.in_(symbols))
+        .filter(StockPrice.date >= start_date, StockPrice.date <= end_date)
+        .order_by(StockPrice.symbol, StockPrice.date)
+    )
+
+
+@metrics.timed("conversion.query_rows")
+def query_converted_stock_price_rows(
+    db_sessionmaker, symbols, start_date, end_date, target_currency
+):
+    # Returns the converted prices as plain rows, which is cheaper than a
+    # DataFrame for small results and doesn't need pandas to be imported
+    store = columnar_store.get_store()
+
+    if store is not None:
+        stock_prices_df = _read_converted_stock_prices_from_store(
+            store, symbols, start_date, end_date, target_currency
+        )
+
+        return list(stock_prices_df.reset_index().itertuples(index=False))
+
+    statement = _converted_stock_prices_statement(
+        symbols, start_date, end_date, target_currency
+    )
+
+    with db_sessionmaker.begin() as session:
+        return session.execute(statement).all()
+
+
+def _query_converted_stock_prices_as_dataframe(
+    db_sessionmaker, symbols, start_date, end_date, target_currency, warm_cache=False
+):
+    # The frames of the symbols and currency pairs cover whole date ranges, so
+    # reading them is several times slower than the SQL join. They are only
+    # converted when they are cached, or when a long-running process wants
+    # them cached for its next requests.
+    if warm_cache or _are_stock_prices_cached(
+        db_sessionmaker, symbols, start_date, end_date
+    ):
+        return query_converted_stock_prices(
+            db_sessionmaker, symbols, start_date, end_date, [target_currency]
+        )
+
+    return _read_converted_stock_prices(
+        db_sessionmaker, symbols, start_date, end_date, target_currency
+    )
+
+
+def _are_stock_prices_cached(db_sessionmaker, symbols, start_date, end_date):
+    return all(
+        frame_cache.CACHE.contains(
+            stock._cache_key(db_sessionmaker, symbol), start_date, end_date
+        )
+        for symbol in symbols
+    )
+
+
+@metrics.timed("conversion.read_sql")
+def _read_converted_stock_prices(
+    db_sessionmaker, symbols, start_date, end_date, target_currency
+):
+    import pandas as pd
+
+    store = columnar_store.get_store()
+
+    if store is not None:
+        return _read_converted_stock_prices_from_store(
+            store, symbols, start_date, end_date, target_currency
+        )
+
+    statement = _converted_stock_prices_statement(
+        symbols, start_date, end_date, target_currency
+    )
+
+    with db_sessionmaker.begin() as session:
+        return pd.read_sql(statement, session.bind, index_col="date")
+
+
+def _read_converted_stock_prices_from_store(
+    store, symbols, start_date, end_date, target_currency
+):
+    import numpy as np
+
+    stock_prices_df = store.read_stock_prices(symbols, start_date, end_date)
+
+    target_rates = store.read_currency_rates(
+        currency_client.BASE_CURRENCY, target_currency, start_date, end_date
+    )["rate"]
+
+    # The same cross rate computation as in the SQL statement, on the columns
+    # read from the columnar store
+    rates = np.ones(len(stock_prices_df))
+
+    for base_currency in stock_prices_df["currency"].unique():
+        if base_currency == target_currency:
+            continue
+
+        base_rates = store.read_currency_rates(
+            currency_client.BASE_CURRENCY, base_currency, start_date, end_date
+        )["rate"]
+
+        is_base_currency = (stock_prices_df["currency"] == base_currency).to_numpy()
+
+        rates[is_base_currency] = (
+            stock_prices_df.index[is_base_currency]
+            .map(target_rates / base_rates)
+            .to_numpy(dtype=float)
+        )
+
+    stock_prices_df = stock_prices_df[["symbol", "exchange"]].assign(
+        currency=target_currency,
+        close_price=stock_prices_df["close_price"].to_numpy() * rates,
+        rate=rates,
+    )
+
+    return stock_prices_df
+
+
+@metrics.timed("conversion.query_matrix")
+def query_converted_stock_prices(
+    db_sessionmaker, symbols, start_date, end_date, target_currencies, layout="long"
+):
+    # Converts the prices to several target currencies at once
+    import pandas as pd
+
+    if isinstance(target_currencies, str):
+        target_currencies = [target_currencies]
+
+    if not layout in ("long", "wide"):
+        raise ValueError(f"Unknown layout '{layout}'")
+
+    target_currencies = list(dict.fromkeys(target_currencies))
+
+    # Both reads go through the frame cache and the columnar store
+    stock_prices_df = stock._query_stock_prices_as_dataframe(
+        db_sessionmaker, symbols, start_date, end_date
+    )
+
+    currencies = list(
+        dict.fromkeys(list(stock_prices_df["currency"].unique()) + target_currencies)
+    )
+    dates = pd.Index(stock_prices_df.index.unique())
+
+    rates = _query_currency_rate_matrix(
+        db_sessionmaker, dates, currencies, start_date, end_date
+    )
+
+    return _convert_stock_prices(
+        stock_prices_df, rates, dates, currencies, target_currencies, layout
+    )
+
+
+@metrics.timed("conversion.iter_chunks")
+def iter_converted_stock_prices(
+    db_sessionmaker,
+    symbols,
+    start_date,
+    end_date,
+    target_currencies,
+    layout="long",
+    chunk_size=STREAM_CHUNK_SIZE,
+):
+    # Yields the converted prices as DataFrames of at most 'chunk_size' stock
+    # prices each, so that the memory used doesn't grow with the result. Only
+    # the rate matrix of the whole date range is kept, which is small.
+    import pandas as pd
+
+    if isinstance(target_currencies, str):
+        target_currencies = [target_currencies]
+
+    if not layout in ("long", "wide"):
+        raise ValueError(f"Unknown layout '{layout}'")
+
+    target_currencies = list(dict.fromkeys(target_currencies))
+
+    currencies = list(
+        dict.fromkeys(
+            _query_stock_currencies(db_sessionmaker, symbols, start_date, end_date)
+            + target_currencies
+        )
+    )
+    dates = pd.Index(
+        [timestamp.date() for timestamp in pd.date_range(start_date, end_date)]
+    )
+
+    rates = _query_currency_rate_matrix(
+        db_sessionmaker, dates, currencies, start_date, end_date
+    )
+
+    for stock_prices_df in _iter_stock_prices(
+        db_sessionmaker, symbols, start_date, end_date, chunk_size
+    ):
+        yield _convert_stock_prices(
+            stock_prices_df, rates, dates, currencies, target_currencies, layout
+        )
+
+
+def _query_stock_currencies(db_sessionmaker, symbols, start_date, end_date):
+    with db_sessionmaker.begin() as session:
+        data_rows = (
+            session.query(StockPrice.currency)
+            .filter(StockPrice.symbol.in_(symbols))
+            .filter(StockPrice.date >= start_date, StockPrice.date <= end_date)
+            .distinct()
+            .all()
+        )
+
+    return sorted(row[0] for row in data_rows)
+
+
+def _iter_stock_prices(db_sessionmaker, symbols, start_date, end_date, chunk_size):
+    import pandas as pd
+
+    store = columnar_store.get_store()
+
+    if store is not None:
+        # The partitions of a single symbol are read at a time
+        for symbol in sorted(set(symbols)):
+            stock_prices_df = store.read_stock_prices([symbol], start_date, end_date)
+
+            for offset in range(0, len(stock_prices_df), chunk_size):
+                yield stock_prices_df.iloc[offset : offset + chunk_size]
+
+        return
+
+    statement = (
+        sa.select(
+            StockPrice.date,
+            StockPrice.symbol,
+            StockPrice.close_price,
+            StockPrice.exchange,
+            StockPrice.currency,
+        )
+        .filter(StockPrice.symbol.in_(symbols))
+        .filter(StockPrice.date >= start_date, StockPrice.date <= end_date)
+        .order_by(StockPrice.symbol, StockPrice.date)
+    )
+
+    with db_sessionmaker.begin() as session:
+        connection = session.connection(execution_options={"stream_results": True})
+
+        yield from pd.read_sql(
+            statement, connection, index_col="date", chunksize=chunk_size
+        )
+
+
+def _convert_stock_prices(
+    stock_prices_df, rates, dates, currencies, target_currencies, layout
+):
+    # Converts the prices with the (date x currency) matrix of the rates from
+    # the base currency. The long layout has a row per stock price and target
+    # currency, the wide layout a 'close_price_<currency>' column per target
+    # currency.
+    import numpy as np
+    import pandas as pd
+
+    stock_dates = stock_prices_df.index.to_numpy()
+
+    date_indices = dates.get_indexer(stock_dates)
+    currency_indices = pd.Index(currencies).get_indexer(
+        stock_prices_df["currency"].to_numpy()
+    )
+    target_indices = pd.Index(currencies).get_indexer(target_currencies)
+
+    # The cross rate of every stock price to every target currency, divided
+    # through the base currency legs in one go
+    cross_rates = (
+        rates[date_indices][:, target_indices]
+        / rates[date_indices, currency_indices][:, None]
+    )
+    cross_rates[currency_indices[:, None] == target_indices[None, :]] = 1.0
+
+    close_prices = stock_prices_df["close_price"].to_numpy(dtype=float)[:, None]
+
+    if layout == "wide":
+        return stock_prices_df[["symbol", "exchange"]].assign(
+            **{
+                f"close_price_{target_currency}": close_prices[:, 0]
+                * cross_rates[:, index]
+                for index, target_currency in enumerate(target_currencies)
+            }
+        )
+
+    num_targets = len(target_currencies)
+
+    return pd.DataFrame(
+        {
+            "symbol": np.repeat(stock_prices_df["symbol"].to_numpy(), num_targets),
+            "exchange": np.repeat(stock_prices_df["exchange"].to_numpy(), num_targets),
+            "currency": np.tile(target_currencies, len(stock_prices_df)),
+            "close_price": (close_prices * cross_rates).ravel(),
+            "rate": cross_rates.ravel(),
+        },
+        index=pd.Index(np.repeat(stock_dates, num_targets), name="date"),
+    )
+
+
+def _query_currency_rate_matrix(
+    db_sessionmaker, dates, currencies, start_date, end_date
+):
+    # Returns a (date x currency) matrix of the rates from the base currency,
+    # with NaN for missing rates
+    import numpy as np
+
+    rates = np.full((len(dates), len(currencies)), np.nan)
+
+    for column_index, currency_code in enumerate(currencies):
+        # The base currency has no rates of its own
+        if currency_code == currency_client.BASE_CURRENCY:
+            rates[:, column_index] = 1.0
+            continue
+
+        currency_rates = currency._query_currency_rates_as_dataframe(
+            db_sessionmaker,
+            currency_client.BASE_CURRENCY,
+            currency_code,
+            start_date,
+            end_date,
+        )["rate"]
+
+        row_indices = dates.get_indexer(currency_rates.index)
+        is_stock_date = row_indices >= 0
+
+        rates[row_indices[is_stock_date], column_index] = currency_rates.to_numpy(
+            dtype=float
+        )[is_stock_date]
+
+    return rates
@@ -0,0 +1,49 @@
+import datetime
+
+import sqlalchemy as sa
+
+# Coverage tables store the date intervals that have been fully loaded for a
+# key (e.g. a symbol or a currency pair). Overlapping and adjacent intervals are
+# merged on write, so that checking whether a date range is fully loaded takes
+# a single indexed lookup.
+
+
+def query_covered_keys(
+    session, table, key_column_name, keys, start_date, end_date, **filters
+):
+    key_column = table.c[key_column_name]
+
+    statement = sa.select(key_column).where(
+        key_column.in_(keys),
+        table.c.start_date <= start_date,
+        table.c.end_date >= end_date,
+        *(table.c[column_name] == value for column_name, value in filters.items()),
+    )
+
+    return {row[0] for row in session.execute(statement)}
+
+
+def add_interval(session, table, start_date, end_date, **keys):
+    key_filters = [table.c[column_name] == value for column_name, value in keys.items()]
+
+    overlapping_intervals = session.execute(
+        sa.select(table.c.id, table.c.start_date, table.c.end_date).where(
+            *key_filters,
+            table.c.start_date <= end_date + datetime.timedelta(days=1),
+            table.c.end_date >= start_date - datetime.timedelta(days=1),
+        )
+    ).all()
+
+    if overlapping_intervals:
+        start_date = min(start_date, *(row.start_date for row in overlapping_intervals))
+        end_date = max(end_date, *(row.end_date for row in overlapping_intervals))
+
+        session.execute(
+            sa.delete(table).where(
+                table.c.id.in_([row.id for row in overlapping_intervals])
+            )
+        )
+
+    session.execute(
+        sa.insert(table).values(start_date=start_date, end_date=end_date, **keys)
+    )
@@ -1,9 +1,25 @@
+import datetime
+import itertools
 import logging
 
-import pandas as pd
-
 import market_data_loader.clients.exchangeratesapi_client as currency_client
-from market_data_loader.models import CurrencyRate
+from market_data_loader import (
+    columnar_store,
+    coverage,
+    database,
+    frame_cache,
+    metrics,
+    scheduler,
+)
+from market_data_loader.models import CurrencyRate, CurrencyRateCoverage
+
+# Number of missing dates above which a date range is fetched instead of
+# individual dates
+TIMESERIES_THRESHOLD = 3
+
+
+class UnsupportedCurrency(RuntimeError):
+    pass
 
 
 def get_currency_rates(db_sessionmaker, dates, base_currency, target_currency):
@@ -15,64 +31,186 @@ def get_currency_rates(db_sessionmaker, dates, base_currency, target_currency):
 
 
 def _fill_missing_dates(db_sessionmaker, dates, base_currency, target_currency):
+    _fill_missing_rates(
+        db_sessionmaker, dates, [base_currency, target_currency], [target_currency]
+    )
+
+
+@metrics.timed("currency.fill_missing_dates")
+def _fill_missing_rates(db_sessionmaker, dates, currencies, target_currencies):
+    # Fills the rates from the base currency to all the given currencies. The
+    # rates of all currencies are fetched together, with a single request per
+    # missing date or date range.
     start_date = min(dates)
     end_date = max(dates)
 
-    target_currency_cached_dates = _query_cached_dates(
-        db_sessionmaker,
-        currency_client.BASE_CURRENCY,
-        target_currency,
-        start_date,
-        end_date,
+    currencies = list(dict.fromkeys(currencies))
+
+    uncovered_currencies = _query_uncovered_currencies(
+        db_sessionmaker, currencies, start_date, end_date
     )
 
-    if not target_currency_cached_dates and not _is_valid_currency(target_currency):
-        raise RuntimeError(f"Target currency '{target_currency}' is not supported")
+    if not uncovered_currencies:
+        return
 
-    base_currency_cached_dates = _query_cached_dates(
-        db_sessionmaker,
-        currency_client.BASE_CURRENCY,
-        base_currency,
-        start_date,
-        end_date,
+    cached_dates_by_currency = {
+        currency_code: _query_cached_dates(
+            db_sessionmaker,
+            currency_client.BASE_CURRENCY,
+            currency_code,
+            start_date,
+            end_date,
+        )
+        for currency_code in currencies
+    }
+
+    unknown_currencies = [
+        currency_code
+        for currency_code in target_currencies
+        if not cached_dates_by_currency[currency_code]
+    ]
+
+    if unknown_currencies:
+        for currency_code in _unsupported_currencies(unknown_currencies):
+            raise UnsupportedCurrency(
+                f"Target currency '{currency_code}' is not supported"
+            )
+
+    # Business days of the range without a rate (e.g. exchange holidays, or the
+    # days between two loaded ranges) are fetched as well, so that the range
+    # can be covered
+    missing_dates = sorted(
+        {
+            date
+            for date in itertools.chain(dates, _business_days(start_date, end_date))
+            if any(
+                not date in cached_dates
+                for cached_dates in cached_dates_by_currency.values()
+            )
+        }
     )
 
-    with db_sessionmaker.begin() as session:
-        for date in dates:
-            if (
-                date in base_currency_cached_dates
-                and date in target_currency_cached_dates
-            ):
-                continue
-
-            currency_rate = currency_client.currency_rate(
-                date, [base_currency, target_currency]
+    if missing_dates:
+        _fetch_missing_dates(db_sessionmaker, missing_dates, cached_dates_by_currency)
+
+    _add_coverage(db_sessionmaker, uncovered_currencies, start_date, end_date)
+
+
+def _fetch_missing_dates(db_sessionmaker, missing_dates, cached_dates_by_currency):
+    currencies = list(cached_dates_by_currency)
+
+    with scheduler.priority(scheduler.priority_for(missing_dates[0])):
+        # Fetching a range of dates with a single request is much cheaper than
+        # fetching more than a few dates one by one, even though the range also
+        # contains dates that we don't need.
+        if len(missing_dates) > TIMESERIES_THRESHOLD:
+            currency_rates = _fetch_currency_rate_range(
+                missing_dates[0], missing_dates[-1], currencies
             )
+        else:
+            currency_rates = _fetch_currency_rates(missing_dates, currencies)
+
+        rows = _currency_rate_rows(currency_rates, cached_dates_by_currency)
+
+    with database.begin_write(db_sessionmaker) as session:
+        database.insert_or_ignore(session, CurrencyRate.__table__, rows)
 
-            if not date in base_currency_cached_dates:
-                session.add(
-                    CurrencyRate(
-                        date=date,
-                        base_currency=currency_rate["base"],
-                        target_currency=base_currency,
-                        rate=float(currency_rate["rates"][base_currency]),
-                    )
+    _store_currency_rates(db_sessionmaker, rows)
+
+
+def _query_uncovered_currencies(db_sessionmaker, currencies, start_date, end_date):
+    with db_sessionmaker.begin() as session:
+        covered_currencies = coverage.query_covered_keys(
+            session,
+            CurrencyRateCoverage.__table__,
+            "target_currency",
+            currencies,
+            start_date,
+            end_date,
+            base_currency=currency_client.BASE_CURRENCY,
+        )
+
+    return [currency for currency in currencies if not currency in covered_currencies]
+
+
+def _add_coverage(db_sessionmaker, currencies, start_date, end_date):
+    # Rates are only needed for the dates of stock prices, which are never on
+    # weekends, so an interval is covered once every business day within it
+    # has a rate.
+    business_days = _business_days(start_date, end_date)
+
+    with database.begin_write(db_sessionmaker) as session:
+        for currency in currencies:
+            cached_dates = {
+                row[0]
+                for row in session.query(CurrencyRate.date)
+                .filter(
+                    CurrencyRate.base_currency == currency_client.BASE_CURRENCY,
+                    CurrencyRate.target_currency == currency,
+                )
+                .filter(CurrencyRate.date >= start_date, CurrencyRate.date <= end_date)
+            }
+
+            if all(date in cached_dates for date in business_days):
+                coverage.add_interval(
+                    session,
+                    CurrencyRateCoverage.__table__,
+                    start_date,
+                    end_date,
+                    base_currency=currency_client.BASE_CURRENCY,
+                    target_currency=currency,
                 )
 
-            if not date in target_currency_cached_dates:
-                session.add(
-                    CurrencyRate(
-                        date=date,
-                        base_currency=currency_rate["base"],
-                        target_currency=target_currency,
-                        rate=float(currency_rate["rates"][target_currency]),
-                    )
+
+def _business_days(start_date, end_date):
+    return [
+        start_date + datetime.timedelta(days=day)
+        for day in range((end_date - start_date).days + 1)
+        if (start_date + datetime.timedelta(days=day)).weekday() < 5
+    ]
+
+
+def _fetch_currency_rates(dates, currencies):
+    for date in dates:
+        yield date, currency_client.currency_rate(date, currencies)
+
+
+def _fetch_currency_rate_range(start_date, end_date, currencies):
+    return _parse_timeseries(
+        currency_client.timeseries(start_date, end_date, currencies)
+    )
+
+
+def _parse_timeseries(timeseries):
+    for date_str, rates in sorted(timeseries["rates"].items()):
+        date = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+
+        yield date, {"base": timeseries["base"], "rates": rates}
+
+
+def _currency_rate_rows(currency_rates, cached_dates_by_currency):
+    rows = []
+
+    for date, currency_rate in currency_rates:
+        for currency, cached_dates in cached_dates_by_currency.items():
+            if not date in cached_dates:
+                rows.append(
+                    {
+                        "date": date,
+                        "base_currency": currency_rate["base"],
+                        "target_currency": currency,
+                        "rate": float(currency_rate["rates"][currency]),
+                    }
                 )
 
+    return rows
+
 
-def _is_valid_currency(currency):
+def _unsupported_currencies(currencies):
     currency_codes = currency_client.currencies()
-    return currency in currency_codes["symbols"]
+    return [
+        currency for currency in currencies if not currency in currency_codes["symbols"]
+    ]
 
 
 def _get_currency_rates(db_sessionmaker, dates, base_currency, target_currency):
@@ -140,6 +278,61 @@ def _query_cached_dates(
 def _query_currency_rates_as_dataframe(
     db_sessionmaker, base_currency, target_currency, start_date, end_date
 ):
+    cache_key = _cache_key(db_sessionmaker, base_currency, target_currency)
+
+    currency_rates_df = frame_cache.CACHE.get(cache_key, start_date, end_date)
+
+    if currency_rates_df is None:
+        currency_rates_df = _read_currency_rates_as_dataframe(
+            db_sessionmaker, base_currency, target_currency, start_date, end_date
+        )
+
+        frame_cache.CACHE.put(cache_key, start_date, end_date, currency_rates_df)
+
+    return currency_rates_df
+
+
+def _cache_key(db_sessionmaker, base_currency, target_currency):
+    return (
+        "currency_rates",
+        db_sessionmaker.kw.get("bind"),
+        base_currency,
+        target_currency,
+    )
+
+
+def _store_currency_rates(db_sessionmaker, rows):
+    # Called after new rows have been written to the database
+    store = columnar_store.get_store()
+
+    if store is not None:
+        store.write_currency_rates(rows)
+
+    _invalidate_cached_currency_rates(db_sessionmaker, rows)
+
+
+def _invalidate_cached_currency_rates(db_sessionmaker, rows):
+    for base_currency, target_currency in {
+        (row["base_currency"], row["target_currency"]) for row in rows
+    }:
+        frame_cache.CACHE.invalidate(
+            _cache_key(db_sessionmaker, base_currency, target_currency)
+        )
+
+
+@metrics.timed("currency.read_sql")
+def _read_currency_rates_as_dataframe(
+    db_sessionmaker, base_currency, target_currency, start_date, end_date
+):
+    import pandas as pd
+
+    store = columnar_store.get_store()
+
+    if store is not None:
+        return store.read_currency_rates(
+            base_currency, target_currency, start_date, end_date
+        )
+
     with db_sessionmaker.begin() as session:
         statement = (
             session.query(CurrencyRate)
@@ -1,13 +1,161 @@
+import contextlib
+
 import sqlalchemy as db
+import sqlalchemy.dialects.postgresql
+import sqlalchemy.dialects.sqlite
+import sqlalchemy.event
 import sqlalchemy.orm as orm
 
+from market_data_loader import config, metrics
+
 ENGINE_URI = "sqlite:///market_data_loader.db"
 
+# Execution option of the connections of write transactions
+WRITE_OPTION = "market_data_loader_write"
+
+# Settings are read from the [database] section of the config file and can be
+# overridden with MARKET_DATA_LOADER_DATABASE_<SETTING> environment variables,
+# e.g. MARKET_DATA_LOADER_DATABASE_URI.
+CONFIG_PATH_ENV = config.CONFIG_PATH_ENV
+CONFIG_SECTION = "database"
+SETTINGS_ENV_PREFIX = "MARKET_DATA_LOADER_DATABASE_"
+
+DEFAULT_SETTINGS = {
+    "uri": ENGINE_URI,
+    # 'tuned' or 'default'
+    "sqlite_profile": "tuned",
+    # Milliseconds to wait for a lock held by another connection
+    "busy_timeout": 30000,
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative values are in KiB
+    "cache_size": -64 * 1024,
+    # Connection pool, SQLite in-memory databases aren't pooled
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_timeout": 30,
+    "pool_recycle": 3600,
+}
+
+
+def load_settings(config_path=None):
+    settings = config.load_section(
+        CONFIG_SECTION, DEFAULT_SETTINGS, SETTINGS_ENV_PREFIX, config_path
+    )
+
+    if settings["sqlite_profile"] not in ("tuned", "default"):
+        raise ValueError(
+            f"Unknown SQLite profile '{settings['sqlite_profile']}', "
+            f"expected 'tuned' or 'default'"
+        )
+
+    return settings
 
-def create_engine():
-    return db.create_engine(ENGINE_URI)
 
+def create_engine(settings=None):
+    settings = settings or load_settings()
 
-def create_sessionmaker():
-    engine = create_engine()
+    url = db.engine.make_url(settings["uri"])
+
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            engine = db.create_engine(url)
+        else:
+            # Keep connections (and their page caches) open between sessions,
+            # shared by the threads of a long-running process
+            engine = db.create_engine(
+                url,
+                poolclass=db.pool.QueuePool,
+                pool_size=settings["pool_size"],
+                max_overflow=settings["max_overflow"],
+                pool_timeout=settings["pool_timeout"],
+                connect_args={"check_same_thread": False},
+            )
+
+        if settings["sqlite_profile"] == "tuned":
+            _tune_sqlite(engine, settings)
+
+        return engine
+
+    return db.create_engine(
+        url,
+        pool_size=settings["pool_size"],
+        max_overflow=settings["max_overflow"],
+        pool_timeout=settings["pool_timeout"],
+        pool_recycle=settings["pool_recycle"],
+        pool_pre_ping=True,
+    )
+
+
+def create_sessionmaker(settings=None):
+    engine = create_engine(settings)
     return orm.sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def _tune_sqlite(engine, settings):
+    # WAL lets readers run alongside a writer, and synchronous=NORMAL is safe
+    # in WAL mode while only syncing on checkpoints.
+    @db.event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself, see on_begin()
+        dbapi_connection.isolation_level = None
+
+        cursor = dbapi_connection.cursor()
+
+        for pragma in [
+            "journal_mode=WAL",
+            "synchronous=NORMAL",
+            f"busy_timeout={settings['busy_timeout']}",
+            f"mmap_size={settings['mmap_size']}",
+            f"cache_size={settings['cache_size']}",
+        ]:
+            cursor.execute(f"PRAGMA {pragma}")
+
+        cursor.close()
+
+    # Write transactions (see begin_write()) take the write lock up front. A
+    # transaction that reads before it writes (e.g. merging coverage
+    # intervals) would otherwise fail with "database is locked" when another
+    # writer committed in between, without waiting for the busy timeout. Read
+    # transactions don't take the lock, so they never block each other or
+    # the writers.
+    @db.event.listens_for(engine, "begin")
+    def on_begin(connection):
+        if connection.get_execution_options().get(WRITE_OPTION):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            connection.exec_driver_sql("BEGIN")
+
+
+@contextlib.contextmanager
+def begin_write(db_sessionmaker):
+    # Like db_sessionmaker.begin(), for transactions that write
+    with db_sessionmaker.begin() as session:
+        session.connection(execution_options={WRITE_OPTION: True})
+
+        yield session
+
+
+def insert_or_ignore(session, table, rows):
+    # Inserts all the rows with a single executemany-style statement. Rows that
+    # conflict with a unique index are skipped, so that concurrent loaders
+    # storing the same data don't fail each other.
+    if not rows:
+        return
+
+    with metrics.stage("database.insert"):
+        session.execute(_insert_or_ignore_statement(session.bind.dialect, table), rows)
+
+    metrics.increment("rows_inserted_total", len(rows), table=table.name)
+
+
+def _insert_or_ignore_statement(dialect, table):
+    if dialect.name == "sqlite":
+        return db.dialects.sqlite.insert(table).on_conflict_do_nothing()
+
+    if dialect.name == "postgresql":
+        return db.dialects.postgresql.insert(table).on_conflict_do_nothing()
+
+    if dialect.name == "mysql":
+        return table.insert().prefix_with("IGNORE")
+
+    raise RuntimeError(f"Database dialect '{dialect.name}' is not supported")
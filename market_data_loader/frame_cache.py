@@ -0,0 +1,159 @@
+import collections
+import logging
+import threading
+
+from market_data_loader import config
+
+# Default memory budget of the in-process cache
+MAX_BYTES = 256 * 1024 * 1024
+
+# Settings are read from the [frame_cache] section of the config file and can be
+# overridden with MARKET_DATA_LOADER_FRAME_CACHE_<SETTING> environment variables.
+CONFIG_SECTION = "frame_cache"
+SETTINGS_ENV_PREFIX = "MARKET_DATA_LOADER_FRAME_CACHE_"
+
+DEFAULT_SETTINGS = {
+    # Memory budget in bytes, 0 disables the cache
+    "max_bytes": MAX_BYTES,
+}
+
+
+class FrameCache:
+    # A memory-bounded LRU cache of date-indexed DataFrames. Each entry holds
+    # all rows of a key (e.g. a symbol or a currency pair) within a date range,
+    # so any sub-range of a cached range is served from memory as well.
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = collections.OrderedDict()
+        self._ranges_by_key = {}
+        self._num_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, start_date, end_date):
+        with self._lock:
+            for range_start_date, range_end_date in self._ranges_by_key.get(key, ()):
+                if range_start_date <= start_date and end_date <= range_end_date:
+                    entry_key = (key, range_start_date, range_end_date)
+                    self._entries.move_to_end(entry_key)
+                    df, _ = self._entries[entry_key]
+                    self.hits += 1
+                    break
+            else:
+                self.misses += 1
+                return None
+
+        if range_start_date == start_date and range_end_date == end_date:
+            return df.copy()
+
+        return df[(df.index >= start_date) & (df.index <= end_date)]
+
+    def contains(self, key, start_date, end_date):
+        # Unlike get(), neither counts as a hit or miss nor refreshes the entry
+        with self._lock:
+            return any(
+                range_start_date <= start_date and end_date <= range_end_date
+                for range_start_date, range_end_date in self._ranges_by_key.get(key, ())
+            )
+
+    def put(self, key, start_date, end_date, df):
+        num_bytes = int(df.memory_usage(index=True, deep=True).sum())
+
+        if num_bytes > self.max_bytes:
+            return
+
+        # The caller keeps using its own copy
+        df = df.copy()
+
+        with self._lock:
+            entry_key = (key, start_date, end_date)
+
+            if entry_key in self._entries:
+                self._remove(entry_key)
+
+            self._entries[entry_key] = (df, num_bytes)
+            self._ranges_by_key.setdefault(key, set()).add((start_date, end_date))
+            self._num_bytes += num_bytes
+
+            self._evict()
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def invalidate(self, key):
+        with self._lock:
+            for start_date, end_date in list(self._ranges_by_key.get(key, ())):
+                self._remove((key, start_date, end_date))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ranges_by_key.clear()
+            self._num_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._num_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _evict(self):
+        while self._num_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, entry_key):
+        key, start_date, end_date = entry_key
+        _, num_bytes = self._entries.pop(entry_key)
+        self._num_bytes -= num_bytes
+
+        ranges = self._ranges_by_key[key]
+        ranges.discard((start_date, end_date))
+
+        if not ranges:
+            del self._ranges_by_key[key]
+
+
+CACHE = FrameCache()
+
+
+def load_settings(config_path=None):
+    settings = config.load_section(
+        CONFIG_SECTION, DEFAULT_SETTINGS, SETTINGS_ENV_PREFIX, config_path
+    )
+
+    if settings["max_bytes"] < 0:
+        raise ValueError("The frame cache budget can't be negative")
+
+    return settings
+
+
+def configure(settings=None):
+    settings = settings or load_settings()
+
+    CACHE.resize(settings["max_bytes"])
+
+
+def log_stats():
+    stats = CACHE.stats()
+
+    logging.debug(
+        "Frame cache: hits=%d misses=%d evictions=%d entries=%d bytes=%d/%d",
+        stats["hits"],
+        stats["misses"],
+        stats["evictions"],
+        stats["entries"],
+        stats["bytes"],
+        stats["max_bytes"],
+    )
@@ -0,0 +1,63 @@
+import collections
+import logging
+import threading
+
+# Number of most recent latencies kept per name
+LATENCY_SAMPLES = 10000
+
+
+class LatencyRecorder:
+    # Keeps the most recent latencies (in seconds) per name, e.g. per request
+    # endpoint, and summarizes them as percentiles.
+
+    def __init__(self, max_samples=LATENCY_SAMPLES):
+        self._latencies = collections.defaultdict(
+            lambda: collections.deque(maxlen=max_samples)
+        )
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed):
+        with self._lock:
+            self._latencies[name].append(elapsed)
+
+    def stats(self):
+        with self._lock:
+            latencies = {
+                name: sorted(samples) for name, samples in self._latencies.items()
+            }
+
+        return {
+            name: {
+                "count": len(samples),
+                "mean": sum(samples) / len(samples),
+                "p50": _percentile(samples, 0.5),
+                "p90": _percentile(samples, 0.9),
+                "p99": _percentile(samples, 0.99),
+                "max": samples[-1],
+            }
+            for name, samples in latencies.items()
+            if samples
+        }
+
+    def log_stats(self, label):
+        for name, stats in sorted(self.stats().items()):
+            logging.debug(
+                "%s latency for '%s': count=%d mean=%.3fs p50=%.3fs p90=%.3fs p99=%.3fs max=%.3fs",
+                label,
+                name,
+                stats["count"],
+                stats["mean"],
+                stats["p50"],
+                stats["p90"],
+                stats["p99"],
+                stats["max"],
+            )
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+
+
+def _percentile(sorted_samples, fraction):
+    index = min(int(fraction * len(sorted_samples)), len(sorted_samples) - 1)
+    return sorted_samples[index]
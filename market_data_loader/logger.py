@@ -2,7 +2,7 @@ import logging
 import sys
 
 
-def configure_logger(level=logging.INFO):
+def configure_logger(level=logging.INFO, stream=None):
     logger = logging.getLogger()
     logger.setLevel(level)
 
@@ -10,6 +10,7 @@ def configure_logger(level=logging.INFO):
         f"%(asctime)s [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"
     )
 
-    stdout_handler = logging.StreamHandler(sys.stdout)
-    stdout_handler.setFormatter(formatter)
-    logger.addHandler(stdout_handler)
+    # Logs go to the standard output, unless it carries streamed results
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
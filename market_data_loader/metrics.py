@@ -0,0 +1,209 @@
+import functools
+import json
+import threading
+import time
+
+# Prefix of the metric names in the Prometheus text format
+PROMETHEUS_PREFIX = "market_data_loader_"
+
+# Metrics are only collected once enabled, so that instrumented code costs a
+# single flag check otherwise.
+_enabled = False
+
+_counters = {}
+_stages = {}
+_lock = threading.Lock()
+
+
+class _Stage:
+    # Measures the wall and CPU time of a block. Nested stages are measured
+    # separately, so the time of a stage includes the time of its children.
+    # The CPU time is the time of the whole process, including other threads.
+
+    __slots__ = ("name", "wall_start_time", "cpu_start_time")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if _enabled:
+            self.wall_start_time = time.perf_counter()
+            self.cpu_start_time = time.process_time()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not _enabled:
+            return
+
+        wall_time = time.perf_counter() - self.wall_start_time
+        cpu_time = time.process_time() - self.cpu_start_time
+
+        with _lock:
+            count, total_wall_time, total_cpu_time = _stages.get(self.name, (0, 0, 0))
+            _stages[self.name] = (
+                count + 1,
+                total_wall_time + wall_time,
+                total_cpu_time + cpu_time,
+            )
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _stages.clear()
+
+
+def increment(metric_name, value=1, **labels):
+    if not _enabled:
+        return
+
+    key = (metric_name, tuple(sorted(labels.items())))
+
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def stage(name):
+    return _Stage(name)
+
+
+def timed(name):
+    # Decorator measuring every call of a function as a stage
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+
+            with _Stage(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary():
+    # Imported here, as the HTTP client reports its metrics to this module
+    from market_data_loader import frame_cache
+    from market_data_loader.clients import http_client
+
+    with _lock:
+        counters = dict(_counters)
+        stages = dict(_stages)
+
+    cache_stats = frame_cache.CACHE.stats()
+    cache_lookups = cache_stats["hits"] + cache_stats["misses"]
+
+    return {
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(counters.items())
+        ],
+        "stages": {
+            name: {"count": count, "wall_seconds": wall_time, "cpu_seconds": cpu_time}
+            for name, (count, wall_time, cpu_time) in sorted(stages.items())
+        },
+        "http_latency": http_client.latency_stats(),
+        "frame_cache": dict(
+            cache_stats,
+            hit_ratio=cache_stats["hits"] / cache_lookups if cache_lookups else None,
+        ),
+    }
+
+
+def write_json(path):
+    with open(path, "w") as metrics_file:
+        json.dump(summary(), metrics_file, indent=2)
+
+
+def write_prometheus(path):
+    with open(path, "w") as metrics_file:
+        metrics_file.write(prometheus_text())
+
+
+def prometheus_text():
+    metrics = summary()
+    samples = {}
+
+    for counter in metrics["counters"]:
+        samples.setdefault((counter["name"], "counter"), []).append(
+            (counter["labels"], counter["value"])
+        )
+
+    for name, stage_stats in metrics["stages"].items():
+        for field, metric_name in [
+            ("count", "stage_runs_total"),
+            ("wall_seconds", "stage_wall_seconds_total"),
+            ("cpu_seconds", "stage_cpu_seconds_total"),
+        ]:
+            samples.setdefault((metric_name, "counter"), []).append(
+                ({"stage": name}, stage_stats[field])
+            )
+
+    for name, latency_stats in metrics["http_latency"].items():
+        for quantile in ["p50", "p90", "p99"]:
+            samples.setdefault(("http_request_duration_seconds", "summary"), []).append(
+                (
+                    {"name": name, "quantile": f"0.{quantile[1:]}"},
+                    latency_stats[quantile],
+                )
+            )
+
+        # The count and sum belong to the summary above
+        samples.setdefault(
+            ("http_request_duration_seconds_count", "untyped"), []
+        ).append(({"name": name}, latency_stats["count"]))
+        samples.setdefault(("http_request_duration_seconds_sum", "untyped"), []).append(
+            ({"name": name}, latency_stats["mean"] * latency_stats["count"])
+        )
+
+    for field, metric_name, metric_type in [
+        ("hits", "frame_cache_hits_total", "counter"),
+        ("misses", "frame_cache_misses_total", "counter"),
+        ("evictions", "frame_cache_evictions_total", "counter"),
+        ("entries", "frame_cache_entries", "gauge"),
+        ("bytes", "frame_cache_bytes", "gauge"),
+    ]:
+        samples[(metric_name, metric_type)] = [({}, metrics["frame_cache"][field])]
+
+    lines = []
+
+    for (name, metric_type), metric_samples in samples.items():
+        if metric_type != "untyped":
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name} {metric_type}")
+
+        for labels, value in metric_samples:
+            lines.append(f"{PROMETHEUS_PREFIX}{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+
+    formatted_labels = ",".join(
+        f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()
+    )
+
+    return f"{{{formatted_labels}}}"
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,93 @@
+import logging
+
+import sqlalchemy as sa
+
+from market_data_loader import database
+from market_data_loader.models import (
+    Base,
+    CurrencyRate,
+    ExcludedDate,
+    ExchangeHoliday,
+    StockPrice,
+)
+
+# Tables that used to have a surrogate 'id' key and a unique index led by the
+# date, and are now clustered by their primary key
+CLUSTERED_TABLES = [
+    StockPrice.__table__,
+    CurrencyRate.__table__,
+    ExcludedDate.__table__,
+    ExchangeHoliday.__table__,
+]
+
+# Rows copied at a time
+MIGRATION_CHUNK_SIZE = 100000
+
+
+def migrate(engine, chunk_size=MIGRATION_CHUNK_SIZE):
+    # Moves the tables of an existing database to the current schema. Every
+    # table is copied to a new table and swapped in within a transaction, so
+    # an interrupted migration leaves the table as it was. Tables that are
+    # already up to date are skipped, so the migration can be re-run. Returns
+    # the number of copied rows by table.
+    num_rows = {}
+
+    for table in CLUSTERED_TABLES:
+        if _is_legacy_table(engine, table):
+            num_rows[table.name] = _migrate_table(engine, table, chunk_size)
+
+    # Tables added since the database was created
+    Base.metadata.create_all(engine)
+
+    return num_rows
+
+
+def _is_legacy_table(engine, table):
+    inspector = sa.inspect(engine)
+
+    if not inspector.has_table(table.name):
+        return False
+
+    return "id" in {column["name"] for column in inspector.get_columns(table.name)}
+
+
+def _migrate_table(engine, table, chunk_size):
+    logging.info("Migrating '%s'..", table.name)
+
+    new_table = table.to_metadata(sa.MetaData(), name=f"{table.name}_migrated")
+
+    num_rows = 0
+
+    with engine.execution_options(
+        **{database.WRITE_OPTION: True}
+    ).begin() as connection:
+        legacy_table = sa.Table(table.name, sa.MetaData(), autoload_with=connection)
+
+        new_table.drop(connection, checkfirst=True)
+        new_table.create(connection)
+
+        # Reading in primary key order appends the rows to the end of the new
+        # table, so that its pages are filled up
+        result = connection.execution_options(stream_results=True).execute(
+            sa.select(
+                *(legacy_table.c[column.name] for column in table.columns)
+            ).order_by(*(legacy_table.c[column.name] for column in table.primary_key))
+        )
+
+        insert_statement = database._insert_or_ignore_statement(
+            connection.dialect, new_table
+        )
+
+        for chunk in result.mappings().partitions(chunk_size):
+            connection.execute(insert_statement, [dict(row) for row in chunk])
+            num_rows += len(chunk)
+
+        legacy_table.drop(connection)
+
+        preparer = connection.dialect.identifier_preparer
+        connection.exec_driver_sql(
+            f"ALTER TABLE {preparer.quote(new_table.name)} "
+            f"RENAME TO {preparer.quote(table.name)}"
+        )
+
+    return num_rows
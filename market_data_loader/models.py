@@ -1,26 +1,70 @@
+import datetime
+
 import sqlalchemy as sa
 import sqlalchemy.orm as orm
 
 Base = orm.declarative_base()
 
 
+class CompactDate(sa.types.TypeDecorator):
+    # Stored as a YYYYMMDD integer on SQLite, which takes 4 bytes instead of
+    # the 10 of an ISO date string and still sorts by date. Other backends
+    # have a native 4 byte date type.
+    impl = sa.Date
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(sa.Integer())
+
+        return dialect.type_descriptor(sa.Date())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+
+        return value.year * 10000 + value.month * 100 + value.day
+
+    def process_result_value(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+
+        return datetime.date(value // 10000, value // 100 % 100, value % 100)
+
+
 class CurrencyRate(Base):
     __table__ = sa.Table(
         "currency_rates",
         Base.metadata,
-        sa.Column("id", sa.Integer(), primary_key=True),
-        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("date", CompactDate(), nullable=False),
         sa.Column("base_currency", sa.String(3), nullable=False),
         sa.Column("target_currency", sa.String(3), nullable=False),
         sa.Column("rate", sa.Float(), nullable=False),
+        # Rates are read by currency pair and date range
+        sa.PrimaryKeyConstraint("base_currency", "target_currency", "date"),
+        sqlite_with_rowid=False,
+    )
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+class CurrencyRateCoverage(Base):
+    __table__ = sa.Table(
+        "currency_rate_coverage",
+        Base.metadata,
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("base_currency", sa.String(3), nullable=False),
+        sa.Column("target_currency", sa.String(3), nullable=False),
+        sa.Column("start_date", sa.Date(), nullable=False),
+        sa.Column("end_date", sa.Date(), nullable=False),
     )
 
     sa.Index(
-        "currency_rates_date_base_currency_target_currency_index",
-        __table__.c.date,
+        "currency_rate_coverage_base_currency_target_currency_start_date_index",
         __table__.c.base_currency,
         __table__.c.target_currency,
-        unique=True,
+        __table__.c.start_date,
     )
 
     def __repr__(self):
@@ -31,15 +75,68 @@ class ExcludedDate(Base):
     __table__ = sa.Table(
         "excluded_dates",
         Base.metadata,
+        sa.Column("date", CompactDate(), nullable=False),
+        sa.Column("symbol", sa.String(15), nullable=False),
+        sa.PrimaryKeyConstraint("symbol", "date"),
+        sqlite_with_rowid=False,
+    )
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+class ExchangeHoliday(Base):
+    __table__ = sa.Table(
+        "exchange_holidays",
+        Base.metadata,
+        sa.Column("exchange", sa.String(15), nullable=False),
+        sa.Column("date", CompactDate(), nullable=False),
+        sa.PrimaryKeyConstraint("exchange", "date"),
+        sqlite_with_rowid=False,
+    )
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+class ProviderUsage(Base):
+    # Number of requests made to a market data provider per calendar month
+    __table__ = sa.Table(
+        "provider_usage",
+        Base.metadata,
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("provider", sa.String(31), nullable=False),
+        sa.Column("period", sa.String(7), nullable=False),
+        sa.Column("requests", sa.Integer(), nullable=False),
+    )
+
+    sa.Index(
+        "provider_usage_provider_period_index",
+        __table__.c.provider,
+        __table__.c.period,
+        unique=True,
+    )
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+class RefreshState(Base):
+    # The last date up to which the prices of a symbol and the rates to a
+    # currency have been fully loaded by the refresh command
+    __table__ = sa.Table(
+        "refresh_state",
+        Base.metadata,
         sa.Column("id", sa.Integer(), primary_key=True),
-        sa.Column("date", sa.Date(), nullable=False),
         sa.Column("symbol", sa.String(15), nullable=False),
+        sa.Column("currency", sa.String(3), nullable=False),
+        sa.Column("last_loaded_date", sa.Date(), nullable=False),
     )
 
     sa.Index(
-        "excluded_dates_date_symbol_index",
-        __table__.c.date,
+        "refresh_state_symbol_currency_index",
         __table__.c.symbol,
+        __table__.c.currency,
         unique=True,
     )
 
@@ -51,19 +148,48 @@ class StockPrice(Base):
     __table__ = sa.Table(
         "stock_prices",
         Base.metadata,
-        sa.Column("id", sa.Integer(), primary_key=True),
-        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("date", CompactDate(), nullable=False),
         sa.Column("symbol", sa.String(15), nullable=False),
         sa.Column("close_price", sa.Float(), nullable=False),
         sa.Column("exchange", sa.String(15), nullable=False),
         sa.Column("currency", sa.String(3), default="USD", nullable=False),
+        # Prices are read by symbol and date range. Without a rowid the rows
+        # are stored in the primary key order, so that a range is read from
+        # neighbouring pages and there is no separate index to maintain.
+        sa.PrimaryKeyConstraint("symbol", "date"),
+        sqlite_with_rowid=False,
+    )
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+class StockPriceCoverage(Base):
+    __table__ = sa.Table(
+        "stock_price_coverage",
+        Base.metadata,
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("symbol", sa.String(15), nullable=False),
+        sa.Column("start_date", sa.Date(), nullable=False),
+        sa.Column("end_date", sa.Date(), nullable=False),
     )
 
     sa.Index(
-        "stock_prices_date_symbol_index",
-        __table__.c.date,
+        "stock_price_coverage_symbol_start_date_index",
         __table__.c.symbol,
-        unique=True,
+        __table__.c.start_date,
+    )
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+class SymbolExchange(Base):
+    __table__ = sa.Table(
+        "symbol_exchanges",
+        Base.metadata,
+        sa.Column("symbol", sa.String(15), primary_key=True),
+        sa.Column("exchange", sa.String(15), nullable=False),
     )
 
     def __repr__(self):
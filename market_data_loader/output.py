@@ -0,0 +1,114 @@
+# Results up to this many rows are formatted without pandas. Larger results are
+# printed as a DataFrame, which truncates them the same way.
+PLAIN_OUTPUT_MAX_ROWS = 60
+
+OUTPUT_COLUMNS = ["symbol", "currency", "close_price"]
+
+
+def format_stock_prices(rows):
+    if len(rows) > PLAIN_OUTPUT_MAX_ROWS:
+        return _format_as_dataframe(rows)
+
+    table = [["date"] + OUTPUT_COLUMNS] + [
+        [
+            str(row.date),
+            row.symbol,
+            row.currency,
+            "NaN" if row.close_price is None else f"{row.close_price:.6f}",
+        ]
+        for row in rows
+    ]
+
+    widths = [max(len(line[index]) for line in table) for index in range(len(table[0]))]
+
+    # The date is left-aligned like an index, the columns are right-aligned
+    return "\n".join(
+        "  ".join(
+            [line[0].ljust(widths[0])]
+            + [value.rjust(width) for value, width in zip(line[1:], widths[1:])]
+        )
+        for line in table
+    )
+
+
+def format_stock_price_frame(stock_prices_df):
+    # Frames of the multi-currency conversion, in the long or wide layout
+    return str(stock_prices_df.drop(columns=["exchange", "rate"], errors="ignore"))
+
+
+def _format_as_dataframe(rows):
+    import pandas as pd
+
+    stock_prices_df = pd.DataFrame.from_records(rows, columns=list(rows[0]._fields))
+
+    return str(stock_prices_df.set_index("date")[OUTPUT_COLUMNS])
+
+
+def write_stock_price_chunks(chunks, output_format, output_file):
+    # Writes the chunks of converted prices as they come, so that only a single
+    # chunk is held in memory. Returns the number of rows written.
+    write_fn = {
+        "csv": _write_csv_chunks,
+        "ndjson": _write_ndjson_chunks,
+        "parquet": _write_parquet_chunks,
+    }[output_format]
+
+    return write_fn(chunks, output_file)
+
+
+def _write_csv_chunks(chunks, output_file):
+    num_rows = 0
+
+    for stock_prices_df in chunks:
+        stock_prices_df.to_csv(output_file, header=num_rows == 0)
+        num_rows += len(stock_prices_df)
+
+    return num_rows
+
+
+def _write_ndjson_chunks(chunks, output_file):
+    num_rows = 0
+
+    for stock_prices_df in chunks:
+        if not len(stock_prices_df):
+            continue
+
+        lines = (
+            stock_prices_df.reset_index()
+            .astype({"date": str})
+            .to_json(orient="records", lines=True)
+        )
+
+        output_file.write(lines if lines.endswith("\n") else lines + "\n")
+        num_rows += len(stock_prices_df)
+
+    return num_rows
+
+
+def _write_parquet_chunks(chunks, output_file):
+    from market_data_loader import columnar_store
+
+    pa, pq = columnar_store._import_pyarrow()
+
+    num_rows = 0
+    writer = None
+
+    # Every chunk becomes a row group of the same file
+    try:
+        for stock_prices_df in chunks:
+            if not len(stock_prices_df):
+                continue
+
+            table = pa.Table.from_pandas(stock_prices_df.reset_index())
+
+            if writer is None:
+                schema = table.schema.remove_metadata()
+                writer = pq.ParquetWriter(output_file, schema)
+
+            writer.write_table(table.cast(schema))
+            num_rows += len(stock_prices_df)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return num_rows
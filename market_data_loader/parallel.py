@@ -0,0 +1,372 @@
+import concurrent.futures
+import logging
+import math
+import multiprocessing
+import multiprocessing.util
+import queue
+import sys
+
+import market_data_loader.clients.marketstack_client as stock_client
+from market_data_loader import (
+    conversion,
+    database,
+    frame_cache,
+    logger,
+    metrics,
+    pipeline,
+    planner,
+    scheduler,
+    stock,
+    trading_calendar,
+)
+from market_data_loader.clients import http_client
+from market_data_loader.models import (
+    Base,
+    ExchangeHoliday,
+    StockPrice,
+    SymbolExchange,
+)
+
+# Number of worker processes that fetch and parse stock prices
+WORKERS = 4
+
+# Maximum number of row batches waiting for the writer process before the
+# workers are paused
+WRITE_QUEUE_SIZE = 16
+
+# The writer combines the waiting batches into transactions of up to this many
+# rows
+WRITE_BATCH_SIZE = 10000
+
+# Seconds between the checks whether the writer process is still running, while
+# waiting for the workers or for space in the queue
+WRITER_CHECK_INTERVAL = 1.0
+
+# Workers are started fresh instead of forked, so that they don't inherit the
+# locks, threads and pooled connections of the loading process
+START_METHOD = "spawn"
+
+# Queue of the rows parsed by a worker process, and the event that is set when
+# the writer process stopped before taking them
+_write_queue = None
+_writer_failed = None
+
+
+@metrics.timed("parallel.fill_missing_data")
+def fill_missing_data(
+    db_sessionmaker,
+    symbols,
+    start_date,
+    end_date,
+    target_currencies,
+    concurrency=1,
+    workers=WORKERS,
+):
+    if isinstance(target_currencies, str):
+        target_currencies = [target_currencies]
+
+    logging.info(
+        "Load stock prices for %d symbols from '%s' to '%s' in '%s' with %d workers",
+        len(symbols),
+        start_date,
+        end_date,
+        ",".join(target_currencies),
+        workers,
+    )
+
+    fill_missing_stock_prices(
+        db_sessionmaker, symbols, start_date, end_date, concurrency, workers
+    )
+
+    # The currency rates of all stock prices take a few requests, which are
+    # made from this process
+    conversion.fill_missing_currency_rates(
+        db_sessionmaker, symbols, start_date, end_date, target_currencies
+    )
+
+
+def fill_missing_stock_prices(
+    db_sessionmaker, symbols, start_date, end_date, concurrency=1, workers=WORKERS
+):
+    # The planned requests are fetched and parsed by a pool of worker
+    # processes, which send the parsed rows through a bounded queue to a
+    # single writer process. Only the writer writes rows, and the workers wait
+    # while the queue is full, so that they never run ahead of the writer by
+    # more than the queue size. The workers only take the database lock to
+    # count their requests against a monthly quota. Without a quota they count
+    # in memory, and their requests are added to the usage by this process.
+    settings = _database_settings(db_sessionmaker)
+
+    symbols = stock._query_uncovered_symbols(
+        db_sessionmaker, symbols, start_date, end_date
+    )
+
+    if not symbols:
+        return
+
+    cached_dates = stock._query_cached_dates(
+        db_sessionmaker, symbols, start_date, end_date
+    )
+
+    missing_dates_by_symbol = stock._find_missing_dates(
+        db_sessionmaker, symbols, cached_dates, start_date, end_date
+    )
+
+    with metrics.stage("stock.plan_requests"):
+        planned_requests = _split_requests(
+            planner.order_requests(planner.plan_requests(missing_dates_by_symbol)),
+            workers,
+        )
+
+    if planned_requests:
+        not_found_dates_by_symbol = _fetch_planned_requests(
+            settings, planned_requests, missing_dates_by_symbol, concurrency, workers
+        )
+    else:
+        not_found_dates_by_symbol = {}
+
+    stock._exclude_missing_dates(db_sessionmaker, not_found_dates_by_symbol)
+
+    stock._add_coverage(db_sessionmaker, symbols, start_date, end_date)
+
+    # The rows were written by another process, which can't invalidate the
+    # frames cached by this one
+    for symbol in symbols:
+        frame_cache.CACHE.invalidate(stock._cache_key(db_sessionmaker, symbol))
+
+
+def _fetch_planned_requests(
+    settings, planned_requests, missing_dates_by_symbol, concurrency, workers
+):
+    context = multiprocessing.get_context(START_METHOD)
+
+    write_queue = context.Queue(maxsize=WRITE_QUEUE_SIZE)
+    result_queue = context.SimpleQueue()
+    writer_failed = context.Event()
+
+    writer = context.Process(
+        target=_write_rows,
+        args=(settings, write_queue, result_queue),
+        name="market-data-writer",
+    )
+    writer.start()
+
+    # A symbol can be in several requests, and its dates are missing if none
+    # of them found them
+    not_found_dates_by_symbol = {}
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(
+                settings,
+                scheduler.process_settings(workers),
+                scheduler.is_persisted() and scheduler.has_monthly_quota(),
+                dict(http_client._config),
+                logging.getLogger().level,
+                write_queue,
+                writer_failed,
+            ),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _fetch_stock_prices,
+                    {
+                        symbol: missing_dates_by_symbol[symbol]
+                        for symbol in group_symbols
+                    },
+                    range_start,
+                    range_end,
+                    concurrency,
+                )
+                for group_symbols, range_start, range_end in planned_requests
+            ]
+
+            pending_futures = set(futures)
+
+            try:
+                while pending_futures:
+                    done_futures, pending_futures = concurrent.futures.wait(
+                        pending_futures,
+                        timeout=WRITER_CHECK_INTERVAL,
+                        return_when=concurrent.futures.FIRST_COMPLETED,
+                    )
+
+                    for future in done_futures:
+                        fetch_not_found_dates_by_symbol, usage = future.result()
+
+                        scheduler.add_usage(usage)
+
+                        for symbol, dates in fetch_not_found_dates_by_symbol.items():
+                            not_found_dates_by_symbol[symbol] = (
+                                not_found_dates_by_symbol.get(symbol, dates) & dates
+                            )
+
+                    # Workers waiting for space in the queue of a dead writer
+                    # would never finish
+                    if pending_futures and not writer.is_alive():
+                        writer_failed.set()
+
+                        raise RuntimeError(
+                            f"The writer process failed with exit code {writer.exitcode}"
+                        )
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+
+                raise
+    finally:
+        if writer.is_alive():
+            write_queue.put(None)
+
+        writer.join()
+
+    if writer.exitcode != 0 or result_queue.empty():
+        raise RuntimeError(
+            f"The writer process failed with exit code {writer.exitcode}"
+        )
+
+    write_error = result_queue.get()
+
+    if write_error is not None:
+        raise RuntimeError(f"Error while writing stock prices: {write_error}")
+
+    return not_found_dates_by_symbol
+
+
+def _split_requests(planned_requests, workers):
+    # Requests for more symbols than a worker's share are split, so that all
+    # workers get to parse. Every split adds at most one partly filled page.
+    num_symbols = sum(len(group_symbols) for group_symbols, _, _ in planned_requests)
+    share = max(math.ceil(num_symbols / workers), 1)
+
+    return [
+        (group_symbols[index : index + share], range_start, range_end)
+        for group_symbols, range_start, range_end in planned_requests
+        for index in range(0, len(group_symbols), share)
+    ]
+
+
+def _database_settings(db_sessionmaker):
+    url = db_sessionmaker.kw["bind"].url
+
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        raise RuntimeError("Parallel loading requires a database file or server")
+
+    return dict(database.load_settings(), uri=url.render_as_string(hide_password=False))
+
+
+def _init_worker(
+    settings,
+    scheduler_settings,
+    persist_usage,
+    http_config,
+    log_level,
+    write_queue,
+    writer_failed,
+):
+    global _write_queue, _writer_failed
+
+    _write_queue = write_queue
+    _writer_failed = writer_failed
+
+    # Runs before the queue waits for its buffered batches when the worker
+    # exits, which it must not do once the writer stopped
+    multiprocessing.util.Finalize(None, _cancel_buffered_rows, exitpriority=10)
+
+    # Logs of the workers never mix with results on the standard output
+    logger.configure_logger(level=log_level, stream=sys.stderr)
+
+    http_client.configure(**http_config)
+
+    scheduler.configure(
+        database.create_sessionmaker(settings) if persist_usage else None,
+        scheduler_settings,
+    )
+
+
+def _fetch_stock_prices(missing_dates_by_symbol, start_date, end_date, concurrency):
+    # Runs in a worker process. Returns the missing dates that were not found,
+    # and the requests that were counted in memory.
+    trading_dates = trading_calendar.TradingDates()
+
+    with scheduler.priority(scheduler.priority_for(start_date)):
+        for paginated_response in stock_client.end_of_day(
+            list(missing_dates_by_symbol), start_date, end_date, concurrency
+        ):
+            columns = stock._price_columns(paginated_response)
+            rows = stock._stock_price_rows(columns, missing_dates_by_symbol)
+            trading_dates.update_columns(columns)
+
+            _put_rows(StockPrice.__table__.name, rows)
+
+    _put_rows(SymbolExchange.__table__.name, trading_dates.symbol_exchange_rows())
+    _put_rows(ExchangeHoliday.__table__.name, trading_dates.holiday_rows())
+
+    return missing_dates_by_symbol, scheduler.take_usage()
+
+
+def _put_rows(table_name, rows):
+    # Blocks while the queue is full, until the writer takes a batch or is
+    # found to have stopped
+    while not _writer_failed.is_set():
+        try:
+            _write_queue.put((table_name, rows), timeout=WRITER_CHECK_INTERVAL)
+            return
+        except queue.Full:
+            pass
+
+    _cancel_buffered_rows()
+
+    raise RuntimeError("The writer process stopped")
+
+
+def _cancel_buffered_rows():
+    # A batch that was put can still be buffered in the feeder thread of the
+    # queue, which would block the exit of the worker once nobody reads the
+    # queue anymore
+    if _writer_failed.is_set():
+        _write_queue.cancel_join_thread()
+
+
+def _write_rows(settings, write_queue, result_queue):
+    # Runs in the writer process until it gets None. The batches that are
+    # waiting are combined into larger transactions. After a failed write the
+    # queue is still drained, so that the workers don't block on a full queue.
+    db_sessionmaker = database.create_sessionmaker(settings)
+    write_error = None
+
+    rows_by_table = {}
+    num_rows = 0
+    is_done = False
+
+    while not is_done:
+        item = write_queue.get()
+
+        if item is None:
+            is_done = True
+        elif write_error is None:
+            table_name, rows = item
+
+            rows_by_table.setdefault(table_name, []).extend(rows)
+            num_rows += len(rows)
+
+        if not (is_done or num_rows >= WRITE_BATCH_SIZE or write_queue.empty()):
+            continue
+
+        try:
+            for table_name, rows in rows_by_table.items():
+                pipeline._insert_rows(
+                    db_sessionmaker, Base.metadata.tables[table_name], rows
+                )
+        except Exception as err:
+            write_error = err
+
+        rows_by_table = {}
+        num_rows = 0
+
+    db_sessionmaker.kw["bind"].dispose()
+
+    result_queue.put(None if write_error is None else str(write_error))
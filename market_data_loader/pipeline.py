@@ -0,0 +1,307 @@
+import asyncio
+import concurrent.futures
+import logging
+
+import market_data_loader.clients.exchangeratesapi_client as currency_client
+import market_data_loader.clients.marketstack_client as stock_client
+from market_data_loader import (
+    conversion,
+    currency,
+    database,
+    metrics,
+    planner,
+    scheduler,
+    stock,
+    trading_calendar,
+)
+from market_data_loader.models import (
+    CurrencyRate,
+    ExchangeHoliday,
+    StockPrice,
+    SymbolExchange,
+)
+
+# Maximum number of row batches waiting for the database writer before the
+# fetching stages are paused
+WRITE_QUEUE_SIZE = 16
+
+
+def load_stock_prices(
+    db_sessionmaker,
+    symbols,
+    start_date,
+    end_date,
+    target_currency,
+    concurrency=1,
+    warm_cache=False,
+):
+    fill_missing_data(
+        db_sessionmaker, symbols, start_date, end_date, target_currency, concurrency
+    )
+
+    return conversion._query_converted_stock_prices_as_dataframe(
+        db_sessionmaker, symbols, start_date, end_date, target_currency, warm_cache
+    )
+
+
+@metrics.timed("pipeline.fill_missing_data")
+def fill_missing_data(
+    db_sessionmaker, symbols, start_date, end_date, target_currencies, concurrency=1
+):
+    if isinstance(target_currencies, str):
+        target_currencies = [target_currencies]
+
+    logging.info(
+        "Load stock prices for %d symbols from '%s' to '%s' in '%s'",
+        len(symbols),
+        start_date,
+        end_date,
+        ",".join(target_currencies),
+    )
+
+    asyncio.run(
+        _fill_missing_dates(
+            db_sessionmaker,
+            symbols,
+            start_date,
+            end_date,
+            target_currencies,
+            concurrency,
+        )
+    )
+
+    # Any rates that the pipeline could not know about up front (e.g. for
+    # stock prices in other currencies) are filled here.
+    conversion.fill_missing_currency_rates(
+        db_sessionmaker, symbols, start_date, end_date, target_currencies
+    )
+
+
+async def _fill_missing_dates(
+    db_sessionmaker, symbols, start_date, end_date, target_currencies, concurrency
+):
+    # The pipeline has three stages that run concurrently: stock prices are
+    # fetched page by page, currency rates for the dates of each page are
+    # fetched as soon as the page arrives and a single writer stores the rows
+    # of both in the database.
+    symbols = stock._query_uncovered_symbols(
+        db_sessionmaker, symbols, start_date, end_date
+    )
+
+    if not symbols:
+        return
+
+    cached_dates = stock._query_cached_dates(
+        db_sessionmaker, symbols, start_date, end_date
+    )
+
+    missing_dates_by_symbol = stock._find_missing_dates(
+        db_sessionmaker, symbols, cached_dates, start_date, end_date
+    )
+
+    write_queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer = asyncio.create_task(_write_rows(db_sessionmaker, write_queue))
+
+    currency_rate_fetcher = _CurrencyRateFetcher(
+        db_sessionmaker,
+        StockPrice.__table__.c.currency.default.arg,
+        target_currencies,
+        start_date,
+        end_date,
+        write_queue,
+    )
+
+    try:
+        currency_rate_fetcher.request(
+            date for dates in cached_dates.values() for date in dates
+        )
+
+        await asyncio.gather(
+            *(
+                _fetch_stock_prices(
+                    {
+                        symbol: missing_dates_by_symbol[symbol]
+                        for symbol in group_symbols
+                    },
+                    range_start,
+                    range_end,
+                    concurrency,
+                    write_queue,
+                    currency_rate_fetcher,
+                )
+                for group_symbols, range_start, range_end in planner.order_requests(
+                    planner.plan_requests(missing_dates_by_symbol)
+                )
+            )
+        )
+
+        await currency_rate_fetcher.wait()
+    finally:
+        await write_queue.put(None)
+        await writer
+
+    stock._exclude_missing_dates(db_sessionmaker, missing_dates_by_symbol)
+
+    stock._add_coverage(db_sessionmaker, symbols, start_date, end_date)
+
+
+async def _fetch_stock_prices(
+    missing_dates_by_symbol,
+    start_date,
+    end_date,
+    concurrency,
+    write_queue,
+    currency_rate_fetcher,
+):
+    trading_dates = trading_calendar.TradingDates()
+
+    # Every task runs in its own context, so the priority only applies to the
+    # requests of this fetch
+    with scheduler.priority(scheduler.priority_for(start_date)):
+        async for paginated_response in stock_client.end_of_day_async(
+            list(missing_dates_by_symbol), start_date, end_date, concurrency
+        ):
+            columns = stock._price_columns(paginated_response)
+            rows = stock._stock_price_rows(columns, missing_dates_by_symbol)
+            trading_dates.update_columns(columns)
+
+            currency_rate_fetcher.request(row["date"] for row in rows)
+
+            await write_queue.put((StockPrice.__table__, rows))
+
+    await write_queue.put(
+        (SymbolExchange.__table__, trading_dates.symbol_exchange_rows())
+    )
+    await write_queue.put((ExchangeHoliday.__table__, trading_dates.holiday_rows()))
+
+
+async def _write_rows(db_sessionmaker, write_queue):
+    loop = asyncio.get_running_loop()
+
+    # A single dedicated thread does all the writes, so that the fetching
+    # stages never wait on the database and never compete for its lock. After
+    # a failed write the queue is still drained, so that the fetching stages
+    # don't block on a full queue.
+    write_error = None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        while True:
+            item = await write_queue.get()
+
+            if item is None:
+                break
+
+            if write_error is not None:
+                continue
+
+            try:
+                await loop.run_in_executor(
+                    executor, _insert_rows, db_sessionmaker, *item
+                )
+            except Exception as err:
+                write_error = err
+
+    if write_error is not None:
+        raise write_error
+
+
+def _insert_rows(db_sessionmaker, table, rows):
+    with database.begin_write(db_sessionmaker) as session:
+        database.insert_or_ignore(session, table, rows)
+
+    if table is StockPrice.__table__:
+        stock._store_stock_prices(db_sessionmaker, rows)
+    elif table is CurrencyRate.__table__:
+        currency._store_currency_rates(db_sessionmaker, rows)
+
+
+class _CurrencyRateFetcher:
+    def __init__(
+        self,
+        db_sessionmaker,
+        base_currency,
+        target_currencies,
+        start_date,
+        end_date,
+        write_queue,
+    ):
+        self._write_queue = write_queue
+        self._tasks = []
+        self._requested_dates = set()
+        self._cached_dates_by_currency = {}
+
+        target_currencies = [
+            target_currency
+            for target_currency in target_currencies
+            if target_currency != base_currency
+        ]
+
+        if not target_currencies:
+            return
+
+        # The rates of all target currencies are fetched with the same requests
+        for currency_code in dict.fromkeys([base_currency] + target_currencies):
+            self._cached_dates_by_currency[currency_code] = (
+                currency._query_cached_dates(
+                    db_sessionmaker,
+                    currency_client.BASE_CURRENCY,
+                    currency_code,
+                    start_date,
+                    end_date,
+                )
+            )
+
+    def request(self, dates):
+        if not self._cached_dates_by_currency:
+            return
+
+        missing_dates = sorted(
+            {
+                date
+                for date in dates
+                if not date in self._requested_dates
+                and any(
+                    not date in cached_dates
+                    for cached_dates in self._cached_dates_by_currency.values()
+                )
+            }
+        )
+
+        if not missing_dates:
+            return
+
+        self._requested_dates.update(missing_dates)
+        self._tasks.append(asyncio.create_task(self._fetch(missing_dates)))
+
+    async def wait(self):
+        await asyncio.gather(*self._tasks)
+
+    async def _fetch(self, dates):
+        currencies = list(self._cached_dates_by_currency)
+
+        with scheduler.priority(scheduler.priority_for(dates[0])):
+            if len(dates) > currency.TIMESERIES_THRESHOLD:
+                timeseries = await currency_client.timeseries_async(
+                    dates[0], dates[-1], currencies
+                )
+
+                # Other fetches might be storing the dates in between, so only
+                # the requested dates are kept.
+                requested_dates = set(dates)
+
+                currency_rates = [
+                    (date, currency_rate)
+                    for date, currency_rate in currency._parse_timeseries(timeseries)
+                    if date in requested_dates
+                ]
+            else:
+                currency_rates = [
+                    (date, await currency_client.currency_rate_async(date, currencies))
+                    for date in dates
+                ]
+
+        rows = currency._currency_rate_rows(
+            currency_rates, self._cached_dates_by_currency
+        )
+
+        await self._write_queue.put((CurrencyRate.__table__, rows))
@@ -0,0 +1,182 @@
+import datetime
+import logging
+import math
+
+import market_data_loader.clients.marketstack_client as stock_client
+from market_data_loader import scheduler
+
+# Relative cost of a single request and of a single row fetched. A request is
+# by far the most expensive part of a fetch (round trip and API quota), while
+# rows only add transfer and parsing time.
+REQUEST_COST = 1.0
+ROW_COST = 0.0002
+
+
+def plan_requests(missing_dates_by_symbol, fetch_limit=stock_client.FETCH_LIMIT):
+    # Missing dates are coalesced into intervals of consecutive business days
+    # for each symbol. Neighbouring intervals are fetched with a single wide
+    # request when that is cheaper than fetching them separately, and requests
+    # of different symbols are shared the same way. Rows that are already
+    # cached but fall within a request are counted as fetched rows. The recent
+    # dates are never fetched together with older ones, so that they are
+    # refreshes even when a long backfill runs up to today.
+    refresh_start_date = scheduler.refresh_start_date()
+
+    ranges = sorted(
+        (start_date, end_date, symbol)
+        for symbol, missing_dates in missing_dates_by_symbol.items()
+        for dates in _split_dates(missing_dates, refresh_start_date)
+        for start_date, end_date in _plan_intervals(coalesce_dates(dates), fetch_limit)
+    )
+
+    requests = []
+
+    for start_date, end_date, symbol in ranges:
+        if requests:
+            request_symbols, request_start_date, request_end_date = requests[-1]
+            merged_symbols = request_symbols | {symbol}
+
+            merged_cost = request_cost(
+                len(merged_symbols),
+                request_start_date,
+                max(request_end_date, end_date),
+                fetch_limit,
+            )
+            separate_cost = request_cost(
+                len(request_symbols), request_start_date, request_end_date, fetch_limit
+            ) + request_cost(1, start_date, end_date, fetch_limit)
+
+            if (
+                len(merged_symbols) <= stock_client.MAX_SYMBOLS_PER_REQUEST
+                and merged_cost <= separate_cost
+                and scheduler.priority_for(start_date)
+                == scheduler.priority_for(request_start_date)
+            ):
+                requests[-1] = (
+                    merged_symbols,
+                    request_start_date,
+                    max(request_end_date, end_date),
+                )
+                continue
+
+        requests.append(({symbol}, start_date, end_date))
+
+    requests = [
+        (sorted(symbols), start_date, end_date)
+        for symbols, start_date, end_date in requests
+    ]
+
+    _log_plan(missing_dates_by_symbol, requests, fetch_limit)
+
+    return requests
+
+
+def order_requests(requests):
+    # Requests for recent dates come before backfills. Within a priority class
+    # the requests with the most rows come first, so that the rows that matter
+    # most are fetched when a provider quota runs out midway.
+    return sorted(
+        requests,
+        key=lambda request: (
+            scheduler.priority_for(request[1]),
+            -len(request[0]) * business_days(request[1], request[2]),
+        ),
+    )
+
+
+def coalesce_dates(dates):
+    intervals = []
+
+    for date in sorted(dates):
+        if intervals and business_days(intervals[-1][1], date) <= 2:
+            intervals[-1][1] = date
+        else:
+            intervals.append([date, date])
+
+    return [tuple(interval) for interval in intervals]
+
+
+def business_days(start_date, end_date):
+    import numpy as np
+
+    return int(np.busday_count(start_date, end_date + datetime.timedelta(days=1)))
+
+
+def request_cost(num_symbols, start_date, end_date, fetch_limit):
+    num_rows = num_symbols * business_days(start_date, end_date)
+    num_pages = max(math.ceil(num_rows / fetch_limit), 1)
+
+    return num_pages * REQUEST_COST + num_rows * ROW_COST
+
+
+def _split_dates(dates, split_date):
+    return [
+        [date for date in dates if date < split_date],
+        [date for date in dates if date >= split_date],
+    ]
+
+
+def _plan_intervals(intervals, fetch_limit):
+    # Finds the cheapest way to split the sorted intervals into consecutive
+    # groups, where every group is fetched with a single request spanning from
+    # the first to the last date of the group.
+    best_costs = [0.0]
+    best_splits = []
+
+    for end_index in range(len(intervals)):
+        best_cost = math.inf
+        best_split = end_index
+
+        # The cost of a single request only grows as it's extended to earlier
+        # intervals, so the search can stop once it alone exceeds the best
+        # total cost found.
+        for start_index in range(end_index, -1, -1):
+            span_cost = request_cost(
+                1, intervals[start_index][0], intervals[end_index][1], fetch_limit
+            )
+
+            if span_cost >= best_cost:
+                break
+
+            if best_costs[start_index] + span_cost < best_cost:
+                best_cost = best_costs[start_index] + span_cost
+                best_split = start_index
+
+        best_costs.append(best_cost)
+        best_splits.append(best_split)
+
+    planned_intervals = []
+    end_index = len(intervals) - 1
+
+    while end_index >= 0:
+        start_index = best_splits[end_index]
+        planned_intervals.append((intervals[start_index][0], intervals[end_index][1]))
+        end_index = start_index - 1
+
+    return planned_intervals[::-1]
+
+
+def _log_plan(missing_dates_by_symbol, requests, fetch_limit):
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+
+    num_missing_dates = sum(len(dates) for dates in missing_dates_by_symbol.values())
+
+    logging.debug(
+        "Planned %d requests for %d missing dates of %d symbols",
+        len(requests),
+        num_missing_dates,
+        len(missing_dates_by_symbol),
+    )
+
+    for symbols, start_date, end_date in requests:
+        num_rows = len(symbols) * business_days(start_date, end_date)
+
+        logging.debug(
+            "Request %s from '%s' to '%s': ~%d rows in %d pages",
+            symbols,
+            start_date,
+            end_date,
+            num_rows,
+            max(math.ceil(num_rows / fetch_limit), 1),
+        )
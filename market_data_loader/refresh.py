@@ -0,0 +1,193 @@
+import datetime
+import logging
+import random
+import threading
+
+import sqlalchemy as sa
+
+from market_data_loader import conversion, database, metrics, stock
+from market_data_loader.models import RefreshState
+
+# The prices of a day are published after the markets close, so the refresh
+# loads the dates up to this many days before today. Today's date is never
+# fully loaded, so it would otherwise be fetched again by every refresh.
+PUBLICATION_LAG_DAYS = 1
+
+
+@metrics.timed("refresh.run")
+def refresh(
+    db_sessionmaker,
+    symbols,
+    target_currencies,
+    end_date=None,
+    initial_start_date=None,
+    concurrency=1,
+):
+    # Loads the dates after the last fully loaded date of every symbol and
+    # currency, so that the cost of a refresh depends on the number of new
+    # dates and not on the length of the history. Symbols without a last
+    # loaded date are loaded from 'initial_start_date'. Returns the number of
+    # refreshed symbols.
+    if isinstance(target_currencies, str):
+        target_currencies = [target_currencies]
+
+    if end_date is None:
+        end_date = datetime.date.today() - datetime.timedelta(days=PUBLICATION_LAG_DAYS)
+
+    if initial_start_date is None:
+        initial_start_date = end_date
+
+    symbols_by_start_date = _group_symbols_by_start_date(
+        db_sessionmaker, symbols, target_currencies, initial_start_date, end_date
+    )
+
+    if not symbols_by_start_date:
+        logging.info("All %d symbols are loaded until '%s'", len(symbols), end_date)
+        return 0
+
+    # The fills of all start dates are queued and fetched together, so that
+    # they share their requests and the latest dates are fetched first
+    fetch_queue = stock.FetchQueue(db_sessionmaker, concurrency)
+
+    for start_date, start_date_symbols in sorted(symbols_by_start_date.items()):
+        logging.info(
+            "Refresh %d symbols from '%s' to '%s'",
+            len(start_date_symbols),
+            start_date,
+            end_date,
+        )
+
+        fetch_queue.add(start_date_symbols, start_date, end_date)
+
+    fetch_queue.run()
+
+    for start_date, start_date_symbols in sorted(symbols_by_start_date.items()):
+        conversion.fill_missing_currency_rates(
+            db_sessionmaker,
+            start_date_symbols,
+            start_date,
+            end_date,
+            target_currencies,
+        )
+
+        _update_last_loaded_dates(
+            db_sessionmaker, start_date_symbols, target_currencies, end_date
+        )
+
+    return sum(len(group_symbols) for group_symbols in symbols_by_start_date.values())
+
+
+def _group_symbols_by_start_date(
+    db_sessionmaker, symbols, target_currencies, initial_start_date, end_date
+):
+    last_loaded_dates = _query_last_loaded_dates(
+        db_sessionmaker, symbols, target_currencies
+    )
+
+    symbols_by_start_date = {}
+
+    for symbol in symbols:
+        symbol_last_loaded_dates = [
+            last_loaded_dates.get((symbol, target_currency))
+            for target_currency in target_currencies
+        ]
+
+        if None in symbol_last_loaded_dates:
+            start_date = initial_start_date
+        else:
+            start_date = min(symbol_last_loaded_dates) + datetime.timedelta(days=1)
+
+        if start_date <= end_date:
+            symbols_by_start_date.setdefault(start_date, []).append(symbol)
+
+    return symbols_by_start_date
+
+
+def _query_last_loaded_dates(db_sessionmaker, symbols, target_currencies):
+    with db_sessionmaker.begin() as session:
+        data_rows = (
+            session.query(
+                RefreshState.symbol,
+                RefreshState.currency,
+                RefreshState.last_loaded_date,
+            )
+            .filter(RefreshState.symbol.in_(symbols))
+            .filter(RefreshState.currency.in_(target_currencies))
+            .all()
+        )
+
+    return {(symbol, currency): date for symbol, currency, date in data_rows}
+
+
+def _update_last_loaded_dates(db_sessionmaker, symbols, target_currencies, end_date):
+    table = RefreshState.__table__
+
+    with database.begin_write(db_sessionmaker) as session:
+        database.insert_or_ignore(
+            session,
+            table,
+            [
+                {
+                    "symbol": symbol,
+                    "currency": target_currency,
+                    "last_loaded_date": end_date,
+                }
+                for symbol in symbols
+                for target_currency in target_currencies
+            ],
+        )
+
+        # The last loaded dates never move backwards
+        session.execute(
+            sa.update(table)
+            .where(
+                table.c.symbol.in_(symbols),
+                table.c.currency.in_(target_currencies),
+                table.c.last_loaded_date < end_date,
+            )
+            .values(last_loaded_date=end_date)
+        )
+
+
+def next_run_time(now, run_times, jitter=0.0, rng=random):
+    # Returns the first of the daily run times after 'now', delayed by a random
+    # jitter of up to 'jitter' seconds, so that several daemons don't hit the
+    # providers at the same moment
+    run_datetimes = [
+        datetime.datetime.combine(now.date() + datetime.timedelta(days=days), run_time)
+        for days in (0, 1)
+        for run_time in run_times
+    ]
+
+    next_time = min(
+        run_datetime for run_datetime in run_datetimes if run_datetime > now
+    )
+
+    return next_time + datetime.timedelta(seconds=rng.uniform(0, jitter))
+
+
+def run_daemon(
+    refresh_fn,
+    run_times,
+    jitter=0.0,
+    stop_event=None,
+    rng=random,
+    clock=datetime.datetime.now,
+):
+    # Calls 'refresh_fn' at the daily run times until 'stop_event' is set. A
+    # failed refresh is logged, and retried at the next run time.
+    if stop_event is None:
+        stop_event = threading.Event()
+
+    while not stop_event.is_set():
+        run_datetime = next_run_time(clock(), run_times, jitter, rng)
+
+        logging.info("Next refresh at '%s'", run_datetime.isoformat(" ", "seconds"))
+
+        if stop_event.wait(max((run_datetime - clock()).total_seconds(), 0)):
+            break
+
+        try:
+            refresh_fn()
+        except Exception:
+            logging.exception("Refresh failed")
@@ -0,0 +1,107 @@
+import datetime
+import json
+import logging
+import re
+
+import market_data_loader.clients.exchangeratesapi_client as currency_client
+import market_data_loader.clients.marketstack_client as stock_client
+from market_data_loader import currency, database, metrics, stock, trading_calendar
+from market_data_loader.models import CurrencyRate, StockPrice
+
+# Rows inserted per transaction while rebuilding
+REBUILD_BATCH_SIZE = 10000
+
+HISTORICAL_URL_PATTERN = re.compile(
+    re.escape(currency_client.API_BASE_URL) + r"/(\d{4}-\d{2}-\d{2})$"
+)
+
+
+@metrics.timed("replay.rebuild")
+def rebuild_from_store(db_sessionmaker, store, batch_size=REBUILD_BATCH_SIZE):
+    # Parses every stored response like the loaders do, and inserts all of its
+    # stock prices and currency rates. Rows already in the database are kept,
+    # so a rebuild can be re-run, but it is meant to fill a freshly created
+    # schema. Returns the number of responses and rows by table.
+    stock_price_rows = []
+    currency_rate_rows = []
+    trading_dates = trading_calendar.TradingDates()
+
+    counts = {
+        "responses": 0,
+        StockPrice.__table__.name: 0,
+        CurrencyRate.__table__.name: 0,
+    }
+
+    def flush(rows, table, store_fn):
+        if not rows:
+            return
+
+        with database.begin_write(db_sessionmaker) as session:
+            database.insert_or_ignore(session, table, rows)
+
+        store_fn(db_sessionmaker, rows)
+
+        counts[table.name] += len(rows)
+        rows.clear()
+
+    for url, params, content in store.iter_responses():
+        counts["responses"] += 1
+
+        if url == f"{stock_client.API_BASE_URL}/eod":
+            columns = stock._price_columns(json.loads(content)["data"])
+
+            stock_price_rows.extend(stock._rows_from_columns(columns))
+            trading_dates.update_columns(columns)
+        else:
+            currency_rate_rows.extend(_currency_rate_rows(url, json.loads(content)))
+
+        if len(stock_price_rows) >= batch_size:
+            flush(stock_price_rows, StockPrice.__table__, stock._store_stock_prices)
+
+        if len(currency_rate_rows) >= batch_size:
+            flush(
+                currency_rate_rows,
+                CurrencyRate.__table__,
+                currency._store_currency_rates,
+            )
+
+    flush(stock_price_rows, StockPrice.__table__, stock._store_stock_prices)
+    flush(currency_rate_rows, CurrencyRate.__table__, currency._store_currency_rates)
+
+    with database.begin_write(db_sessionmaker) as session:
+        trading_calendar.store_trading_dates(session, trading_dates)
+
+    logging.info(
+        "Rebuilt %d stock prices and %d currency rates from %d responses",
+        counts[StockPrice.__table__.name],
+        counts[CurrencyRate.__table__.name],
+        counts["responses"],
+    )
+
+    return counts
+
+
+def _currency_rate_rows(url, response):
+    if url == f"{currency_client.API_BASE_URL}/timeseries":
+        currency_rates = currency._parse_timeseries(response)
+    else:
+        match = HISTORICAL_URL_PATTERN.match(url)
+
+        # The currency symbols don't contain rates
+        if match is None:
+            return []
+
+        date = datetime.date.fromisoformat(match.group(1))
+        currency_rates = [(date, response)]
+
+    rows = []
+
+    for date, currency_rate in currency_rates:
+        rows.extend(
+            currency._currency_rate_rows(
+                [(date, currency_rate)],
+                {currency_code: () for currency_code in currency_rate["rates"]},
+            )
+        )
+
+    return rows
@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+# The response store is enabled by pointing this environment variable to a
+# directory. Successful provider responses are then recorded in it, and with
+# replay enabled requests are answered from it without any network access.
+RESPONSE_STORE_ENV = "MARKET_DATA_LOADER_RESPONSE_STORE"
+REPLAY_ENV = "MARKET_DATA_LOADER_REPLAY"
+
+# Parameters that don't change the response, and must not end up on disk
+IGNORED_PARAMS = frozenset(["access_key"])
+
+_store = None
+
+
+class ResponseStore:
+    # Stores gzipped response bodies by the SHA-256 of their content, so that
+    # identical responses are kept once, and maps the URL and parameters of
+    # every request to its body:
+    #
+    #   <root>/objects/3f/3f9a...c1.json.gz
+    #   <root>/requests/b0/b04e...7d.json
+    #
+    # Files are written to a temporary file first and moved in place, so that
+    # concurrent loaders and readers never see partial files.
+
+    def __init__(self, root, replay=False):
+        self.root = root
+        self.replay = replay
+
+    def get(self, url, params=None):
+        try:
+            with open(self._request_path(request_key(url, params))) as request_file:
+                digest = json.load(request_file)["object"]
+        except FileNotFoundError:
+            return None
+
+        return self._read_object(digest)
+
+    def put(self, url, params, content):
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+
+        if not os.path.exists(object_path):
+            _write_atomically(object_path, gzip.compress(content, compresslevel=6))
+
+        record = {"url": url, "params": _canonical_params(params), "object": digest}
+
+        _write_atomically(
+            self._request_path(request_key(url, params)),
+            json.dumps(record, sort_keys=True).encode(),
+        )
+
+    def iter_responses(self):
+        # Yields the URL, parameters and body of every stored request, in the
+        # same order on every run
+        requests_dir = os.path.join(self.root, "requests")
+
+        for dir_path, dir_names, file_names in os.walk(requests_dir):
+            dir_names.sort()
+
+            for file_name in sorted(file_names):
+                if not file_name.endswith(".json"):
+                    continue
+
+                with open(os.path.join(dir_path, file_name)) as request_file:
+                    record = json.load(request_file)
+
+                yield record["url"], record["params"], self._read_object(
+                    record["object"]
+                )
+
+    def _read_object(self, digest):
+        with open(self._object_path(digest), "rb") as object_file:
+            return gzip.decompress(object_file.read())
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.json.gz")
+
+    def _request_path(self, key):
+        return os.path.join(self.root, "requests", key[:2], f"{key}.json")
+
+
+def request_key(url, params=None):
+    canonical_request = json.dumps(
+        {"url": url, "params": _canonical_params(params)}, sort_keys=True
+    )
+
+    return hashlib.sha256(canonical_request.encode()).hexdigest()
+
+
+def get_store():
+    global _store
+
+    root = os.environ.get(RESPONSE_STORE_ENV)
+
+    if not root:
+        return None
+
+    replay = os.environ.get(REPLAY_ENV, "").lower() in ("1", "true", "yes")
+
+    if _store is None or _store.root != root or _store.replay != replay:
+        _store = ResponseStore(root, replay)
+
+    return _store
+
+
+def _canonical_params(params):
+    # Values are compared as strings, like they are sent in the query string
+    return {
+        name: str(value)
+        for name, value in sorted((params or {}).items())
+        if not name in IGNORED_PARAMS
+    }
+
+
+def _write_atomically(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path), suffix=".tmp", delete=False
+    ) as tmp_file:
+        tmp_file.write(data)
+
+    os.replace(tmp_file.name, path)
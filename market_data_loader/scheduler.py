@@ -0,0 +1,411 @@
+import collections
+import contextlib
+import contextvars
+import datetime
+import logging
+import math
+import threading
+import time
+
+from market_data_loader import config, metrics
+
+# Priority classes of provider requests, lower values are served first
+REFRESH = 0
+BACKFILL = 1
+
+PRIORITY_NAMES = {REFRESH: "refresh", BACKFILL: "backfill"}
+
+# Requests for dates up to this many days before today refresh recent data,
+# requests for older dates are backfills
+REFRESH_DAYS = 7
+
+# Settings are read from the [scheduler] section of the config file and can be
+# overridden with MARKET_DATA_LOADER_SCHEDULER_<SETTING> environment variables.
+CONFIG_SECTION = "scheduler"
+SETTINGS_ENV_PREFIX = "MARKET_DATA_LOADER_SCHEDULER_"
+
+DEFAULT_SETTINGS = {
+    # Requests per second (0 for no limit) and requests that can be made at
+    # once after a pause
+    "marketstack_rate": 5.0,
+    "marketstack_burst": 10,
+    # Requests per calendar month (0 for no limit)
+    "marketstack_monthly_quota": 0,
+    "exchangeratesapi_rate": 5.0,
+    "exchangeratesapi_burst": 10,
+    "exchangeratesapi_monthly_quota": 0,
+    # Share of the monthly quota that backfills may use, the rest is kept for
+    # refreshes
+    "backfill_share": 0.8,
+}
+
+_priority = contextvars.ContextVar("priority", default=REFRESH)
+
+_limiters = {}
+_usage_store = None
+_settings = None
+_lock = threading.Lock()
+
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    # Allows 'rate' acquisitions per second on average and up to 'capacity' at
+    # once. While tokens are short, waiters of a higher priority class go
+    # first.
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        self._num_waiting = collections.Counter()
+
+    def acquire(self, priority=REFRESH):
+        if self.rate <= 0:
+            return
+
+        with self._condition:
+            self._num_waiting[priority] += 1
+
+            try:
+                while True:
+                    self._refill()
+
+                    is_first = not any(
+                        num_waiting
+                        for waiting_priority, num_waiting in self._num_waiting.items()
+                        if waiting_priority < priority
+                    )
+
+                    if is_first and self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+
+                    # Waiters behind a higher priority class are woken up once
+                    # it took its token
+                    self._condition.wait(
+                        (1 - self._tokens) / self.rate if is_first else None
+                    )
+            finally:
+                self._num_waiting[priority] -= 1
+                self._condition.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+
+        self._tokens = min(
+            self._tokens + (now - self._updated) * self.rate, self.capacity
+        )
+        self._updated = now
+
+
+class ProviderLimiter:
+    # Paces the requests to a provider with a token bucket and enforces its
+    # monthly quota. Backfills may only use a share of the quota, so that
+    # refreshes can still be made once the backfills ran out.
+
+    def __init__(
+        self, provider, rate, burst, monthly_quota, backfill_share, usage_store
+    ):
+        self.provider = provider
+        self.monthly_quota = monthly_quota
+        self.backfill_share = backfill_share
+
+        self._bucket = TokenBucket(rate, burst)
+        self._usage_store = usage_store
+
+    def acquire(self, priority=REFRESH):
+        self._reserve(priority)
+        self._bucket.acquire(priority)
+
+        metrics.increment(
+            "provider_requests_total",
+            provider=self.provider,
+            priority=PRIORITY_NAMES[priority],
+        )
+
+    def _reserve(self, priority):
+        if not self.monthly_quota:
+            allowed_requests = math.inf
+        elif priority == REFRESH:
+            allowed_requests = self.monthly_quota
+        else:
+            allowed_requests = int(self.monthly_quota * self.backfill_share)
+
+        if self._usage_store.reserve(self.provider, _period(), allowed_requests):
+            return
+
+        metrics.increment(
+            "provider_quota_refusals_total",
+            provider=self.provider,
+            priority=PRIORITY_NAMES[priority],
+        )
+
+        raise QuotaExceeded(
+            f"Monthly quota of {allowed_requests} {PRIORITY_NAMES[priority]} "
+            f"requests to '{self.provider}' is used up"
+        )
+
+
+class MemoryUsageStore:
+    def __init__(self):
+        self._usage = collections.Counter()
+        self._taken_usage = collections.Counter()
+        self._lock = threading.Lock()
+
+    def reserve(self, provider, period, allowed_requests):
+        with self._lock:
+            if self._usage[provider, period] >= allowed_requests:
+                return False
+
+            self._usage[provider, period] += 1
+            return True
+
+    def usage(self, provider, period):
+        with self._lock:
+            return self._usage[provider, period]
+
+    def add(self, provider, period, requests):
+        with self._lock:
+            self._usage[provider, period] += requests
+
+    def take(self):
+        # Returns the usage counted since the last call, which is still kept
+        # for the quotas of this process
+        with self._lock:
+            usage = self._usage - self._taken_usage
+            self._taken_usage = self._usage.copy()
+
+        return dict(usage)
+
+
+class DatabaseUsageStore:
+    # Keeps the usage in the database, so that it is shared by all processes
+    # and survives restarts. The check and the increment are a single
+    # conditional update, which is atomic on every backend.
+
+    def __init__(self, db_sessionmaker):
+        self._db_sessionmaker = db_sessionmaker
+        self._has_table = False
+        self._table_lock = threading.Lock()
+
+    def reserve(self, provider, period, allowed_requests):
+        return self._increment(provider, period, 1, allowed_requests)
+
+    def add(self, provider, period, requests):
+        self._increment(provider, period, requests)
+
+    def _increment(self, provider, period, requests, allowed_requests=math.inf):
+        import sqlalchemy as sa
+
+        from market_data_loader import database
+        from market_data_loader.models import ProviderUsage
+
+        table = ProviderUsage.__table__
+
+        # Databases created before usage was tracked don't have the table yet
+        with self._table_lock:
+            if not self._has_table:
+                table.create(self._db_sessionmaker.kw["bind"], checkfirst=True)
+                self._has_table = True
+
+        with database.begin_write(self._db_sessionmaker) as session:
+            database.insert_or_ignore(
+                session,
+                table,
+                [{"provider": provider, "period": period, "requests": 0}],
+            )
+
+            statement = (
+                sa.update(table)
+                .where(table.c.provider == provider, table.c.period == period)
+                .values(requests=table.c.requests + requests)
+            )
+
+            if allowed_requests != math.inf:
+                statement = statement.where(table.c.requests < allowed_requests)
+
+            return session.execute(statement).rowcount == 1
+
+    def usage(self, provider, period):
+        from market_data_loader.models import ProviderUsage
+
+        with self._db_sessionmaker.begin() as session:
+            requests = (
+                session.query(ProviderUsage.requests)
+                .filter(
+                    ProviderUsage.provider == provider, ProviderUsage.period == period
+                )
+                .scalar()
+            )
+
+        return requests or 0
+
+
+def load_settings(config_path=None):
+    settings = config.load_section(
+        CONFIG_SECTION, DEFAULT_SETTINGS, SETTINGS_ENV_PREFIX, config_path
+    )
+
+    if not 0 <= settings["backfill_share"] <= 1:
+        raise ValueError("The backfill share must be between 0 and 1")
+
+    return settings
+
+
+def configure(db_sessionmaker=None, settings=None):
+    # Usage is persisted in the database when one is given, and only counted
+    # in memory otherwise
+    global _settings, _usage_store
+
+    with _lock:
+        _settings = settings or load_settings()
+
+        if db_sessionmaker is None:
+            _usage_store = MemoryUsageStore()
+        else:
+            _usage_store = DatabaseUsageStore(db_sessionmaker)
+
+        _limiters.clear()
+
+
+def process_settings(num_processes):
+    # Settings for each of 'num_processes' processes that make requests at
+    # the same time, which share the rates and bursts of the providers. The
+    # monthly quotas are shared through the database.
+    with _lock:
+        settings = dict(_settings or load_settings())
+
+    for name, value in settings.items():
+        if name.endswith("_rate"):
+            settings[name] = value / num_processes
+        elif name.endswith("_burst"):
+            settings[name] = max(value // num_processes, 1)
+
+    return settings
+
+
+def is_persisted():
+    with _lock:
+        return isinstance(_usage_store, DatabaseUsageStore)
+
+
+def has_monthly_quota():
+    with _lock:
+        settings = _settings or load_settings()
+
+    return any(
+        value for name, value in settings.items() if name.endswith("_monthly_quota")
+    )
+
+
+def take_usage():
+    # Returns the requests counted in memory since the last call, by provider
+    # and period, so that another process can add them to its own usage
+    with _lock:
+        usage_store = _usage_store
+
+    if not isinstance(usage_store, MemoryUsageStore):
+        return {}
+
+    return usage_store.take()
+
+
+def add_usage(usage):
+    with _lock:
+        usage_store = _usage_store
+
+    for (provider, period), requests in usage.items():
+        usage_store.add(provider, period, requests)
+
+
+def acquire(provider):
+    # Called before every request to a provider, including retries
+    _get_limiter(provider).acquire(_priority.get())
+
+
+@contextlib.contextmanager
+def priority(value):
+    # Requests made within the block (and in threads started with a copy of
+    # its context) are of the given priority class
+    token = _priority.set(value)
+
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def priority_for(start_date):
+    # A request is only a refresh when all of its dates are recent, so that a
+    # long backfill that happens to end today still counts against the
+    # backfill share
+    if start_date >= refresh_start_date():
+        return REFRESH
+
+    return BACKFILL
+
+
+def refresh_start_date():
+    return datetime.date.today() - datetime.timedelta(days=REFRESH_DAYS)
+
+
+def usage_stats():
+    with _lock:
+        limiters = list(_limiters.values())
+        usage_store = _usage_store
+
+    return {
+        limiter.provider: {
+            "period": _period(),
+            "requests": usage_store.usage(limiter.provider, _period()),
+            "monthly_quota": limiter.monthly_quota or None,
+        }
+        for limiter in limiters
+    }
+
+
+def log_usage_stats():
+    for provider, stats in usage_stats().items():
+        logging.info(
+            "Provider '%s' requests in %s: %d of %s",
+            provider,
+            stats["period"],
+            stats["requests"],
+            stats["monthly_quota"] or "unlimited",
+        )
+
+
+def _get_limiter(provider):
+    global _settings, _usage_store
+
+    with _lock:
+        limiter = _limiters.get(provider)
+
+        if limiter is None:
+            if _settings is None:
+                _settings = load_settings()
+
+            if _usage_store is None:
+                _usage_store = MemoryUsageStore()
+
+            limiter = ProviderLimiter(
+                provider,
+                _settings[f"{provider}_rate"],
+                _settings[f"{provider}_burst"],
+                _settings[f"{provider}_monthly_quota"],
+                _settings["backfill_share"],
+                _usage_store,
+            )
+            _limiters[provider] = limiter
+
+        return limiter
+
+
+def _period():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m")
@@ -0,0 +1,188 @@
+import datetime
+import http.server
+import json
+import logging
+import time
+import urllib.parse
+
+from market_data_loader import (
+    conversion,
+    currency,
+    frame_cache,
+    latency,
+    metrics,
+    pipeline,
+    scheduler,
+)
+from market_data_loader.clients import http_client
+
+OUTPUT_COLUMNS = ["symbol", "currency", "close_price"]
+CONTENT_TYPES = {"json": "application/json", "csv": "text/csv"}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Server(http.server.ThreadingHTTPServer):
+    # Answers the same queries as load_data.py over HTTP. The database engine,
+    # the HTTP client session and the frame cache stay warm between requests,
+    # and every request is handled in its own thread.
+    daemon_threads = True
+
+    def __init__(self, address, db_sessionmaker, concurrency=1, use_pipeline=False):
+        super().__init__(address, _RequestHandler)
+
+        self.db_sessionmaker = db_sessionmaker
+        self.concurrency = concurrency
+        self.use_pipeline = use_pipeline
+        self.latencies = latency.LatencyRecorder()
+
+    def stats(self):
+        return {
+            "requests": self.latencies.stats(),
+            "http_client": http_client.latency_stats(),
+            "frame_cache": frame_cache.CACHE.stats(),
+            "providers": scheduler.usage_stats(),
+        }
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        start_time = time.perf_counter()
+        url = urllib.parse.urlsplit(self.path)
+
+        routes = {
+            "/prices": self._get_prices,
+            "/stats": self._get_stats,
+            "/health": self._get_health,
+            "/metrics": self._get_metrics,
+        }
+
+        route = routes.get(url.path)
+
+        try:
+            if route is None:
+                status, content_type, body = _error(404, f"Unknown path '{url.path}'")
+            else:
+                status, content_type, body = route(urllib.parse.parse_qs(url.query))
+        except (BadRequest, currency.UnsupportedCurrency) as err:
+            status, content_type, body = _error(400, str(err))
+        except RuntimeError as err:
+            logging.error(err)
+            status, content_type, body = _error(502, str(err))
+        except Exception:
+            logging.exception("Error while handling '%s'", self.path)
+            status, content_type, body = _error(500, "Internal server error")
+
+        elapsed = time.perf_counter() - start_time
+        self.server.latencies.record(url.path if route else "unknown", elapsed)
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Server-Timing", f"total;dur={elapsed * 1000:.3f}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("%s %s", self.address_string(), format % args)
+
+    def _get_prices(self, params):
+        symbols = _parse_symbols(params)
+        target_currency = _param(params, "currency").strip().upper()
+        today = datetime.date.today()
+        start_date = _parse_date(_param(params, "start_date", str(today)))
+        end_date = _parse_date(_param(params, "end_date", str(today)))
+        output_format = _param(params, "format", "json")
+
+        if start_date > end_date:
+            raise BadRequest("Start date must be before end date")
+
+        if output_format not in CONTENT_TYPES:
+            raise BadRequest(f"Unknown format '{output_format}'")
+
+        start_date = min(start_date, today)
+        end_date = min(end_date, today)
+
+        if self.server.use_pipeline:
+            stock_prices_df = pipeline.load_stock_prices(
+                self.server.db_sessionmaker,
+                symbols,
+                start_date,
+                end_date,
+                target_currency,
+                self.server.concurrency,
+                # Later requests are served from the cached frames
+                warm_cache=True,
+            )
+        else:
+            stock_prices_df = conversion.get_converted_stock_prices(
+                self.server.db_sessionmaker,
+                symbols,
+                start_date,
+                end_date,
+                target_currency,
+                self.server.concurrency,
+                warm_cache=True,
+            )
+
+        stock_prices_df = stock_prices_df[OUTPUT_COLUMNS]
+
+        if output_format == "csv":
+            body = stock_prices_df.to_csv()
+        else:
+            body = (
+                stock_prices_df.reset_index()
+                .astype({"date": str})
+                .to_json(orient="records")
+            )
+
+        return 200, CONTENT_TYPES[output_format], body.encode()
+
+    def _get_stats(self, params):
+        return 200, CONTENT_TYPES["json"], json.dumps(self.server.stats()).encode()
+
+    def _get_metrics(self, params):
+        return 200, "text/plain; version=0.0.4", metrics.prometheus_text().encode()
+
+    def _get_health(self, params):
+        return 200, CONTENT_TYPES["json"], b'{"status": "ok"}'
+
+
+def _error(status, message):
+    return status, CONTENT_TYPES["json"], json.dumps({"error": message}).encode()
+
+
+def _param(params, name, default=None):
+    values = params.get(name)
+
+    if values:
+        return values[-1]
+
+    if default is None:
+        raise BadRequest(f"Missing parameter '{name}'")
+
+    return default
+
+
+def _parse_symbols(params):
+    symbols = [
+        symbol.strip()
+        for value in params.get("symbols", []) + params.get("symbol", [])
+        for symbol in value.split(",")
+        if symbol.strip()
+    ]
+
+    if not symbols:
+        raise BadRequest("No symbols given")
+
+    # Drop duplicate symbols while preserving the given order
+    return list(dict.fromkeys(symbols))
+
+
+def _parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise BadRequest(f"Invalid date value '{value}'")
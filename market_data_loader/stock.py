@@ -1,115 +1,436 @@
 import datetime
 import logging
 
-import pandas as pd
-
 import market_data_loader.clients.marketstack_client as stock_client
-from market_data_loader.models import ExcludedDate, StockPrice
+from market_data_loader import (
+    columnar_store,
+    coverage,
+    database,
+    frame_cache,
+    metrics,
+    planner,
+    scheduler,
+    trading_calendar,
+)
+from market_data_loader.models import ExcludedDate, StockPrice, StockPriceCoverage
 
 
-def get_stock_prices(db_sessionmaker, symbol, start_date, end_date):
+def get_stock_prices(db_sessionmaker, symbol, start_date, end_date, concurrency=1):
     logging.info(
         "Get stock prices for '%s' from '%s' to '%s'", symbol, start_date, end_date
     )
 
-    _fill_missing_dates(db_sessionmaker, symbol, start_date, end_date)
+    _fill_missing_dates(db_sessionmaker, [symbol], start_date, end_date, concurrency)
 
     return _query_stock_prices_as_dataframe(
-        db_sessionmaker, symbol, start_date, end_date
+        db_sessionmaker, [symbol], start_date, end_date
     )
 
 
-def _fill_missing_dates(db_sessionmaker, symbol, start_date, end_date):
-    cached_dates = _query_cached_dates(db_sessionmaker, symbol, start_date, end_date)
+def get_stock_prices_batch(
+    db_sessionmaker, symbols, start_date, end_date, concurrency=1
+):
+    logging.info(
+        "Get stock prices for %d symbols from '%s' to '%s'",
+        len(symbols),
+        start_date,
+        end_date,
+    )
 
-    excluded_dates = _query_excluded_dates(
-        db_sessionmaker, symbol, start_date, end_date
+    _fill_missing_dates(db_sessionmaker, symbols, start_date, end_date, concurrency)
+
+    return _query_stock_prices_as_dataframe(
+        db_sessionmaker, symbols, start_date, end_date
     )
 
-    missing_dates = _compute_missing_dates(
-        cached_dates, excluded_dates, start_date, end_date
+
+class FetchQueue:
+    # Collects the fills of several symbols and date ranges and runs them
+    # together. The missing dates of all queued fills are planned at once, so
+    # that fills of the same symbols or of neighbouring ranges share their
+    # requests. Requests for recent dates are made before backfills, and
+    # larger requests before smaller ones.
+
+    def __init__(self, db_sessionmaker, concurrency=1):
+        self._db_sessionmaker = db_sessionmaker
+        self._concurrency = concurrency
+        self._fills = []
+
+    def add(self, symbols, start_date, end_date):
+        self._fills.append((list(symbols), start_date, end_date))
+
+    def run(self):
+        fills, self._fills = self._fills, []
+
+        missing_dates_by_symbol = {}
+        uncovered_fills = []
+
+        for symbols, start_date, end_date in fills:
+            symbols = _query_uncovered_symbols(
+                self._db_sessionmaker, symbols, start_date, end_date
+            )
+
+            if not symbols:
+                continue
+
+            cached_dates = _query_cached_dates(
+                self._db_sessionmaker, symbols, start_date, end_date
+            )
+
+            for symbol, missing_dates in _find_missing_dates(
+                self._db_sessionmaker, symbols, cached_dates, start_date, end_date
+            ).items():
+                missing_dates_by_symbol.setdefault(symbol, set()).update(missing_dates)
+
+            uncovered_fills.append((symbols, start_date, end_date))
+
+        if not uncovered_fills:
+            return
+
+        _fetch_planned_requests(
+            self._db_sessionmaker, missing_dates_by_symbol, self._concurrency
+        )
+
+        _exclude_missing_dates(self._db_sessionmaker, missing_dates_by_symbol)
+
+        for symbols, start_date, end_date in uncovered_fills:
+            _add_coverage(self._db_sessionmaker, symbols, start_date, end_date)
+
+
+@metrics.timed("stock.fill_missing_dates")
+def _fill_missing_dates(db_sessionmaker, symbols, start_date, end_date, concurrency=1):
+    fetch_queue = FetchQueue(db_sessionmaker, concurrency)
+    fetch_queue.add(symbols, start_date, end_date)
+    fetch_queue.run()
+
+
+def _fetch_planned_requests(db_sessionmaker, missing_dates_by_symbol, concurrency=1):
+    with metrics.stage("stock.plan_requests"):
+        planned_requests = planner.order_requests(
+            planner.plan_requests(missing_dates_by_symbol)
+        )
+
+    for group_symbols, range_start, range_end in planned_requests:
+        with scheduler.priority(scheduler.priority_for(range_start)):
+            _fetch_missing_dates(
+                db_sessionmaker,
+                {symbol: missing_dates_by_symbol[symbol] for symbol in group_symbols},
+                range_start,
+                range_end,
+                concurrency,
+            )
+
+
+def _find_missing_dates(db_sessionmaker, symbols, cached_dates, start_date, end_date):
+    excluded_dates = _query_excluded_dates(
+        db_sessionmaker, symbols, start_date, end_date
     )
 
+    # Exchange holidays are never missing
+    holidays = _query_holidays(db_sessionmaker, symbols, start_date, end_date)
+
+    missing_dates_by_symbol = {}
+
+    for symbol in symbols:
+        missing_dates = _compute_missing_dates(
+            cached_dates.get(symbol, set()),
+            excluded_dates.get(symbol, set()) | holidays.get(symbol, set()),
+            start_date,
+            end_date,
+        )
+
+        if missing_dates:
+            missing_dates_by_symbol[symbol] = missing_dates
+
+    return missing_dates_by_symbol
+
+
+def _query_uncovered_symbols(db_sessionmaker, symbols, start_date, end_date):
+    with db_sessionmaker.begin() as session:
+        covered_symbols = coverage.query_covered_keys(
+            session,
+            StockPriceCoverage.__table__,
+            "symbol",
+            symbols,
+            start_date,
+            end_date,
+        )
+
+    return [symbol for symbol in symbols if not symbol in covered_symbols]
+
+
+def _add_coverage(db_sessionmaker, symbols, start_date, end_date):
+    # Today's date is never covered, as the market data might not be available
+    # yet. Weekends next to the interval are covered, as there is nothing to
+    # load for them, so that intervals separated by a weekend are merged.
+    end_date = min(end_date, datetime.date.today() - datetime.timedelta(days=1))
+
+    if end_date < start_date:
+        return
+
+    while (start_date - datetime.timedelta(days=1)).weekday() >= 5:
+        start_date -= datetime.timedelta(days=1)
+
+    while (end_date + datetime.timedelta(days=1)).weekday() >= 5:
+        end_date += datetime.timedelta(days=1)
+
+    with database.begin_write(db_sessionmaker) as session:
+        for symbol in symbols:
+            coverage.add_interval(
+                session,
+                StockPriceCoverage.__table__,
+                start_date,
+                end_date,
+                symbol=symbol,
+            )
+
+
+def _exclude_missing_dates(db_sessionmaker, missing_dates_by_symbol):
+    missing_dates = [
+        missing_date
+        for missing_dates in missing_dates_by_symbol.values()
+        for missing_date in missing_dates
+    ]
+
     if not missing_dates:
         return
 
-    # Various heuristics could be used to avoid re-fetching data that we already
-    # have. Use a very simple heuristic for now that just re-fetches all data
-    # within the first and last missing date. This should minimize the number of
-    # requests made in most cases.
-    missing_range_start = min(missing_dates)
-    missing_range_end = max(missing_dates)
+    # Exchange holidays that were learned while fetching are shared by all
+    # symbols of the exchange, so they don't need to be excluded per symbol.
+    holidays = _query_holidays(
+        db_sessionmaker,
+        list(missing_dates_by_symbol),
+        min(missing_dates),
+        max(missing_dates),
+    )
+
+    # Don't exclude today's date, as the market data might not be available
+    # yet.
+    rows = [
+        {"date": missing_date, "symbol": symbol}
+        for symbol, missing_dates in missing_dates_by_symbol.items()
+        for missing_date in missing_dates
+        if missing_date < datetime.date.today()
+        and not missing_date in holidays.get(symbol, set())
+    ]
+
+    with database.begin_write(db_sessionmaker) as session:
+        database.insert_or_ignore(session, ExcludedDate.__table__, rows)
+
+
+def _fetch_missing_dates(
+    db_sessionmaker, missing_dates_by_symbol, start_date, end_date, concurrency=1
+):
+    trading_dates = trading_calendar.TradingDates()
 
     for paginated_response in stock_client.end_of_day(
-        symbol, missing_range_start, missing_range_end
+        list(missing_dates_by_symbol), start_date, end_date, concurrency
     ):
-        with db_sessionmaker.begin() as session:
-            for price in paginated_response:
-                date = datetime.datetime.strptime(
-                    price["date"], "%Y-%m-%dT%H:%M:%S%z"
-                ).date()
-
-                if date in missing_dates:
-                    session.add(
-                        StockPrice(
-                            date=date,
-                            symbol=price["symbol"],
-                            close_price=price["close"],
-                            exchange=price["exchange"],
-                        )
-                    )
-
-                    missing_dates.remove(date)
+        columns = _price_columns(paginated_response)
+        rows = _stock_price_rows(columns, missing_dates_by_symbol)
+        trading_dates.update_columns(columns)
 
-    with db_sessionmaker.begin() as session:
-        for missing_date in missing_dates:
-            # Don't exclude today's date, as the market data might not be
-            # available yet.
-            if missing_date < datetime.date.today():
-                session.add(ExcludedDate(date=missing_date, symbol=symbol))
+        with database.begin_write(db_sessionmaker) as session:
+            database.insert_or_ignore(session, StockPrice.__table__, rows)
+
+        _store_stock_prices(db_sessionmaker, rows)
+
+    with database.begin_write(db_sessionmaker) as session:
+        trading_calendar.store_trading_dates(session, trading_dates)
+
+
+def _price_columns(paginated_response):
+    # Converts a page of the /eod endpoint to arrays of the fields that are
+    # stored, so that the page can be parsed and filtered with array
+    # operations. The dates keep the calendar day of the exchange, which is
+    # the first part of the timestamp.
+    import numpy as np
+
+    return {
+        "symbol": np.array([price["symbol"] for price in paginated_response], object),
+        "date": np.array(
+            [price["date"][:10] for price in paginated_response], "datetime64[D]"
+        ),
+        "close_price": np.array(
+            [price["close"] for price in paginated_response], float
+        ),
+        "exchange": np.array(
+            [price["exchange"] for price in paginated_response], object
+        ),
+    }
+
+
+def _stock_price_rows(columns, missing_dates_by_symbol):
+    # The missing dates of each symbol are updated in place, so that whatever is
+    # left after fetching can be excluded. The dates of the page are looked up
+    # in the missing dates, which is cheaper than converting the missing dates
+    # of a long range to arrays for every page.
+    rows = []
+
+    for row in _rows_from_columns(columns):
+        missing_dates = missing_dates_by_symbol.get(row["symbol"])
+
+        if missing_dates and row["date"] in missing_dates:
+            rows.append(row)
+
+            missing_dates.remove(row["date"])
+
+    return rows
+
+
+def _rows_from_columns(columns):
+    return [
+        {
+            "date": date,
+            "symbol": symbol,
+            "close_price": close_price,
+            "exchange": exchange,
+        }
+        for date, symbol, close_price, exchange in zip(
+            columns["date"].tolist(),
+            columns["symbol"].tolist(),
+            columns["close_price"].tolist(),
+            columns["exchange"].tolist(),
+        )
+    ]
 
 
 def _compute_missing_dates(dates, excluded_dates, start_date, end_date):
-    missing_dates = (
-        pd.date_range(start=start_date, end=end_date, freq="B")
-        .difference(dates)
-        .to_pydatetime()
-        .tolist()
-    )
+    missing_dates = set()
+    date = start_date
+
+    while date <= end_date:
+        if date.weekday() < 5 and not date in dates and not date in excluded_dates:
+            missing_dates.add(date)
 
-    return {date.date() for date in missing_dates if not date.date() in excluded_dates}
+        date += datetime.timedelta(days=1)
 
+    return missing_dates
 
-def _query_excluded_dates(db_sessionmaker, symbol, start_date, end_date):
+
+def _query_holidays(db_sessionmaker, symbols, start_date, end_date):
+    with db_sessionmaker.begin() as session:
+        return trading_calendar.query_holidays_by_symbol(
+            session, symbols, start_date, end_date
+        )
+
+
+def _query_excluded_dates(db_sessionmaker, symbols, start_date, end_date):
     with db_sessionmaker.begin() as session:
         data_rows = (
-            session.query(ExcludedDate.date)
-            .filter(ExcludedDate.symbol == symbol)
+            session.query(ExcludedDate.symbol, ExcludedDate.date)
+            .filter(ExcludedDate.symbol.in_(symbols))
             .filter(ExcludedDate.date >= start_date, ExcludedDate.date <= end_date)
             .all()
         )
 
-        return {row[0] for row in data_rows}
+        return _group_dates_by_symbol(data_rows)
 
 
-def _query_cached_dates(db_sessionmaker, symbol, start_date, end_date):
+def _query_cached_dates(db_sessionmaker, symbols, start_date, end_date):
     with db_sessionmaker.begin() as session:
         data_rows = (
-            session.query(StockPrice.date)
-            .filter(StockPrice.symbol == symbol)
+            session.query(StockPrice.symbol, StockPrice.date)
+            .filter(StockPrice.symbol.in_(symbols))
             .filter(StockPrice.date >= start_date, StockPrice.date <= end_date)
             .all()
         )
 
-        return {row[0] for row in data_rows}
+        return _group_dates_by_symbol(data_rows)
+
+
+def _group_dates_by_symbol(data_rows):
+    dates_by_symbol = {}
+
+    for symbol, date in data_rows:
+        dates_by_symbol.setdefault(symbol, set()).add(date)
+
+    return dates_by_symbol
+
+
+def _query_stock_prices_as_dataframe(db_sessionmaker, symbols, start_date, end_date):
+    symbols = sorted(set(symbols))
+
+    stock_prices_dfs = {
+        symbol: frame_cache.CACHE.get(
+            _cache_key(db_sessionmaker, symbol), start_date, end_date
+        )
+        for symbol in symbols
+    }
+
+    uncached_symbols = [
+        symbol for symbol in symbols if stock_prices_dfs[symbol] is None
+    ]
+
+    if uncached_symbols:
+        uncached_stock_prices_df = _read_stock_prices_as_dataframe(
+            db_sessionmaker, uncached_symbols, start_date, end_date
+        )
+
+        for symbol, symbol_stock_prices_df in _split_by_symbol(
+            uncached_stock_prices_df, uncached_symbols
+        ):
+            frame_cache.CACHE.put(
+                _cache_key(db_sessionmaker, symbol),
+                start_date,
+                end_date,
+                symbol_stock_prices_df,
+            )
+
+            stock_prices_dfs[symbol] = symbol_stock_prices_df
+
+        if len(symbols) == len(uncached_symbols):
+            return uncached_stock_prices_df
+
+    import pandas as pd
+
+    return pd.concat([stock_prices_dfs[symbol] for symbol in symbols])
+
+
+def _split_by_symbol(stock_prices_df, symbols):
+    if len(symbols) == 1:
+        return [(symbols[0], stock_prices_df)]
+
+    return [
+        (symbol, stock_prices_df[stock_prices_df["symbol"] == symbol])
+        for symbol in symbols
+    ]
+
+
+def _cache_key(db_sessionmaker, symbol):
+    return ("stock_prices", db_sessionmaker.kw.get("bind"), symbol)
+
+
+def _store_stock_prices(db_sessionmaker, rows):
+    # Called after new rows have been written to the database
+    store = columnar_store.get_store()
+
+    if store is not None:
+        store.write_stock_prices(rows)
+
+    _invalidate_cached_stock_prices(db_sessionmaker, rows)
+
+
+def _invalidate_cached_stock_prices(db_sessionmaker, rows):
+    for symbol in {row["symbol"] for row in rows}:
+        frame_cache.CACHE.invalidate(_cache_key(db_sessionmaker, symbol))
+
+
+@metrics.timed("stock.read_sql")
+def _read_stock_prices_as_dataframe(db_sessionmaker, symbols, start_date, end_date):
+    import pandas as pd
+
+    store = columnar_store.get_store()
 
+    if store is not None:
+        return store.read_stock_prices(symbols, start_date, end_date)
 
-def _query_stock_prices_as_dataframe(db_sessionmaker, symbol, start_date, end_date):
     with db_sessionmaker.begin() as session:
         statement = (
             session.query(StockPrice)
-            .filter(StockPrice.symbol == symbol)
+            .filter(StockPrice.symbol.in_(symbols))
             .filter(StockPrice.date >= start_date, StockPrice.date <= end_date)
+            .order_by(StockPrice.symbol, StockPrice.date)
             .statement
         )
 
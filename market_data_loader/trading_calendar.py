@@ -0,0 +1,131 @@
+import csv
+import datetime
+import os
+
+from market_data_loader import database
+from market_data_loader.models import ExchangeHoliday, SymbolExchange
+
+BUNDLED_HOLIDAYS_PATH = os.path.join(
+    os.path.dirname(__file__), "data", "exchange_holidays.csv"
+)
+# A business day without any rows is only learned as a holiday when the data
+# of at least this many symbols of the exchange was fetched, so that a single
+# suspended symbol doesn't close the whole exchange.
+LEARN_MIN_SYMBOLS = 2
+
+
+class TradingDates:
+    # Collects the dates on which the fetched symbols of each exchange traded,
+    # from which the symbol exchanges and the exchange holidays are learned.
+
+    def __init__(self):
+        self._dates_by_exchange = {}
+        self._symbols_by_exchange = {}
+        self._exchange_by_symbol = {}
+
+    def update_columns(self, columns):
+        # Adds a page of prices converted to arrays (see stock._price_columns)
+        import numpy as np
+
+        for exchange in np.unique(columns["exchange"]).tolist():
+            is_exchange = columns["exchange"] == exchange
+
+            self._dates_by_exchange.setdefault(exchange, set()).update(
+                np.unique(columns["date"][is_exchange]).tolist()
+            )
+            self._symbols_by_exchange.setdefault(exchange, set()).update(
+                np.unique(columns["symbol"][is_exchange]).tolist()
+            )
+
+        # The last exchange of every symbol is kept
+        symbols, last_indexes = np.unique(columns["symbol"][::-1], return_index=True)
+        self._exchange_by_symbol.update(
+            zip(symbols.tolist(), columns["exchange"][::-1][last_indexes].tolist())
+        )
+
+    def symbol_exchange_rows(self):
+        return [
+            {"symbol": symbol, "exchange": exchange}
+            for symbol, exchange in self._exchange_by_symbol.items()
+        ]
+
+    def holiday_rows(self):
+        rows = []
+
+        for exchange, dates in self._dates_by_exchange.items():
+            if len(self._symbols_by_exchange[exchange]) < LEARN_MIN_SYMBOLS:
+                continue
+
+            date = min(dates)
+            end_date = max(dates)
+
+            while date < end_date:
+                if date.weekday() < 5 and not date in dates:
+                    rows.append({"exchange": exchange, "date": date})
+
+                date += datetime.timedelta(days=1)
+
+        return rows
+
+
+def query_symbol_exchanges(session, symbols):
+    data_rows = (
+        session.query(SymbolExchange.symbol, SymbolExchange.exchange)
+        .filter(SymbolExchange.symbol.in_(symbols))
+        .all()
+    )
+
+    return dict(data_rows)
+
+
+def query_holidays(session, exchanges, start_date, end_date):
+    data_rows = (
+        session.query(ExchangeHoliday.exchange, ExchangeHoliday.date)
+        .filter(ExchangeHoliday.exchange.in_(exchanges))
+        .filter(ExchangeHoliday.date >= start_date, ExchangeHoliday.date <= end_date)
+        .all()
+    )
+
+    holidays_by_exchange = {}
+
+    for exchange, date in data_rows:
+        holidays_by_exchange.setdefault(exchange, set()).add(date)
+
+    return holidays_by_exchange
+
+
+def query_holidays_by_symbol(session, symbols, start_date, end_date):
+    exchange_by_symbol = query_symbol_exchanges(session, symbols)
+
+    holidays_by_exchange = query_holidays(
+        session, set(exchange_by_symbol.values()), start_date, end_date
+    )
+
+    return {
+        symbol: holidays_by_exchange.get(exchange, set())
+        for symbol, exchange in exchange_by_symbol.items()
+    }
+
+
+def store_trading_dates(session, trading_dates):
+    database.insert_or_ignore(
+        session, SymbolExchange.__table__, trading_dates.symbol_exchange_rows()
+    )
+    database.insert_or_ignore(
+        session, ExchangeHoliday.__table__, trading_dates.holiday_rows()
+    )
+
+
+def seed_holidays(session, path=BUNDLED_HOLIDAYS_PATH):
+    with open(path, newline="") as holidays_file:
+        rows = [
+            {
+                "exchange": row["exchange"],
+                "date": datetime.date.fromisoformat(row["date"]),
+            }
+            for row in csv.DictReader(holidays_file)
+        ]
+
+    database.insert_or_ignore(session, ExchangeHoliday.__table__, rows)
+
+    return len(rows)
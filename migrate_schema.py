@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+
+from market_data_loader import database, logger, migration
+
+
+def main():
+    args = parse_args()
+
+    logger.configure_logger()
+
+    engine = database.create_engine()
+    db_path = _sqlite_path(engine)
+
+    if db_path is not None:
+        logging.info("Database size: %d MiB", os.path.getsize(db_path) // 2**20)
+
+    logging.info("Migrating the database schema..")
+
+    num_rows = migration.migrate(engine, args.chunk_size)
+
+    for table_name, count in num_rows.items():
+        logging.info("Migrated %d rows of '%s'", count, table_name)
+
+    if not num_rows:
+        logging.info("The database schema is up to date")
+
+    if db_path is not None and args.vacuum and num_rows:
+        logging.info("Reclaiming the space of the old tables..")
+
+        with engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            connection.exec_driver_sql("VACUUM")
+
+        logging.info("Database size: %d MiB", os.path.getsize(db_path) // 2**20)
+
+    engine.dispose()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Migrate an existing database to the current schema"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=migration.MIGRATION_CHUNK_SIZE,
+        help=f"rows copied at a time (default: {migration.MIGRATION_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--vacuum",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="shrink the SQLite database file after migrating",
+    )
+
+    return parser.parse_args()
+
+
+def _sqlite_path(engine):
+    url = engine.url
+
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+
+    return url.database
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+import argparse
+import datetime
+import logging
+import sys
+
+from market_data_loader import arguments, database, logger, refresh, scheduler
+from market_data_loader.clients import http_client
+
+RUN_TIMES = "06:00"
+JITTER = 300
+
+
+def parse_run_times(arg):
+    try:
+        run_times = [
+            datetime.datetime.strptime(value.strip(), "%H:%M").time()
+            for value in arg.split(",")
+        ]
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid time value")
+
+    return run_times
+
+
+def read_watchlist(path):
+    # The watchlist is read before every refresh, so that changes are picked up
+    # by a running daemon
+    try:
+        return arguments.read_symbols_file(path)
+    except argparse.ArgumentTypeError as err:
+        raise RuntimeError(f"Invalid watchlist: {err}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Load the new stock prices and currency rates of a watchlist"
+    )
+    parser.add_argument(
+        "--watchlist", help="file with one stock symbol per line", required=True
+    )
+    parser.add_argument(
+        "--currency",
+        help="currency symbol or comma-separated currency symbols ('USD,GBP')",
+        required=True,
+        type=arguments.parse_currencies,
+    )
+    parser.add_argument(
+        "--start-date",
+        help="start date of symbols that were never refreshed ('YYYY-mm-dd', default: the last published date)",
+        type=arguments.parse_date,
+    )
+    arguments.add_fetch_arguments(parser)
+    parser.add_argument(
+        "--daemon",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="keep running and refresh at the scheduled times",
+    )
+    parser.add_argument(
+        "--at",
+        default=parse_run_times(RUN_TIMES),
+        dest="run_times",
+        help=f"comma-separated daily refresh times in local time ('HH:MM', default: {RUN_TIMES})",
+        type=parse_run_times,
+    )
+    parser.add_argument(
+        "--jitter",
+        default=JITTER,
+        help=f"maximum random delay of a scheduled refresh in seconds (default: {JITTER})",
+        type=float,
+    )
+    parser.add_argument(
+        "--verbose",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="verbose logging",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    if args.verbose:
+        logger.configure_logger(level=logging.DEBUG)
+    else:
+        logger.configure_logger(level=logging.INFO)
+
+    http_client.configure(read_timeout=args.read_timeout, max_retries=args.max_retries)
+
+    db_sessionmaker = database.create_sessionmaker()
+    scheduler.configure(db_sessionmaker)
+
+    def refresh_watchlist():
+        refresh.refresh(
+            db_sessionmaker,
+            read_watchlist(args.watchlist),
+            args.currency,
+            initial_start_date=args.start_date,
+            concurrency=args.concurrency,
+        )
+
+    if not args.daemon:
+        try:
+            refresh_watchlist()
+        except RuntimeError as err:
+            logging.error(err)
+
+            sys.exit(1)
+        finally:
+            http_client.log_latency_stats()
+            scheduler.log_usage_stats()
+
+        return
+
+    try:
+        refresh.run_daemon(refresh_watchlist, args.run_times, args.jitter)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_client.log_latency_stats()
+        scheduler.log_usage_stats()
+
+
+if __name__ == "__main__":
+    main()
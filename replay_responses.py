@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import os
+
+from market_data_loader import database, logger, replay, response_store
+
+
+def main():
+    args = parse_args()
+
+    logger.configure_logger()
+
+    logging.info("Rebuilding the database from the responses in '%s'..", args.root)
+
+    db_sessionmaker = database.create_sessionmaker()
+
+    counts = replay.rebuild_from_store(
+        db_sessionmaker,
+        response_store.ResponseStore(args.root, replay=True),
+        args.batch_size,
+    )
+
+    for table_name, count in counts.items():
+        logging.info("Replayed %d %s", count, table_name.replace("_", " "))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Rebuild stock prices and currency rates from stored provider responses"
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default=os.environ.get(response_store.RESPONSE_STORE_ENV),
+        required=response_store.RESPONSE_STORE_ENV not in os.environ,
+        help=f"response store directory (default: ${response_store.RESPONSE_STORE_ENV})",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=replay.REBUILD_BATCH_SIZE,
+        help=f"rows inserted per transaction (default: {replay.REBUILD_BATCH_SIZE})",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
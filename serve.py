@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+
+from market_data_loader import (
+    arguments,
+    database,
+    frame_cache,
+    logger,
+    metrics,
+    scheduler,
+    server,
+)
+from market_data_loader.clients import http_client
+
+HOST = "127.0.0.1"
+PORT = 8080
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Serve stock prices in specified currency over HTTP"
+    )
+    parser.add_argument(
+        "--host", default=HOST, help=f"address to listen on (default: {HOST})"
+    )
+    parser.add_argument(
+        "--port", default=PORT, help=f"port to listen on (default: {PORT})", type=int
+    )
+    arguments.add_fetch_arguments(parser)
+    parser.add_argument(
+        "--pipeline",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="fetch stock prices and currency rates concurrently",
+    )
+    parser.add_argument(
+        "--metrics",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="collect timings and counters for the /metrics endpoint",
+    )
+    parser.add_argument(
+        "--verbose",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="verbose logging",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    if args.verbose:
+        logger.configure_logger(level=logging.DEBUG)
+    else:
+        logger.configure_logger(level=logging.INFO)
+
+    http_client.configure(read_timeout=args.read_timeout, max_retries=args.max_retries)
+
+    if args.metrics:
+        metrics.enable()
+
+    db_sessionmaker = database.create_sessionmaker()
+    scheduler.configure(db_sessionmaker)
+    frame_cache.configure()
+
+    with server.Server(
+        (args.host, args.port), db_sessionmaker, args.concurrency, args.pipeline
+    ) as http_server:
+        logging.info("Serving on http://%s:%d", *http_server.server_address[:2])
+
+        try:
+            http_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            http_server.latencies.log_stats("Server request")
+            http_client.log_latency_stats()
+            scheduler.log_usage_stats()
+            frame_cache.log_stats()
+
+
+if __name__ == "__main__":
+    main()
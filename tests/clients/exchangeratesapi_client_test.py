@@ -40,6 +40,26 @@ CURRENCY_RATE_SUCCESS_RESPONE = """
 }
 """
 
+TIMESERIES_SUCCESS_RESPONSE = """
+{
+    "success": true,
+    "timeseries": true,
+    "start_date": "2012-05-01",
+    "end_date": "2012-05-02",
+    "base": "EUR",
+    "rates": {
+        "2012-05-01": {
+            "USD": 1.322891,
+            "GBP": 0.814055
+        },
+        "2012-05-02": {
+            "USD": 1.315066,
+            "GBP": 0.812795
+        }
+    }
+}
+"""
+
 CURRENCY_RATE_ERROR_RESPONSE = """
 {
   "error": {
@@ -122,3 +142,68 @@ def test_currency_rate_failure(requests_mock):
         error.value.args[0]
         == "Error while fetching currency rates: You have provided one or more invalid Currency Codes. [Required format: currencies=EUR,USD,GBP,...]"
     )
+
+
+def test_timeseries_success(requests_mock):
+    start_date = datetime.date(2012, 5, 1)
+    end_date = datetime.date(2012, 5, 2)
+    currencies = ["USD", "GBP"]
+
+    request_params = "&".join(
+        [
+            "access_key=00000000000000000000000000000000",
+            "start_date=2012-05-01",
+            "end_date=2012-05-02",
+            "base=EUR",
+            "symbols=USD%2CGBP",
+        ]
+    )
+
+    request_url = f"http://api.exchangeratesapi.io/v1/timeseries?{request_params}"
+
+    requests_mock.get(request_url, text=TIMESERIES_SUCCESS_RESPONSE)
+
+    response = client.timeseries(start_date, end_date, currencies)
+
+    assert response["base"] == "EUR"
+    assert response["rates"]["2012-05-01"]["USD"] == 1.322891
+    assert response["rates"]["2012-05-02"]["GBP"] == 0.812795
+
+
+def test_timeseries_chunks(requests_mock):
+    start_date = datetime.date(2012, 1, 1)
+    end_date = datetime.date(2013, 12, 31)
+
+    timeseries = requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/timeseries",
+        text=TIMESERIES_SUCCESS_RESPONSE,
+    )
+
+    client.timeseries(start_date, end_date, ["USD"])
+
+    assert [
+        (request.qs["start_date"], request.qs["end_date"])
+        for request in timeseries.request_history
+    ] == [
+        (["2012-01-01"], ["2012-12-30"]),
+        (["2012-12-31"], ["2013-12-30"]),
+        (["2013-12-31"], ["2013-12-31"]),
+    ]
+
+
+def test_timeseries_failure(requests_mock):
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/timeseries",
+        text=CURRENCY_RATE_ERROR_RESPONSE,
+        status_code=422,
+    )
+
+    with pytest.raises(RuntimeError) as error:
+        client.timeseries(
+            datetime.date(2012, 5, 1), datetime.date(2012, 5, 2), ["USD", "GBP"]
+        )
+
+    assert (
+        error.value.args[0]
+        == "Error while fetching currency rate timeseries: You have provided one or more invalid Currency Codes. [Required format: currencies=EUR,USD,GBP,...]"
+    )
@@ -0,0 +1,83 @@
+import pytest
+import requests
+
+import market_data_loader.clients.http_client as client
+
+URL = "http://api.example.com/v1/data"
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr(client.time, "sleep", delays.append)
+    client.reset_latency_stats()
+
+    yield delays
+
+    client.configure(**{"max_retries": client.MAX_RETRIES})
+
+
+def test_success(requests_mock):
+    requests_mock.get(URL, text="ok")
+
+    response = client.get(URL, params={"key": "value"}, name="data")
+
+    assert response.text == "ok"
+    assert requests_mock.last_request.qs == {"key": ["value"]}
+    assert client.latency_stats()["data"]["count"] == 1
+
+
+def test_retry_after(requests_mock, no_sleep):
+    requests_mock.get(
+        URL,
+        [
+            {"status_code": 429, "headers": {"Retry-After": "7"}},
+            {"status_code": 503},
+            {"status_code": 200, "text": "ok"},
+        ],
+    )
+
+    response = client.get(URL, name="data")
+
+    assert response.text == "ok"
+    assert requests_mock.call_count == 3
+    assert no_sleep[0] == 7
+    assert 0 <= no_sleep[1] <= client.BACKOFF_FACTOR * 2
+    assert client.latency_stats()["data"]["count"] == 3
+
+
+def test_no_retry_on_client_error(requests_mock):
+    requests_mock.get(URL, status_code=422)
+
+    response = client.get(URL)
+
+    assert response.status_code == 422
+    assert requests_mock.call_count == 1
+
+
+def test_retries_exhausted(requests_mock):
+    client.configure(max_retries=2)
+
+    requests_mock.get(URL, status_code=500)
+
+    response = client.get(URL)
+
+    assert response.status_code == 500
+    assert requests_mock.call_count == 3
+
+
+def test_connection_error(requests_mock):
+    client.configure(max_retries=1)
+
+    requests_mock.get(URL, exc=requests.exceptions.ConnectTimeout)
+
+    with pytest.raises(RuntimeError) as error:
+        client.get(URL, name="data")
+
+    assert error.value.args[0].startswith("Request to 'data' failed")
+    assert requests_mock.call_count == 2
+
+
+def test_unknown_option():
+    with pytest.raises(ValueError):
+        client.configure(retries=1)
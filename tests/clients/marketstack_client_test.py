@@ -1,4 +1,5 @@
 import datetime
+import json
 import pytest
 import requests_mock
 
@@ -195,6 +196,83 @@ def test_multi_page_success(requests_mock):
         response.__next__()
 
 
+def test_concurrent_multi_page_success(requests_mock):
+    symbol = "AAPL"
+    start_date = datetime.date(2021, 4, 9)
+    end_date = datetime.date(2021, 4, 14)
+
+    def page_response(offset):
+        return json.dumps(
+            {
+                "pagination": {"limit": 2, "offset": offset, "count": 2, "total": 6},
+                "data": [
+                    {
+                        "close": float(offset + index),
+                        "symbol": symbol,
+                        "exchange": "XNAS",
+                        "date": f"2021-04-{9 + offset + index:02}T00:00:00+0000",
+                    }
+                    for index in range(2)
+                ],
+            }
+        )
+
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        text=lambda request, context: page_response(int(request.qs["offset"][0])),
+    )
+
+    response = client.end_of_day(symbol, start_date, end_date, concurrency=2)
+
+    assert [[price["close"] for price in page] for page in response] == [
+        [0.0, 1.0],
+        [2.0, 3.0],
+        [4.0, 5.0],
+    ]
+
+    assert sorted(
+        (request.qs["limit"][0], request.qs["offset"][0])
+        for request in requests_mock.request_history
+    ) == [("1000", "0"), ("2", "2"), ("2", "4")]
+
+
+def test_multi_symbol_success(requests_mock):
+    symbols = ["AAPL", "MSFT"]
+    start_date = datetime.date(2021, 4, 9)
+    end_date = datetime.date(2021, 4, 10)
+
+    request_params = "&".join(
+        [
+            "access_key=00000000000000000000000000000000",
+            "symbols=AAPL%2CMSFT",
+            "sort=ASC",
+            "date_from=2021-04-09",
+            "date_to=2021-04-10",
+            "limit=1000",
+            "offset=0",
+        ]
+    )
+
+    request_url = f"http://api.marketstack.com/v1/eod?{request_params}"
+
+    requests_mock.get(request_url, text=SUCCESS_RESPONSE)
+
+    response = client.end_of_day(symbols, start_date, end_date)
+    response_page = response.__next__()
+
+    assert response_page[0]["symbol"] == "AAPL"
+    assert requests_mock.last_request.qs["symbols"] == ["aapl,msft"]
+
+
+def test_too_many_symbols():
+    symbols = [f"SYM{i}" for i in range(client.MAX_SYMBOLS_PER_REQUEST + 1)]
+
+    with pytest.raises(ValueError):
+        client.end_of_day(
+            symbols, datetime.date(2021, 4, 9), datetime.date(2021, 4, 10)
+        )
+
+
 def test_failure(requests_mock):
     symbol = "AAPL"
     start_date = datetime.date(2021, 4, 9)
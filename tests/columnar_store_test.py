@@ -0,0 +1,157 @@
+import datetime
+import multiprocessing
+import threading
+
+import pytest
+import sqlalchemy as sa
+
+from market_data_loader import columnar_store, conversion, stock
+from market_data_loader.models import StockPrice
+
+pytest.importorskip("pyarrow")
+
+# The dates of the 'cached_db_sessionmaker' fixture
+DATES = [datetime.date(2021, 4, 8), datetime.date(2021, 4, 9)]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv(columnar_store.COLUMNAR_STORE_ENV, str(tmp_path))
+
+    return columnar_store.get_store()
+
+
+def test_write_and_read_stock_prices(store, tmp_path):
+    store.write_stock_prices(
+        [
+            {
+                "date": datetime.date(year, 12, 30),
+                "symbol": "AAPL",
+                "close_price": float(year),
+                "exchange": "XNAS",
+            }
+            for year in [2020, 2021]
+        ]
+    )
+    # Existing rows are kept
+    store.write_stock_prices(
+        [
+            {
+                "date": datetime.date(2021, 12, 30),
+                "symbol": "AAPL",
+                "close_price": 0.0,
+                "exchange": "XNAS",
+            }
+        ]
+    )
+
+    assert (tmp_path / "stock_prices" / "symbol=AAPL" / "year=2020.parquet").exists()
+    assert (tmp_path / "stock_prices" / "symbol=AAPL" / "year=2021.parquet").exists()
+
+    stock_prices_df = store.read_stock_prices(
+        ["AAPL", "MSFT"], datetime.date(2020, 1, 1), datetime.date(2021, 12, 31)
+    )
+
+    assert list(stock_prices_df.index) == [
+        datetime.date(2020, 12, 30),
+        datetime.date(2021, 12, 30),
+    ]
+    assert list(stock_prices_df["close_price"]) == [2020.0, 2021.0]
+    assert list(stock_prices_df["currency"]) == ["USD", "USD"]
+
+    stock_prices_df = store.read_stock_prices(
+        ["AAPL"], datetime.date(2021, 1, 1), datetime.date(2021, 12, 29)
+    )
+
+    assert stock_prices_df.empty
+
+
+def test_export_from_database(cached_db_sessionmaker, store):
+    num_rows = columnar_store.export_from_database(
+        cached_db_sessionmaker, store, chunk_size=3
+    )
+
+    assert num_rows == {"stock_prices": 4, "currency_rates": 4}
+
+    rates_df = store.read_currency_rates("EUR", "GBP", DATES[0], DATES[-1])
+
+    assert list(rates_df.index) == DATES
+    assert list(rates_df["rate"]) == [0.75, 0.75]
+
+
+def test_reads_from_store(cached_db_sessionmaker, store):
+    columnar_store.export_from_database(cached_db_sessionmaker, store)
+
+    # The database no longer has the rows, so they must come from the store
+    with cached_db_sessionmaker.begin() as session:
+        session.execute(sa.delete(StockPrice))
+
+    stock_prices_df = stock._read_stock_prices_as_dataframe(
+        cached_db_sessionmaker, ["AAPL"], DATES[0], DATES[-1]
+    )
+
+    assert list(stock_prices_df["close_price"]) == [10.0, 11.0]
+
+    stock_prices_df = conversion._query_converted_stock_prices_as_dataframe(
+        cached_db_sessionmaker, ["AAPL", "MSFT"], DATES[0], DATES[-1], "GBP"
+    )
+
+    assert list(stock_prices_df.index) == DATES + DATES
+    assert list(stock_prices_df["symbol"]) == ["AAPL", "AAPL", "MSFT", "MSFT"]
+    assert list(stock_prices_df["currency"]) == ["GBP"] * 4
+    assert list(stock_prices_df["close_price"]) == pytest.approx([6.0, 6.6, 12.0, 12.6])
+
+    stock_prices_df = conversion.query_converted_stock_prices(
+        cached_db_sessionmaker, ["MSFT"], DATES[0], DATES[-1], ["GBP", "USD"], "wide"
+    )
+
+    assert list(stock_prices_df["close_price_GBP"]) == pytest.approx([12.0, 12.6])
+    assert list(stock_prices_df["close_price_USD"]) == [20.0, 21.0]
+
+
+def _write_rates(root, dates, barrier):
+    # Writes every rate separately, to another instance of the store
+    store = columnar_store.ColumnarStore(root)
+    barrier.wait()
+
+    for date in dates:
+        store.write_currency_rates(
+            [
+                {
+                    "date": date,
+                    "base_currency": "EUR",
+                    "target_currency": "USD",
+                    "rate": 1.2,
+                }
+            ]
+        )
+
+
+@pytest.mark.parametrize("concurrency", ["threads", "processes"])
+def test_concurrent_writes_keep_all_rows(store, concurrency):
+    dates = [
+        datetime.date(2021, 1, 1) + datetime.timedelta(days=day) for day in range(40)
+    ]
+
+    if concurrency == "threads":
+        barrier = threading.Barrier(2)
+        worker_class = threading.Thread
+    else:
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(2)
+        worker_class = context.Process
+
+    workers = [
+        worker_class(target=_write_rates, args=(store.root, dates[index::2], barrier))
+        for index in range(2)
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    currency_rates_df = store.read_currency_rates("EUR", "USD", dates[0], dates[-1])
+
+    assert list(currency_rates_df.index) == dates
@@ -0,0 +1,71 @@
+import datetime
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from market_data_loader import database, models, scheduler
+from market_data_loader.models import CurrencyRate, StockPrice
+
+# Dates of the prices and rates in the database of 'cached_db_sessionmaker'
+CACHED_DATES = [datetime.date(2021, 4, 8), datetime.date(2021, 4, 9)]
+
+
+@pytest.fixture(autouse=True)
+def unlimited_scheduler():
+    # Every test starts with fresh usage counters and without rate limits, so
+    # that the mocked providers answer right away
+    scheduler.configure(
+        settings=dict(
+            scheduler.DEFAULT_SETTINGS, marketstack_rate=0, exchangeratesapi_rate=0
+        )
+    )
+
+
+@pytest.fixture
+def db_sessionmaker():
+    engine = sa.create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=sa.pool.StaticPool,
+    )
+    models.Base.metadata.create_all(engine)
+
+    yield orm.sessionmaker(bind=engine, expire_on_commit=False)
+
+    engine.dispose()
+
+
+@pytest.fixture
+def cached_db_sessionmaker(db_sessionmaker):
+    with db_sessionmaker.begin() as session:
+        database.insert_or_ignore(
+            session,
+            StockPrice.__table__,
+            [
+                {
+                    "date": date,
+                    "symbol": symbol,
+                    "close_price": close_price + index,
+                    "exchange": "XNAS",
+                }
+                for symbol, close_price in [("AAPL", 10.0), ("MSFT", 20.0)]
+                for index, date in enumerate(CACHED_DATES)
+            ],
+        )
+        database.insert_or_ignore(
+            session,
+            CurrencyRate.__table__,
+            [
+                {
+                    "date": date,
+                    "base_currency": "EUR",
+                    "target_currency": target_currency,
+                    "rate": rate,
+                }
+                for date in CACHED_DATES
+                for target_currency, rate in [("USD", 1.25), ("GBP", 0.75)]
+            ],
+        )
+
+    return db_sessionmaker
@@ -0,0 +1,166 @@
+import datetime
+import json
+
+import pandas as pd
+import pytest
+
+from market_data_loader import conversion, frame_cache
+from market_data_loader.models import CurrencyRate
+
+# The dates of the 'cached_db_sessionmaker' fixture
+DATES = [datetime.date(2021, 4, 8), datetime.date(2021, 4, 9)]
+
+
+def test_converted_stock_prices(requests_mock, cached_db_sessionmaker):
+    stock_prices_df = conversion.get_converted_stock_prices(
+        cached_db_sessionmaker, ["AAPL", "MSFT"], DATES[0], DATES[-1], "GBP"
+    )
+
+    assert requests_mock.call_count == 0
+    assert list(stock_prices_df.index) == DATES + DATES
+    assert list(stock_prices_df["symbol"]) == ["AAPL", "AAPL", "MSFT", "MSFT"]
+    assert list(stock_prices_df["currency"]) == ["GBP"] * 4
+    assert list(stock_prices_df["close_price"]) == pytest.approx([6.0, 6.6, 12.0, 12.6])
+
+
+def test_converted_stock_prices_served_from_frame_cache(
+    requests_mock, cached_db_sessionmaker
+):
+    frame_cache.CACHE.clear()
+
+    # A cold read is converted in SQL and doesn't fill the cache
+    stock_prices_df = conversion.get_converted_stock_prices(
+        cached_db_sessionmaker, ["AAPL", "MSFT"], DATES[0], DATES[-1], "GBP"
+    )
+
+    assert frame_cache.CACHE.stats()["entries"] == 0
+
+    warm_stock_prices_df = conversion.get_converted_stock_prices(
+        cached_db_sessionmaker,
+        ["AAPL", "MSFT"],
+        DATES[0],
+        DATES[-1],
+        "GBP",
+        warm_cache=True,
+    )
+
+    # The frames of both symbols and both currency legs are cached
+    stats = frame_cache.CACHE.stats()
+    assert stats["entries"] == 4
+
+    cached_stock_prices_df = conversion.get_converted_stock_prices(
+        cached_db_sessionmaker, ["AAPL", "MSFT"], DATES[0], DATES[-1], "GBP"
+    )
+
+    assert frame_cache.CACHE.stats()["hits"] == stats["hits"] + 4
+    pd.testing.assert_frame_equal(cached_stock_prices_df, warm_stock_prices_df)
+    pd.testing.assert_frame_equal(
+        cached_stock_prices_df[stock_prices_df.columns], stock_prices_df
+    )
+
+
+def test_same_currency_not_converted(requests_mock, cached_db_sessionmaker):
+    stock_prices_df = conversion.get_converted_stock_prices(
+        cached_db_sessionmaker, ["AAPL"], DATES[0], DATES[-1], "USD"
+    )
+
+    assert list(stock_prices_df["close_price"]) == [10.0, 11.0]
+    assert list(stock_prices_df["rate"]) == [1.0, 1.0]
+
+
+def test_multiple_currencies_long_layout(requests_mock, cached_db_sessionmaker):
+    stock_prices_df = conversion.query_converted_stock_prices(
+        cached_db_sessionmaker, ["AAPL"], DATES[0], DATES[-1], ["GBP", "USD", "EUR"]
+    )
+
+    assert list(stock_prices_df.index) == [DATES[0]] * 3 + [DATES[1]] * 3
+    assert list(stock_prices_df["currency"]) == ["GBP", "USD", "EUR"] * 2
+    assert list(stock_prices_df["rate"]) == pytest.approx([0.6, 1.0, 0.8] * 2)
+    assert list(stock_prices_df["close_price"]) == pytest.approx(
+        [6.0, 10.0, 8.0, 6.6, 11.0, 8.8]
+    )
+
+
+def test_multiple_currencies_wide_layout(requests_mock, cached_db_sessionmaker):
+    stock_prices_df = conversion.query_converted_stock_prices(
+        cached_db_sessionmaker,
+        ["AAPL", "MSFT"],
+        DATES[0],
+        DATES[-1],
+        ["GBP", "USD"],
+        layout="wide",
+    )
+
+    assert list(stock_prices_df.columns) == [
+        "symbol",
+        "exchange",
+        "close_price_GBP",
+        "close_price_USD",
+    ]
+    assert list(stock_prices_df["symbol"]) == ["AAPL", "AAPL", "MSFT", "MSFT"]
+    assert list(stock_prices_df["close_price_GBP"]) == pytest.approx(
+        [6.0, 6.6, 12.0, 12.6]
+    )
+    assert list(stock_prices_df["close_price_USD"]) == [10.0, 11.0, 20.0, 21.0]
+
+
+def test_missing_rates_of_all_currencies_fetched_together(
+    requests_mock, cached_db_sessionmaker
+):
+    with cached_db_sessionmaker.begin() as session:
+        session.query(CurrencyRate).delete()
+
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/symbols",
+        text=json.dumps({"symbols": {"USD": "", "GBP": "", "JPY": ""}}),
+    )
+    rate_requests = [
+        requests_mock.get(
+            f"http://api.exchangeratesapi.io/v1/{date}",
+            text=json.dumps(
+                {
+                    "date": str(date),
+                    "base": "EUR",
+                    "rates": {"USD": 1.25, "GBP": 0.75, "JPY": 125.0},
+                }
+            ),
+        )
+        for date in DATES
+    ]
+
+    conversion.fill_missing_currency_rates(
+        cached_db_sessionmaker, ["AAPL"], DATES[0], DATES[-1], ["GBP", "JPY"]
+    )
+
+    for rate_request in rate_requests:
+        assert rate_request.call_count == 1
+        assert rate_request.last_request.qs["symbols"] == ["usd,gbp,jpy"]
+
+    stock_prices_df = conversion.query_converted_stock_prices(
+        cached_db_sessionmaker, ["AAPL"], DATES[0], DATES[-1], ["GBP", "JPY"], "wide"
+    )
+
+    assert list(stock_prices_df["close_price_JPY"]) == pytest.approx([1000.0, 1100.0])
+
+
+def test_converted_stock_prices_streamed_in_chunks(
+    requests_mock, cached_db_sessionmaker
+):
+    chunks = list(
+        conversion.iter_converted_stock_prices(
+            cached_db_sessionmaker,
+            ["AAPL", "MSFT"],
+            DATES[0],
+            DATES[-1],
+            ["GBP", "USD"],
+            chunk_size=3,
+        )
+    )
+
+    assert [len(chunk) for chunk in chunks] == [6, 2]
+
+    stock_prices_df = conversion.query_converted_stock_prices(
+        cached_db_sessionmaker, ["AAPL", "MSFT"], DATES[0], DATES[-1], ["GBP", "USD"]
+    )
+
+    assert pd.concat(chunks).equals(stock_prices_df)
@@ -0,0 +1,100 @@
+import datetime
+
+from market_data_loader import coverage
+from market_data_loader.models import StockPriceCoverage
+
+TABLE = StockPriceCoverage.__table__
+
+
+def _intervals(session):
+    return [
+        (row.symbol, row.start_date, row.end_date)
+        for row in session.query(StockPriceCoverage).order_by(
+            StockPriceCoverage.symbol, StockPriceCoverage.start_date
+        )
+    ]
+
+
+def test_add_interval_merges(db_sessionmaker):
+    with db_sessionmaker.begin() as session:
+        coverage.add_interval(
+            session,
+            TABLE,
+            datetime.date(2021, 4, 1),
+            datetime.date(2021, 4, 5),
+            symbol="AAPL",
+        )
+        coverage.add_interval(
+            session,
+            TABLE,
+            datetime.date(2021, 4, 10),
+            datetime.date(2021, 4, 12),
+            symbol="AAPL",
+        )
+        coverage.add_interval(
+            session,
+            TABLE,
+            datetime.date(2021, 4, 1),
+            datetime.date(2021, 4, 30),
+            symbol="MSFT",
+        )
+
+        assert _intervals(session) == [
+            ("AAPL", datetime.date(2021, 4, 1), datetime.date(2021, 4, 5)),
+            ("AAPL", datetime.date(2021, 4, 10), datetime.date(2021, 4, 12)),
+            ("MSFT", datetime.date(2021, 4, 1), datetime.date(2021, 4, 30)),
+        ]
+
+        # Adjacent to the first and overlapping the second interval
+        coverage.add_interval(
+            session,
+            TABLE,
+            datetime.date(2021, 4, 6),
+            datetime.date(2021, 4, 11),
+            symbol="AAPL",
+        )
+
+        assert _intervals(session) == [
+            ("AAPL", datetime.date(2021, 4, 1), datetime.date(2021, 4, 12)),
+            ("MSFT", datetime.date(2021, 4, 1), datetime.date(2021, 4, 30)),
+        ]
+
+
+def test_query_covered_keys(db_sessionmaker):
+    with db_sessionmaker.begin() as session:
+        coverage.add_interval(
+            session,
+            TABLE,
+            datetime.date(2021, 4, 1),
+            datetime.date(2021, 4, 12),
+            symbol="AAPL",
+        )
+        coverage.add_interval(
+            session,
+            TABLE,
+            datetime.date(2021, 4, 5),
+            datetime.date(2021, 4, 30),
+            symbol="MSFT",
+        )
+
+        covered_symbols = coverage.query_covered_keys(
+            session,
+            TABLE,
+            "symbol",
+            ["AAPL", "MSFT", "GOOG"],
+            datetime.date(2021, 4, 5),
+            datetime.date(2021, 4, 9),
+        )
+
+        assert covered_symbols == {"AAPL", "MSFT"}
+
+        covered_symbols = coverage.query_covered_keys(
+            session,
+            TABLE,
+            "symbol",
+            ["AAPL", "MSFT", "GOOG"],
+            datetime.date(2021, 4, 1),
+            datetime.date(2021, 4, 9),
+        )
+
+        assert covered_symbols == {"AAPL"}
@@ -0,0 +1,140 @@
+import datetime
+import json
+
+from market_data_loader import currency
+from market_data_loader.models import CurrencyRate, CurrencyRateCoverage
+
+
+def _rates(usd, gbp):
+    return {"USD": usd, "GBP": gbp}
+
+
+def _currency_rate_response(date):
+    return json.dumps({"date": date, "base": "EUR", "rates": _rates(1.2, 0.8)})
+
+
+def _timeseries_response(start_date, end_date):
+    dates = [
+        (start_date + datetime.timedelta(days=day)).strftime("%Y-%m-%d")
+        for day in range((end_date - start_date).days + 1)
+    ]
+
+    return json.dumps(
+        {"base": "EUR", "rates": {date: _rates(1.2, 0.8) for date in dates}}
+    )
+
+
+def test_few_missing_dates_fetched_per_date(requests_mock, db_sessionmaker):
+    dates = [datetime.date(2021, 4, 5), datetime.date(2021, 4, 6)]
+
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/symbols",
+        text=json.dumps({"symbols": {"USD": "", "GBP": ""}}),
+    )
+    rate_5 = requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/2021-04-05",
+        text=_currency_rate_response("2021-04-05"),
+    )
+    rate_6 = requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/2021-04-06",
+        text=_currency_rate_response("2021-04-06"),
+    )
+
+    currency_rates_df = currency.get_currency_rates(
+        db_sessionmaker, dates, "USD", "GBP"
+    )
+
+    assert rate_5.call_count == 1
+    assert rate_6.call_count == 1
+    assert list(currency_rates_df["rate"]) == [0.8 / 1.2, 0.8 / 1.2]
+
+
+def test_many_missing_dates_fetched_as_range(requests_mock, db_sessionmaker):
+    start_date = datetime.date(2021, 4, 5)
+    end_date = datetime.date(2021, 4, 16)
+    dates = [
+        start_date + datetime.timedelta(days=day)
+        for day in range((end_date - start_date).days + 1)
+        if (start_date + datetime.timedelta(days=day)).weekday() < 5
+    ]
+
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/symbols",
+        text=json.dumps({"symbols": {"USD": "", "GBP": ""}}),
+    )
+    timeseries = requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/timeseries",
+        text=_timeseries_response(start_date, end_date),
+    )
+
+    currency_rates_df = currency.get_currency_rates(
+        db_sessionmaker, dates, "USD", "GBP"
+    )
+
+    assert timeseries.call_count == 1
+    assert timeseries.last_request.qs["symbols"] == ["usd,gbp"]
+    assert len(currency_rates_df.loc[dates]) == len(dates)
+
+    with db_sessionmaker.begin() as session:
+        num_rates = session.query(CurrencyRate).count()
+
+    # Weekend rates from the range are cached as well
+    assert num_rates == 2 * 12
+
+    # The range is covered, so it's not looked up again
+    currency.get_currency_rates(db_sessionmaker, dates, "USD", "GBP")
+
+    assert timeseries.call_count == 1
+
+    with db_sessionmaker.begin() as session:
+        intervals = session.query(
+            CurrencyRateCoverage.target_currency,
+            CurrencyRateCoverage.start_date,
+            CurrencyRateCoverage.end_date,
+        ).all()
+
+    assert sorted(intervals) == [
+        ("GBP", start_date, end_date),
+        ("USD", start_date, end_date),
+    ]
+
+
+def test_range_extended_across_weekend_is_covered(requests_mock, db_sessionmaker):
+    def timeseries_response(request, context):
+        return _timeseries_response(
+            datetime.date.fromisoformat(request.qs["start_date"][0]),
+            datetime.date.fromisoformat(request.qs["end_date"][0]),
+        )
+
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/symbols",
+        text=json.dumps({"symbols": {"USD": "", "GBP": ""}}),
+    )
+    timeseries = requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/timeseries", text=timeseries_response
+    )
+    start_date = datetime.date(2021, 3, 1)
+
+    # Stock dates end on a Friday, and the later range skips Good Friday
+    for end_date in [datetime.date(2021, 3, 26), datetime.date(2021, 4, 9)]:
+        dates = [
+            date
+            for date in currency._business_days(start_date, end_date)
+            if date != datetime.date(2021, 4, 2)
+        ]
+
+        currency._fill_missing_dates(db_sessionmaker, dates, "USD", "GBP")
+
+    assert timeseries.call_count == 2
+
+    with db_sessionmaker.begin() as session:
+        intervals = session.query(
+            CurrencyRateCoverage.target_currency,
+            CurrencyRateCoverage.start_date,
+            CurrencyRateCoverage.end_date,
+        ).all()
+
+    assert sorted(intervals) == [
+        ("GBP", start_date, datetime.date(2021, 4, 9)),
+        ("USD", start_date, datetime.date(2021, 4, 9)),
+    ]
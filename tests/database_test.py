@@ -0,0 +1,191 @@
+import concurrent.futures
+import datetime
+
+import pytest
+
+from market_data_loader import coverage, database, models
+from market_data_loader.models import StockPrice, StockPriceCoverage
+
+NUM_WRITERS = 4
+NUM_PAGES = 10
+PAGE_SIZE = 50
+START_DATE = datetime.date(2021, 1, 1)
+
+
+def test_insert_or_ignore(db_sessionmaker):
+    date = datetime.date(2021, 4, 9)
+
+    rows = [
+        {"date": date, "symbol": "AAPL", "close_price": 10.1, "exchange": "XNAS"},
+        {"date": date, "symbol": "MSFT", "close_price": 20.2, "exchange": "XNAS"},
+    ]
+
+    with db_sessionmaker.begin() as session:
+        database.insert_or_ignore(session, StockPrice.__table__, rows[:1])
+
+    # The conflicting row is skipped instead of failing the whole statement
+    with db_sessionmaker.begin() as session:
+        database.insert_or_ignore(
+            session,
+            StockPrice.__table__,
+            [dict(rows[0], close_price=99.9), rows[1]],
+        )
+
+    with db_sessionmaker.begin() as session:
+        stock_prices = session.query(StockPrice).order_by(StockPrice.symbol).all()
+
+    assert [(row.symbol, row.close_price, row.currency) for row in stock_prices] == [
+        ("AAPL", 10.1, "USD"),
+        ("MSFT", 20.2, "USD"),
+    ]
+
+
+def test_load_settings(tmp_path, monkeypatch):
+    config_path = tmp_path / "market_data_loader.ini"
+    config_path.write_text("[database]\nuri = sqlite:///test.db\nbusy_timeout = 100\n")
+
+    monkeypatch.setenv(database.CONFIG_PATH_ENV, str(config_path))
+    monkeypatch.setenv("MARKET_DATA_LOADER_DATABASE_BUSY_TIMEOUT", "200")
+
+    settings = database.load_settings()
+
+    assert settings["uri"] == "sqlite:///test.db"
+    # The environment overrides the config file
+    assert settings["busy_timeout"] == 200
+    assert settings["pool_size"] == database.DEFAULT_SETTINGS["pool_size"]
+
+
+def test_load_settings_unknown_setting(tmp_path):
+    config_path = tmp_path / "market_data_loader.ini"
+    config_path.write_text("[database]\npool_sise = 10\n")
+
+    with pytest.raises(ValueError):
+        database.load_settings(str(config_path))
+
+
+def test_tuned_sqlite(tmp_path):
+    engine = database.create_engine(_settings(tmp_path))
+
+    with engine.connect() as connection:
+        pragmas = {
+            pragma: connection.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            for pragma in ["journal_mode", "synchronous", "busy_timeout"]
+        }
+
+    engine.dispose()
+
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 30000}
+
+
+def test_readers_and_writer_dont_block_each_other(tmp_path):
+    # A lock held by another transaction fails right away
+    db_sessionmaker = database.create_sessionmaker(
+        dict(_settings(tmp_path), busy_timeout=0)
+    )
+    models.Base.metadata.create_all(db_sessionmaker.kw["bind"])
+
+    row = {
+        "date": START_DATE,
+        "symbol": "AAPL",
+        "close_price": 10.0,
+        "exchange": "XNAS",
+    }
+
+    with db_sessionmaker.begin() as reader:
+        assert reader.query(StockPrice).count() == 0
+
+        with db_sessionmaker.begin() as other_reader:
+            assert other_reader.query(StockPrice).count() == 0
+
+            with database.begin_write(db_sessionmaker) as writer:
+                database.insert_or_ignore(writer, StockPrice.__table__, [row])
+
+            # The readers keep their snapshots
+            assert other_reader.query(StockPrice).count() == 0
+
+        assert reader.query(StockPrice).count() == 0
+
+    with db_sessionmaker.begin() as reader:
+        assert reader.query(StockPrice).count() == 1
+
+    db_sessionmaker.kw["bind"].dispose()
+
+
+def test_concurrent_writer_processes(tmp_path):
+    settings = _settings(tmp_path)
+
+    engine = database.create_engine(settings)
+    models.Base.metadata.create_all(engine)
+    engine.dispose()
+
+    symbols = [f"SYM{index}" for index in range(NUM_WRITERS)]
+
+    # Every process merges coverage intervals, which reads before it writes
+    with concurrent.futures.ProcessPoolExecutor(NUM_WRITERS) as executor:
+        list(executor.map(_write_stock_prices, [settings] * NUM_WRITERS, symbols))
+
+    db_sessionmaker = database.create_sessionmaker(settings)
+
+    with db_sessionmaker.begin() as session:
+        num_rows = session.query(StockPrice).count()
+        intervals = session.query(
+            StockPriceCoverage.symbol,
+            StockPriceCoverage.start_date,
+            StockPriceCoverage.end_date,
+        ).all()
+
+    db_sessionmaker.kw["bind"].dispose()
+
+    assert num_rows == NUM_WRITERS * NUM_PAGES * PAGE_SIZE
+    assert sorted(intervals) == [
+        (symbol, START_DATE, START_DATE + datetime.timedelta(NUM_PAGES * PAGE_SIZE - 1))
+        for symbol in symbols
+    ]
+
+
+def _settings(tmp_path):
+    return dict(
+        database.DEFAULT_SETTINGS, uri=f"sqlite:///{tmp_path / 'market_data_loader.db'}"
+    )
+
+
+def _write_stock_prices(settings, symbol):
+    db_sessionmaker = database.create_sessionmaker(settings)
+
+    for page in range(NUM_PAGES):
+        dates = [
+            START_DATE + datetime.timedelta(page * PAGE_SIZE + index)
+            for index in range(PAGE_SIZE)
+        ]
+
+        with database.begin_write(db_sessionmaker) as session:
+            coverage.query_covered_keys(
+                session,
+                StockPriceCoverage.__table__,
+                "symbol",
+                [symbol],
+                dates[0],
+                dates[-1],
+            )
+            database.insert_or_ignore(
+                session,
+                StockPrice.__table__,
+                [
+                    {
+                        "date": date,
+                        "symbol": symbol,
+                        "close_price": 10.0,
+                        "exchange": "XNAS",
+                    }
+                    for date in dates
+                ],
+            )
+            coverage.add_interval(
+                session,
+                StockPriceCoverage.__table__,
+                dates[0],
+                dates[-1],
+                symbol=symbol,
+            )
+
+    db_sessionmaker.kw["bind"].dispose()
@@ -0,0 +1,99 @@
+import datetime
+
+import pandas as pd
+
+from market_data_loader import frame_cache
+from market_data_loader.frame_cache import FrameCache
+
+DATES = [datetime.date(2021, 4, day) for day in range(5, 10)]
+
+
+def _frame(close_price=10.0):
+    return pd.DataFrame(
+        {"date": DATES, "close_price": [close_price + i for i in range(len(DATES))]}
+    ).set_index("date")
+
+
+def test_sub_range_hit():
+    cache = FrameCache()
+    cache.put("AAPL", DATES[0], DATES[-1], _frame())
+
+    df = cache.get("AAPL", DATES[1], DATES[2])
+
+    assert list(df.index) == DATES[1:3]
+    assert list(df["close_price"]) == [11.0, 12.0]
+    assert cache.get("AAPL", DATES[0], datetime.date(2021, 4, 12)) is None
+    assert cache.get("MSFT", DATES[1], DATES[2]) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_contains_is_not_counted():
+    cache = FrameCache()
+    cache.put("AAPL", DATES[0], DATES[-1], _frame())
+
+    assert cache.contains("AAPL", DATES[1], DATES[2])
+    assert not cache.contains("AAPL", DATES[0], datetime.date(2021, 4, 12))
+    assert not cache.contains("MSFT", DATES[1], DATES[2])
+    assert (cache.hits, cache.misses) == (0, 0)
+
+def test_returned_frames_are_copies():
+    cache = FrameCache()
+    df = _frame()
+    cache.put("AAPL", DATES[0], DATES[-1], df)
+
+    df["close_price"] = 0.0
+    cache.get("AAPL", DATES[0], DATES[-1])["close_price"] = 0.0
+
+    assert list(cache.get("AAPL", DATES[0], DATES[-1])["close_price"]) == [
+        10.0,
+        11.0,
+        12.0,
+        13.0,
+        14.0,
+    ]
+
+
+def test_lru_eviction():
+    num_bytes = int(_frame().memory_usage(index=True, deep=True).sum())
+    cache = FrameCache(max_bytes=2 * num_bytes)
+
+    cache.put("AAPL", DATES[0], DATES[-1], _frame())
+    cache.put("MSFT", DATES[0], DATES[-1], _frame())
+    # Mark AAPL as recently used
+    cache.get("AAPL", DATES[0], DATES[-1])
+    cache.put("GOOG", DATES[0], DATES[-1], _frame())
+
+    assert cache.get("MSFT", DATES[0], DATES[-1]) is None
+    assert cache.get("AAPL", DATES[0], DATES[-1]) is not None
+    assert cache.get("GOOG", DATES[0], DATES[-1]) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 2 * num_bytes
+
+    cache.resize(num_bytes)
+
+    assert cache.stats()["entries"] == 1
+
+
+def test_invalidate():
+    cache = FrameCache()
+    cache.put("AAPL", DATES[0], DATES[1], _frame())
+    cache.put("AAPL", DATES[2], DATES[4], _frame())
+    cache.put("MSFT", DATES[0], DATES[4], _frame())
+
+    cache.invalidate("AAPL")
+
+    assert cache.get("AAPL", DATES[0], DATES[1]) is None
+    assert cache.get("AAPL", DATES[3], DATES[4]) is None
+    assert cache.get("MSFT", DATES[0], DATES[4]) is not None
+    assert cache.stats()["entries"] == 1
+
+
+def test_configure_from_environment(monkeypatch):
+    monkeypatch.setenv("MARKET_DATA_LOADER_FRAME_CACHE_MAX_BYTES", "1024")
+
+    try:
+        frame_cache.configure()
+
+        assert frame_cache.CACHE.max_bytes == 1024
+    finally:
+        frame_cache.CACHE.resize(frame_cache.MAX_BYTES)
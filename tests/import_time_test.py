@@ -0,0 +1,124 @@
+import datetime
+import os
+import subprocess
+import sys
+
+from market_data_loader import coverage, database, models
+from market_data_loader.models import (
+    CurrencyRate,
+    CurrencyRateCoverage,
+    StockPrice,
+    StockPriceCoverage,
+)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DATES = [datetime.date(2021, 4, 8), datetime.date(2021, 4, 9)]
+
+# Prints the heavy modules imported while running the given command
+SCRIPT = """
+import sys
+import load_data
+
+sys.argv = ["load_data.py"] + sys.argv[1:]
+
+try:
+    load_data.main()
+except SystemExit:
+    pass
+
+print([name for name in ("pandas", "numpy", "requests") if name in sys.modules])
+"""
+
+
+def _run(args, db_uri):
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT] + args,
+        capture_output=True,
+        text=True,
+        cwd=ROOT_DIR,
+        env=dict(os.environ, MARKET_DATA_LOADER_DATABASE_URI=db_uri),
+        check=True,
+    )
+
+    return result.stdout.splitlines()
+
+
+def test_help_is_lightweight(tmp_path):
+    lines = _run(["--help"], f"sqlite:///{tmp_path / 'test.db'}")
+
+    assert lines[-1] == "[]"
+
+
+def test_cached_query_is_lightweight(tmp_path):
+    db_uri = f"sqlite:///{tmp_path / 'test.db'}"
+    db_sessionmaker = database.create_sessionmaker(
+        dict(database.DEFAULT_SETTINGS, uri=db_uri)
+    )
+    models.Base.metadata.create_all(db_sessionmaker.kw["bind"])
+
+    with db_sessionmaker.begin() as session:
+        database.insert_or_ignore(
+            session,
+            StockPrice.__table__,
+            [
+                {
+                    "date": date,
+                    "symbol": "AAPL",
+                    "close_price": 10.0,
+                    "exchange": "XNAS",
+                }
+                for date in DATES
+            ],
+        )
+        database.insert_or_ignore(
+            session,
+            CurrencyRate.__table__,
+            [
+                {
+                    "date": date,
+                    "base_currency": "EUR",
+                    "target_currency": target_currency,
+                    "rate": rate,
+                }
+                for date in DATES
+                for target_currency, rate in [("USD", 1.25), ("GBP", 0.75)]
+            ],
+        )
+        coverage.add_interval(
+            session, StockPriceCoverage.__table__, DATES[0], DATES[-1], symbol="AAPL"
+        )
+
+        for target_currency in ["USD", "GBP"]:
+            coverage.add_interval(
+                session,
+                CurrencyRateCoverage.__table__,
+                DATES[0],
+                DATES[-1],
+                base_currency="EUR",
+                target_currency=target_currency,
+            )
+
+    db_sessionmaker.kw["bind"].dispose()
+
+    lines = _run(
+        [
+            "--symbol",
+            "AAPL",
+            "--currency",
+            "GBP",
+            "--start-date",
+            str(DATES[0]),
+            "--end-date",
+            str(DATES[-1]),
+        ],
+        db_uri,
+    )
+
+    # Log messages are printed before the prices
+    assert lines[-4:] == [
+        "date        symbol  currency  close_price",
+        "2021-04-08    AAPL       GBP     6.000000",
+        "2021-04-09    AAPL       GBP     6.000000",
+        "[]",
+    ]
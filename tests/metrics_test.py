@@ -0,0 +1,123 @@
+import datetime
+import json
+
+import pytest
+
+from market_data_loader import frame_cache, metrics, stock
+from market_data_loader.clients import http_client
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable()
+
+    yield
+
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_metrics_are_not_collected():
+    metrics.reset()
+
+    metrics.increment("rows_inserted_total", 10, table="stock_prices")
+
+    with metrics.stage("stock.read_sql"):
+        pass
+
+    summary = metrics.summary()
+
+    assert summary["counters"] == []
+    assert summary["stages"] == {}
+
+
+def test_counters_and_stages(enabled_metrics):
+    metrics.increment("rows_inserted_total", 10, table="stock_prices")
+    metrics.increment("rows_inserted_total", 5, table="stock_prices")
+    metrics.increment("rows_inserted_total", 1, table="currency_rates")
+
+    @metrics.timed("stock.read_sql")
+    def read():
+        return 42
+
+    assert read() == 42
+    assert read() == 42
+
+    summary = metrics.summary()
+
+    assert summary["counters"] == [
+        {
+            "name": "rows_inserted_total",
+            "labels": {"table": "currency_rates"},
+            "value": 1,
+        },
+        {
+            "name": "rows_inserted_total",
+            "labels": {"table": "stock_prices"},
+            "value": 15,
+        },
+    ]
+    assert summary["stages"]["stock.read_sql"]["count"] == 2
+    assert summary["stages"]["stock.read_sql"]["wall_seconds"] >= 0
+
+
+def test_prometheus_text(enabled_metrics):
+    metrics.increment("http_requests_total", name="marketstack.eod", status=200)
+
+    with metrics.stage("load_data.query"):
+        pass
+
+    lines = metrics.prometheus_text().splitlines()
+
+    assert "# TYPE market_data_loader_http_requests_total counter" in lines
+    assert (
+        'market_data_loader_http_requests_total{name="marketstack.eod",status="200"} 1'
+        in lines
+    )
+    assert 'market_data_loader_stage_runs_total{stage="load_data.query"} 1' in lines
+    assert "# TYPE market_data_loader_frame_cache_hits_total counter" in lines
+
+
+def test_instrumented_fetch(requests_mock, db_sessionmaker, enabled_metrics, tmp_path):
+    http_client.reset_latency_stats()
+    frame_cache.CACHE.clear()
+
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        json={
+            "pagination": {"limit": 1000, "offset": 0, "count": 1, "total": 1},
+            "data": [
+                {
+                    "close": 10.1,
+                    "symbol": "AAPL",
+                    "exchange": "XNAS",
+                    "date": "2021-04-09T00:00:00+0000",
+                }
+            ],
+        },
+    )
+
+    date = datetime.date(2021, 4, 9)
+    stock.get_stock_prices(db_sessionmaker, "AAPL", date, date)
+
+    metrics_path = tmp_path / "metrics.json"
+    metrics.write_json(metrics_path)
+    summary = json.loads(metrics_path.read_text())
+
+    counters = {
+        (counter["name"], tuple(sorted(counter["labels"].items()))): counter["value"]
+        for counter in summary["counters"]
+    }
+
+    assert (
+        counters[
+            ("http_requests_total", (("name", "marketstack.eod"), ("status", 200)))
+        ]
+        == 1
+    )
+    assert counters[("pages_fetched_total", (("client", "marketstack"),))] == 1
+    assert counters[("rows_inserted_total", (("table", "stock_prices"),))] == 1
+    assert summary["stages"]["stock.fill_missing_dates"]["count"] == 1
+    assert summary["http_latency"]["marketstack.eod"]["count"] == 1
+    assert 0 <= summary["frame_cache"]["hit_ratio"] <= 1
@@ -0,0 +1,126 @@
+import datetime
+
+import sqlalchemy as sa
+
+from market_data_loader import database, migration, stock
+from market_data_loader.models import StockPrice, StockPriceCoverage
+
+DATES = [datetime.date(2021, 4, 5), datetime.date(2021, 4, 6)]
+
+
+def _create_legacy_schema(engine):
+    # The layout before the tables were clustered by their primary key
+    metadata = sa.MetaData()
+
+    stock_prices = sa.Table(
+        "stock_prices",
+        metadata,
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("symbol", sa.String(15), nullable=False),
+        sa.Column("close_price", sa.Float(), nullable=False),
+        sa.Column("exchange", sa.String(15), nullable=False),
+        sa.Column("currency", sa.String(3), default="USD", nullable=False),
+    )
+    sa.Index(
+        "stock_prices_date_symbol_index",
+        stock_prices.c.date,
+        stock_prices.c.symbol,
+        unique=True,
+    )
+
+    exchange_holidays = sa.Table(
+        "exchange_holidays",
+        metadata,
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("exchange", sa.String(15), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+    )
+    sa.Index(
+        "exchange_holidays_exchange_date_index",
+        exchange_holidays.c.exchange,
+        exchange_holidays.c.date,
+        unique=True,
+    )
+
+    metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            stock_prices.insert(),
+            [
+                {
+                    "date": date,
+                    "symbol": symbol,
+                    "close_price": close_price,
+                    "exchange": "XNAS",
+                    "currency": "USD",
+                }
+                for symbol, close_price in [("MSFT", 20.2), ("AAPL", 10.1)]
+                for date in DATES
+            ],
+        )
+        connection.execute(
+            exchange_holidays.insert(),
+            [{"exchange": "XNAS", "date": datetime.date(2021, 4, 2)}],
+        )
+
+
+def _table_sql(engine, table_name):
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (table_name,),
+        ).scalar()
+
+
+def test_migrate(tmp_path):
+    settings = dict(
+        database.DEFAULT_SETTINGS, uri=f"sqlite:///{tmp_path / 'market_data_loader.db'}"
+    )
+    db_sessionmaker = database.create_sessionmaker(settings)
+    engine = db_sessionmaker.kw["bind"]
+
+    _create_legacy_schema(engine)
+
+    assert migration.migrate(engine, chunk_size=3) == {
+        "stock_prices": 4,
+        "exchange_holidays": 1,
+    }
+
+    assert "WITHOUT ROWID" in _table_sql(engine, "stock_prices")
+    assert "WITHOUT ROWID" in _table_sql(engine, "exchange_holidays")
+    # Tables that didn't exist yet are created
+    assert sa.inspect(engine).has_table(StockPriceCoverage.__table__.name)
+
+    with engine.connect() as connection:
+        # Dates are stored as YYYYMMDD integers, and the old indexes are gone
+        assert connection.exec_driver_sql(
+            "SELECT DISTINCT typeof(date), min(date) FROM stock_prices"
+        ).all() == [("integer", 20210405)]
+        assert (
+            connection.exec_driver_sql(
+                "SELECT count(*) FROM sqlite_master WHERE tbl_name LIKE '%_migrated'"
+                " OR name = 'stock_prices_date_symbol_index'"
+            ).scalar()
+            == 0
+        )
+
+    with db_sessionmaker.begin() as session:
+        stock_prices = (
+            session.query(StockPrice.symbol, StockPrice.date, StockPrice.close_price)
+            .filter(StockPrice.symbol == "AAPL")
+            .filter(StockPrice.date >= DATES[0], StockPrice.date <= DATES[1])
+            .all()
+        )
+
+    assert stock_prices == [("AAPL", DATES[0], 10.1), ("AAPL", DATES[1], 10.1)]
+
+    # Up to date tables are skipped
+    assert migration.migrate(engine) == {}
+
+    assert list(stock._query_cached_dates(db_sessionmaker, ["MSFT"], *DATES)) == [
+        "MSFT"
+    ]
+
+    engine.dispose()
@@ -0,0 +1,64 @@
+import datetime
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from market_data_loader import output
+
+DATES = [datetime.date(2021, 4, 8), datetime.date(2021, 4, 9)]
+
+
+def _chunks():
+    return [
+        pd.DataFrame(
+            {"symbol": [symbol] * 2, "currency": "GBP", "close_price": [6.0, 6.6]},
+            index=pd.Index(DATES, name="date"),
+        )
+        for symbol in ["AAPL", "MSFT"]
+    ]
+
+
+def test_write_csv_chunks():
+    output_file = io.StringIO()
+
+    assert output.write_stock_price_chunks(_chunks(), "csv", output_file) == 4
+    assert output_file.getvalue().splitlines() == [
+        "date,symbol,currency,close_price",
+        "2021-04-08,AAPL,GBP,6.0",
+        "2021-04-09,AAPL,GBP,6.6",
+        "2021-04-08,MSFT,GBP,6.0",
+        "2021-04-09,MSFT,GBP,6.6",
+    ]
+
+
+def test_write_ndjson_chunks():
+    output_file = io.StringIO()
+
+    assert output.write_stock_price_chunks(_chunks(), "ndjson", output_file) == 4
+
+    records = [json.loads(line) for line in output_file.getvalue().splitlines()]
+
+    assert [record["symbol"] for record in records] == ["AAPL"] * 2 + ["MSFT"] * 2
+    assert records[0] == {
+        "date": "2021-04-08",
+        "symbol": "AAPL",
+        "currency": "GBP",
+        "close_price": 6.0,
+    }
+
+
+def test_write_parquet_chunks():
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    output_file = io.BytesIO()
+
+    assert output.write_stock_price_chunks(_chunks(), "parquet", output_file) == 4
+
+    output_file.seek(0)
+    parquet_file = pq.ParquetFile(output_file)
+
+    # Every chunk is a row group
+    assert parquet_file.num_row_groups == 2
+    assert parquet_file.read().to_pandas()["date"].tolist() == DATES * 2
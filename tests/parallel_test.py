@@ -0,0 +1,234 @@
+import datetime
+import concurrent.futures
+import multiprocessing
+import sys
+import threading
+
+import pytest
+
+from market_data_loader import (
+    database,
+    models,
+    parallel,
+    response_store,
+    scheduler,
+    stock,
+)
+from market_data_loader.models import (
+    ExcludedDate,
+    StockPrice,
+    StockPriceCoverage,
+    SymbolExchange,
+)
+from tests import provider_responses
+
+START_DATE = datetime.date(2021, 4, 5)
+END_DATE = datetime.date(2021, 4, 16)
+
+
+@pytest.fixture
+def file_db_sessionmaker(tmp_path):
+    settings = dict(
+        database.DEFAULT_SETTINGS, uri=f"sqlite:///{tmp_path / 'market_data_loader.db'}"
+    )
+    db_sessionmaker = database.create_sessionmaker(settings)
+    models.Base.metadata.create_all(db_sessionmaker.kw["bind"])
+
+    yield db_sessionmaker
+
+    db_sessionmaker.kw["bind"].dispose()
+
+
+def _exit_writer(settings, write_queue, result_queue):
+    # Stands in for a writer process that dies without taking any rows
+    sys.exit(1)
+
+
+def _rows(db_sessionmaker, model, *columns):
+    with db_sessionmaker.begin() as session:
+        return sorted(session.query(*(model.__table__.c[name] for name in columns)))
+
+
+def test_parallel_load(
+    requests_mock, db_sessionmaker, file_db_sessionmaker, tmp_path, monkeypatch
+):
+    # The worker processes don't see the mocked API, so they replay the
+    # responses recorded by a sequential load of one symbol per request
+    monkeypatch.setenv(response_store.RESPONSE_STORE_ENV, str(tmp_path / "responses"))
+
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod", text=provider_responses.eod_response
+    )
+
+    for symbol in ["AAPL", "MSFT"]:
+        stock._fill_missing_dates(db_sessionmaker, [symbol], START_DATE, END_DATE)
+
+    monkeypatch.setenv(response_store.REPLAY_ENV, "1")
+
+    # Prices that are already stored are kept
+    with file_db_sessionmaker.begin() as session:
+        database.insert_or_ignore(
+            session,
+            StockPrice.__table__,
+            [
+                {
+                    "date": datetime.date(2021, 4, 9),
+                    "symbol": "MSFT",
+                    "close_price": 99.0,
+                    "exchange": "XNAS",
+                }
+            ],
+        )
+
+    parallel.fill_missing_stock_prices(
+        file_db_sessionmaker, ["AAPL", "MSFT"], START_DATE, END_DATE, workers=2
+    )
+
+    columns = ["symbol", "date", "close_price"]
+    expected_rows = _rows(db_sessionmaker, StockPrice, *columns)
+    expected_rows[expected_rows.index(("MSFT", datetime.date(2021, 4, 9), 10.0))] = (
+        "MSFT",
+        datetime.date(2021, 4, 9),
+        99.0,
+    )
+
+    assert _rows(file_db_sessionmaker, StockPrice, *columns) == expected_rows
+    assert _rows(file_db_sessionmaker, SymbolExchange, "symbol", "exchange") == [
+        ("AAPL", "XNAS"),
+        ("MSFT", "XNAS"),
+    ]
+    assert _rows(file_db_sessionmaker, ExcludedDate, "symbol") == []
+    assert _rows(
+        file_db_sessionmaker, StockPriceCoverage, "symbol", "start_date", "end_date"
+    ) == [
+        ("AAPL", datetime.date(2021, 4, 3), END_DATE + datetime.timedelta(days=2)),
+        ("MSFT", datetime.date(2021, 4, 3), END_DATE + datetime.timedelta(days=2)),
+    ]
+
+
+def test_workers_stop_when_writer_dies(
+    requests_mock, db_sessionmaker, file_db_sessionmaker, tmp_path, monkeypatch
+):
+    monkeypatch.setenv(response_store.RESPONSE_STORE_ENV, str(tmp_path / "responses"))
+
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod", text=provider_responses.eod_response
+    )
+
+    stock._fill_missing_dates(db_sessionmaker, ["AAPL"], START_DATE, END_DATE)
+
+    monkeypatch.setenv(response_store.REPLAY_ENV, "1")
+
+    # The worker fills the queue and waits for space that never frees up
+    monkeypatch.setattr(parallel, "WRITE_QUEUE_SIZE", 1)
+    monkeypatch.setattr(parallel, "_write_rows", _exit_writer)
+
+    with pytest.raises(RuntimeError, match="writer process failed with exit code 1"):
+        parallel.fill_missing_stock_prices(
+            file_db_sessionmaker, ["AAPL"], START_DATE, END_DATE, workers=1
+        )
+
+
+def test_workers_exit_with_rows_buffered_for_dead_writer():
+    context = multiprocessing.get_context(parallel.START_METHOD)
+    write_queue = context.Queue(maxsize=parallel.WRITE_QUEUE_SIZE)
+    writer_failed = context.Event()
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=context,
+        initializer=parallel._init_worker,
+        initargs=(
+            database.DEFAULT_SETTINGS,
+            scheduler.process_settings(1),
+            False,
+            {},
+            "WARNING",
+            write_queue,
+            writer_failed,
+        ),
+    )
+
+    # The batch is larger than the pipe buffer, so it stays in the feeder
+    # thread of the worker, as nothing reads the queue
+    rows = [
+        {
+            "date": START_DATE + datetime.timedelta(days=index),
+            "symbol": "AAPL",
+            "close_price": float(index),
+            "exchange": "XNAS",
+        }
+        for index in range(5000)
+    ]
+    executor.submit(parallel._put_rows, StockPrice.__table__.name, rows).result()
+
+    writer_failed.set()
+
+    shutdown = threading.Thread(target=executor.shutdown, daemon=True)
+    shutdown.start()
+    shutdown.join(timeout=30)
+
+    assert not shutdown.is_alive()
+
+
+def test_writer_drains_queue_after_error(file_db_sessionmaker):
+    context = multiprocessing.get_context(parallel.START_METHOD)
+    write_queue = context.Queue()
+    result_queue = context.SimpleQueue()
+
+    row = {
+        "date": START_DATE,
+        "symbol": "AAPL",
+        "close_price": 10.0,
+        "exchange": "XNAS",
+    }
+
+    # The in-memory database of the writer doesn't have the tables
+    for _ in range(3):
+        write_queue.put((StockPrice.__table__.name, [row]))
+
+    write_queue.put(None)
+
+    parallel._write_rows(
+        dict(parallel._database_settings(file_db_sessionmaker), uri="sqlite://"),
+        write_queue,
+        result_queue,
+    )
+
+    assert "no such table" in result_queue.get()
+    assert write_queue.empty()
+
+
+def test_in_memory_database_is_rejected(db_sessionmaker):
+    with pytest.raises(RuntimeError, match="database file"):
+        parallel.fill_missing_stock_prices(
+            db_sessionmaker, ["AAPL"], START_DATE, END_DATE
+        )
+
+
+def test_split_requests():
+    symbols = [f"SYM{index}" for index in range(5)]
+
+    assert parallel._split_requests(
+        [(symbols, START_DATE, END_DATE), (["AAPL"], START_DATE, START_DATE)], 3
+    ) == [
+        (symbols[:2], START_DATE, END_DATE),
+        (symbols[2:4], START_DATE, END_DATE),
+        (symbols[4:], START_DATE, END_DATE),
+        (["AAPL"], START_DATE, START_DATE),
+    ]
+
+
+def test_process_settings():
+    scheduler.configure(
+        settings=dict(
+            scheduler.DEFAULT_SETTINGS, marketstack_rate=6.0, marketstack_burst=4
+        )
+    )
+
+    settings = scheduler.process_settings(4)
+
+    assert settings["marketstack_rate"] == 1.5
+    assert settings["marketstack_burst"] == 1
+    assert settings["exchangeratesapi_rate"] == 1.25
+    assert settings["marketstack_monthly_quota"] == 0
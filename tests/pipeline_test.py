@@ -0,0 +1,74 @@
+import datetime
+import json
+
+import pytest
+
+from market_data_loader import pipeline
+from market_data_loader.models import CurrencyRate, StockPrice
+
+
+def _eod_response(offset, total, rows):
+    return json.dumps(
+        {
+            "pagination": {
+                "limit": 2,
+                "offset": offset,
+                "count": len(rows),
+                "total": total,
+            },
+            "data": [
+                {
+                    "close": close,
+                    "symbol": "AAPL",
+                    "exchange": "XNAS",
+                    "date": f"{date}T00:00:00+0000",
+                }
+                for date, close in rows
+            ],
+        }
+    )
+
+
+EOD_PAGES = {
+    0: _eod_response(0, 4, [("2021-04-05", 10.0), ("2021-04-06", 11.0)]),
+    2: _eod_response(2, 4, [("2021-04-07", 12.0), ("2021-04-08", 13.0)]),
+}
+
+
+def _currency_rate_response(request, context):
+    return json.dumps(
+        {
+            "date": request.path.rsplit("/", 1)[1],
+            "base": "EUR",
+            "rates": {"USD": 1.25, "GBP": 0.75},
+        }
+    )
+
+
+def test_load_stock_prices(requests_mock, db_sessionmaker):
+    start_date = datetime.date(2021, 4, 5)
+    end_date = datetime.date(2021, 4, 8)
+
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        text=lambda request, context: EOD_PAGES[int(request.qs["offset"][0])],
+    )
+    currency_rates = [
+        requests_mock.get(
+            f"http://api.exchangeratesapi.io/v1/2021-04-0{day}",
+            text=_currency_rate_response,
+        )
+        for day in (5, 6, 7, 8)
+    ]
+
+    stock_prices_df = pipeline.load_stock_prices(
+        db_sessionmaker, ["AAPL"], start_date, end_date, "GBP", concurrency=2
+    )
+
+    assert [currency_rate.call_count for currency_rate in currency_rates] == [1] * 4
+    assert list(stock_prices_df["currency"]) == ["GBP"] * 4
+    assert list(stock_prices_df["close_price"]) == pytest.approx([6.0, 6.6, 7.2, 7.8])
+
+    with db_sessionmaker.begin() as session:
+        assert session.query(StockPrice).count() == 4
+        assert session.query(CurrencyRate).count() == 8
@@ -0,0 +1,85 @@
+import datetime
+
+from market_data_loader import planner, scheduler
+
+
+def test_coalesce_dates():
+    dates = {
+        datetime.date(2021, 4, 8),
+        datetime.date(2021, 4, 9),
+        # Weekend in between
+        datetime.date(2021, 4, 12),
+        datetime.date(2021, 4, 14),
+    }
+
+    assert planner.coalesce_dates(dates) == [
+        (datetime.date(2021, 4, 8), datetime.date(2021, 4, 12)),
+        (datetime.date(2021, 4, 14), datetime.date(2021, 4, 14)),
+    ]
+
+
+def test_distant_gaps_fetched_separately():
+    missing_dates_by_symbol = {
+        "AAPL": {datetime.date(2015, 3, 4), datetime.date(2021, 4, 9)},
+    }
+
+    assert planner.plan_requests(missing_dates_by_symbol) == [
+        (["AAPL"], datetime.date(2015, 3, 4), datetime.date(2015, 3, 4)),
+        (["AAPL"], datetime.date(2021, 4, 9), datetime.date(2021, 4, 9)),
+    ]
+
+
+def test_close_gaps_fetched_together():
+    missing_dates_by_symbol = {
+        "AAPL": {datetime.date(2021, 1, 4), datetime.date(2021, 4, 9)},
+    }
+
+    assert planner.plan_requests(missing_dates_by_symbol) == [
+        (["AAPL"], datetime.date(2021, 1, 4), datetime.date(2021, 4, 9)),
+    ]
+
+
+def test_symbols_share_requests():
+    missing_dates_by_symbol = {
+        "AAPL": {datetime.date(2021, 4, 5), datetime.date(2021, 4, 9)},
+        "MSFT": {datetime.date(2021, 4, 8), datetime.date(2021, 4, 12)},
+        "GOOG": {datetime.date(2015, 5, 4)},
+    }
+
+    assert planner.plan_requests(missing_dates_by_symbol) == [
+        (["GOOG"], datetime.date(2015, 5, 4), datetime.date(2015, 5, 4)),
+        (["AAPL", "MSFT"], datetime.date(2021, 4, 5), datetime.date(2021, 4, 12)),
+    ]
+
+
+def test_page_size_limits_sharing():
+    # Sharing a request would need more pages than fetching separately
+    missing_dates_by_symbol = {
+        "AAPL": {datetime.date(2021, 4, 5), datetime.date(2021, 4, 6)},
+        "MSFT": {datetime.date(2021, 4, 6), datetime.date(2021, 4, 7)},
+    }
+
+    assert planner.plan_requests(missing_dates_by_symbol, fetch_limit=2) == [
+        (["AAPL"], datetime.date(2021, 4, 5), datetime.date(2021, 4, 6)),
+        (["MSFT"], datetime.date(2021, 4, 6), datetime.date(2021, 4, 7)),
+    ]
+
+
+def test_recent_dates_split_from_backfill():
+    today = datetime.date.today()
+    refresh_start_date = scheduler.refresh_start_date()
+    missing_dates = {
+        today - datetime.timedelta(days=days) for days in range(365, -1, -1)
+    }
+
+    requests = planner.plan_requests({"AAPL": missing_dates, "MSFT": missing_dates})
+
+    # The recent dates are a separate request, which comes first
+    assert planner.order_requests(requests) == [
+        (["AAPL", "MSFT"], refresh_start_date, today),
+        (
+            ["AAPL", "MSFT"],
+            today - datetime.timedelta(days=365),
+            refresh_start_date - datetime.timedelta(days=1),
+        ),
+    ]
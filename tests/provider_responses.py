@@ -0,0 +1,34 @@
+import datetime
+import json
+
+
+def eod_response(request, context):
+    # Answers /eod requests of MarketStack with a price for every business day
+    # of every symbol, on a single page
+    params = request.qs
+    start_date = datetime.date.fromisoformat(params["date_from"][0])
+    end_date = datetime.date.fromisoformat(params["date_to"][0])
+
+    prices = [
+        {
+            "close": 10.0,
+            "symbol": symbol.upper(),
+            "exchange": "XNAS",
+            "date": f"{start_date + datetime.timedelta(days=day)}T00:00:00+0000",
+        }
+        for symbol in params["symbols"][0].split(",")
+        for day in range((end_date - start_date).days + 1)
+        if (start_date + datetime.timedelta(days=day)).weekday() < 5
+    ]
+
+    return json.dumps(
+        {
+            "pagination": {
+                "limit": 1000,
+                "offset": 0,
+                "count": len(prices),
+                "total": len(prices),
+            },
+            "data": prices,
+        }
+    )
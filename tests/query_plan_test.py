@@ -0,0 +1,117 @@
+import datetime
+
+import pytest
+import sqlalchemy as sa
+
+from market_data_loader import conversion, currency, stock, trading_calendar
+
+SYMBOLS = ["AAPL", "MSFT"]
+START_DATE = datetime.date(2021, 4, 5)
+END_DATE = datetime.date(2021, 4, 9)
+
+STOCK_PRICES_PLAN = (
+    "SEARCH stock_prices USING PRIMARY KEY (symbol=? AND date>? AND date<?)"
+)
+CURRENCY_RATES_PLAN = (
+    "SEARCH currency_rates USING PRIMARY KEY "
+    "(base_currency=? AND target_currency=? AND date>? AND date<?)"
+)
+
+
+def _query_plans(db_sessionmaker, query_fn):
+    # Runs the query function and returns the SQLite query plans of the
+    # statements it executed
+    engine = db_sessionmaker.kw["bind"]
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    sa.event.listen(engine, "before_cursor_execute", record)
+
+    try:
+        query_fn(db_sessionmaker)
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", record)
+
+    with engine.connect() as connection:
+        return [
+            [
+                row[3]
+                for row in connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+            ]
+            for statement, parameters in statements
+        ]
+
+
+def _query_holidays(db_sessionmaker):
+    with db_sessionmaker.begin() as session:
+        trading_calendar.query_holidays(session, ["XNAS"], START_DATE, END_DATE)
+
+
+@pytest.mark.parametrize(
+    "query_fn,expected_plan",
+    [
+        (
+            lambda db: stock._query_cached_dates(db, SYMBOLS, START_DATE, END_DATE),
+            [STOCK_PRICES_PLAN],
+        ),
+        (
+            lambda db: stock._read_stock_prices_as_dataframe(
+                db, SYMBOLS, START_DATE, END_DATE
+            ),
+            [STOCK_PRICES_PLAN],
+        ),
+        (
+            lambda db: list(
+                conversion._iter_stock_prices(db, SYMBOLS, START_DATE, END_DATE, 10)
+            ),
+            [STOCK_PRICES_PLAN],
+        ),
+        (
+            lambda db: stock._query_excluded_dates(db, SYMBOLS, START_DATE, END_DATE),
+            [
+                "SEARCH excluded_dates USING PRIMARY KEY "
+                "(symbol=? AND date>? AND date<?)"
+            ],
+        ),
+        (
+            _query_holidays,
+            [
+                "SEARCH exchange_holidays USING PRIMARY KEY "
+                "(exchange=? AND date>? AND date<?)"
+            ],
+        ),
+        (
+            lambda db: currency._query_cached_dates(
+                db, "EUR", "USD", START_DATE, END_DATE
+            ),
+            [CURRENCY_RATES_PLAN],
+        ),
+        (
+            lambda db: currency._read_currency_rates_as_dataframe(
+                db, "EUR", "USD", START_DATE, END_DATE
+            ),
+            [CURRENCY_RATES_PLAN],
+        ),
+        (
+            # The rates of every price are looked up by their full key, and
+            # the prices are read in the order of the result
+            lambda db: conversion.query_converted_stock_price_rows(
+                db, SYMBOLS, START_DATE, END_DATE, "GBP"
+            ),
+            [
+                STOCK_PRICES_PLAN,
+                "SEARCH currency_rates_2 USING PRIMARY KEY "
+                "(base_currency=? AND target_currency=? AND date=?) LEFT-JOIN",
+                "SEARCH currency_rates_1 USING PRIMARY KEY "
+                "(base_currency=? AND target_currency=? AND date=?) LEFT-JOIN",
+            ],
+        ),
+    ],
+)
+def test_query_plan(db_sessionmaker, query_fn, expected_plan):
+    assert _query_plans(db_sessionmaker, query_fn) == [expected_plan]
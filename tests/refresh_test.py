@@ -0,0 +1,138 @@
+import datetime
+import json
+import random
+import threading
+
+import pytest
+
+from market_data_loader import refresh
+from market_data_loader.models import CurrencyRate, RefreshState, StockPrice
+from tests import provider_responses
+
+
+def _currency_rate_response(request, context):
+    return json.dumps(
+        {
+            "date": request.path.rsplit("/", 1)[1],
+            "base": "EUR",
+            "rates": {"USD": 1.25, "GBP": 0.75},
+        }
+    )
+
+
+def test_refresh_loads_only_new_dates(requests_mock, db_sessionmaker):
+    eod = requests_mock.get(
+        "http://api.marketstack.com/v1/eod", text=provider_responses.eod_response
+    )
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/symbols",
+        text=json.dumps({"symbols": {"USD": "", "GBP": ""}}),
+    )
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/timeseries",
+        text=lambda request, context: json.dumps(
+            {
+                "base": "EUR",
+                "rates": {
+                    f"{datetime.date(2021, 4, 1) + datetime.timedelta(days=day)}": {
+                        "USD": 1.25,
+                        "GBP": 0.75,
+                    }
+                    for day in range(7)
+                },
+            }
+        ),
+    )
+    currency_rate = requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/2021-04-08", text=_currency_rate_response
+    )
+
+    num_symbols = refresh.refresh(
+        db_sessionmaker,
+        ["AAPL", "MSFT"],
+        "GBP",
+        end_date=datetime.date(2021, 4, 7),
+        initial_start_date=datetime.date(2021, 4, 1),
+    )
+
+    assert num_symbols == 2
+    assert eod.call_count == 1
+
+    # Nothing new to load
+    assert (
+        refresh.refresh(
+            db_sessionmaker, ["AAPL", "MSFT"], "GBP", end_date=datetime.date(2021, 4, 7)
+        )
+        == 0
+    )
+    assert eod.call_count == 1
+
+    # The next day is fetched for both symbols with a single request
+    refresh.refresh(
+        db_sessionmaker, ["AAPL", "MSFT"], "GBP", end_date=datetime.date(2021, 4, 8)
+    )
+
+    assert eod.call_count == 2
+    assert eod.last_request.qs["date_from"] == ["2021-04-08"]
+    assert eod.last_request.qs["symbols"] == ["aapl,msft"]
+    assert currency_rate.call_count == 1
+
+    with db_sessionmaker.begin() as session:
+        assert session.query(StockPrice).count() == 12
+        assert (
+            session.query(CurrencyRate)
+            .filter_by(date=datetime.date(2021, 4, 8))
+            .count()
+            == 2
+        )
+        assert {
+            (row.symbol, row.currency, row.last_loaded_date)
+            for row in session.query(RefreshState)
+        } == {
+            ("AAPL", "GBP", datetime.date(2021, 4, 8)),
+            ("MSFT", "GBP", datetime.date(2021, 4, 8)),
+        }
+
+
+def test_next_run_time():
+    run_times = [datetime.time(6, 0), datetime.time(18, 0)]
+
+    assert refresh.next_run_time(
+        datetime.datetime(2021, 4, 8, 12, 0), run_times
+    ) == datetime.datetime(2021, 4, 8, 18, 0)
+    assert refresh.next_run_time(
+        datetime.datetime(2021, 4, 8, 18, 0), run_times
+    ) == datetime.datetime(2021, 4, 9, 6, 0)
+
+    run_time = refresh.next_run_time(
+        datetime.datetime(2021, 4, 8, 12, 0), run_times, 300, random.Random(0)
+    )
+
+    assert datetime.datetime(2021, 4, 8, 18, 0) < run_time
+    assert run_time <= datetime.datetime(2021, 4, 8, 18, 5)
+
+
+@pytest.mark.parametrize(
+    "error", [RuntimeError("Provider unavailable"), KeyError("date")]
+)
+def test_daemon_keeps_running_after_failed_refresh(error):
+    stop_event = threading.Event()
+    calls = []
+
+    def refresh_fn():
+        calls.append(len(calls))
+
+        if len(calls) == 1:
+            raise error
+
+        stop_event.set()
+
+    # The clock is always just before the run time
+    refresh.run_daemon(
+        refresh_fn,
+        [datetime.time(6, 0)],
+        stop_event=stop_event,
+        clock=lambda: datetime.datetime(2021, 4, 8, 5, 59, 59, 999000),
+    )
+
+    assert calls == [0, 1]
@@ -0,0 +1,173 @@
+import datetime
+import json
+import pathlib
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+
+from market_data_loader import currency, models, replay, response_store, stock
+from market_data_loader.models import CurrencyRate, StockPrice
+from tests.currency_test import _currency_rate_response, _timeseries_response
+from tests.stock_test import _eod_response
+
+START_DATE = datetime.date(2021, 4, 5)
+END_DATE = datetime.date(2021, 4, 16)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv(response_store.RESPONSE_STORE_ENV, str(tmp_path))
+    monkeypatch.delenv(response_store.REPLAY_ENV, raising=False)
+
+    return response_store.get_store()
+
+
+@pytest.fixture
+def other_db_sessionmaker():
+    engine = sa.create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=sa.pool.StaticPool,
+    )
+    models.Base.metadata.create_all(engine)
+
+    yield orm.sessionmaker(bind=engine, expire_on_commit=False)
+
+    engine.dispose()
+
+
+def _mock_providers(requests_mock):
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        text=_eod_response(
+            [
+                ("AAPL", "2021-04-05", 10.1),
+                ("MSFT", "2021-04-05", 20.2),
+                ("AAPL", "2021-04-06", 11.1),
+                ("MSFT", "2021-04-06", 21.2),
+            ]
+        ),
+    )
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/symbols",
+        text=json.dumps({"symbols": {"USD": "", "GBP": ""}}),
+    )
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/timeseries",
+        text=_timeseries_response(START_DATE, END_DATE),
+    )
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/2021-04-19",
+        text=_currency_rate_response("2021-04-19"),
+    )
+
+
+def _load(db_sessionmaker):
+    stock_prices_df = stock.get_stock_prices_batch(
+        db_sessionmaker,
+        ["AAPL", "MSFT"],
+        datetime.date(2021, 4, 5),
+        datetime.date(2021, 4, 6),
+    )
+
+    currency._fill_missing_dates(
+        db_sessionmaker,
+        [START_DATE + datetime.timedelta(days=day) for day in range(12)],
+        "USD",
+        "GBP",
+    )
+    currency._fill_missing_dates(
+        db_sessionmaker, [datetime.date(2021, 4, 19)], "USD", "GBP"
+    )
+
+    return stock_prices_df
+
+
+def _rows(db_sessionmaker, model):
+    with db_sessionmaker.begin() as session:
+        return sorted(
+            tuple(getattr(row, column.name) for column in model.__table__.columns)
+            for row in session.query(model)
+        )
+
+
+def test_responses_recorded_without_access_key(requests_mock, db_sessionmaker, store):
+    _mock_providers(requests_mock)
+
+    _load(db_sessionmaker)
+
+    responses = list(store.iter_responses())
+
+    assert sorted(url for url, _, _ in responses) == [
+        "http://api.exchangeratesapi.io/v1/2021-04-19",
+        "http://api.exchangeratesapi.io/v1/symbols",
+        "http://api.exchangeratesapi.io/v1/timeseries",
+        "http://api.marketstack.com/v1/eod",
+    ]
+
+    for _, params, content in responses:
+        assert not "access_key" in params
+        assert content.startswith(b"{")
+
+    for path in (pathlib.Path(store.root) / "objects").rglob("*.gz"):
+        assert path.read_bytes()[:2] == b"\x1f\x8b"
+
+    # The same response is stored once
+    store.put("http://api.example.com/v1/other", {}, responses[0][2])
+
+    assert len(list((pathlib.Path(store.root) / "requests").rglob("*.json"))) == 5
+    assert len(list((pathlib.Path(store.root) / "objects").rglob("*.gz"))) == 4
+
+
+def test_replay_without_network(
+    requests_mock, db_sessionmaker, other_db_sessionmaker, store, monkeypatch
+):
+    _mock_providers(requests_mock)
+
+    recorded_df = _load(db_sessionmaker)
+    num_requests = requests_mock.call_count
+
+    monkeypatch.setenv(response_store.REPLAY_ENV, "1")
+
+    replayed_df = _load(other_db_sessionmaker)
+
+    assert requests_mock.call_count == num_requests
+    assert replayed_df.equals(recorded_df)
+    assert _rows(other_db_sessionmaker, CurrencyRate) == _rows(
+        db_sessionmaker, CurrencyRate
+    )
+
+    # Requests that were never recorded fail instead of going to the network
+    with pytest.raises(RuntimeError, match="No stored response"):
+        stock.get_stock_prices(
+            other_db_sessionmaker,
+            "AAPL",
+            datetime.date(2021, 5, 3),
+            datetime.date(2021, 5, 4),
+        )
+
+    assert requests_mock.call_count == num_requests
+
+
+def test_rebuild_from_store(
+    requests_mock, db_sessionmaker, other_db_sessionmaker, store
+):
+    _mock_providers(requests_mock)
+
+    _load(db_sessionmaker)
+
+    counts = replay.rebuild_from_store(other_db_sessionmaker, store, batch_size=3)
+
+    assert counts == {"responses": 4, "stock_prices": 4, "currency_rates": 26}
+    assert _rows(other_db_sessionmaker, StockPrice) == _rows(
+        db_sessionmaker, StockPrice
+    )
+    assert _rows(other_db_sessionmaker, CurrencyRate) == _rows(
+        db_sessionmaker, CurrencyRate
+    )
+
+    # Re-running keeps the rows
+    replay.rebuild_from_store(other_db_sessionmaker, store)
+
+    assert len(_rows(other_db_sessionmaker, StockPrice)) == 4
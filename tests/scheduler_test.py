@@ -0,0 +1,288 @@
+import datetime
+import json
+import threading
+import time
+
+import pytest
+
+from market_data_loader import scheduler, stock
+from market_data_loader.models import StockPrice
+
+TODAY = datetime.date.today()
+
+
+class SimulatedProvider:
+    # Serves the /eod endpoint of MarketStack for any symbols and business
+    # days, and enforces a rate limit like the real provider does. Every
+    # request is recorded.
+
+    def __init__(self, rate, burst):
+        self.requests = []
+        self.num_rejected = 0
+
+        self._bucket = scheduler.TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+
+    def eod(self, request, context):
+        params = request.qs
+
+        with self._lock:
+            # The provider doesn't wait, requests above the rate are rejected
+            self._bucket._refill()
+
+            if self._bucket._tokens < 1:
+                self.num_rejected += 1
+                context.status_code = 429
+                return json.dumps({"error": {"message": "Rate limit reached"}})
+
+            self._bucket._tokens -= 1
+
+        symbols = [symbol.upper() for symbol in params["symbols"][0].split(",")]
+        start_date = datetime.date.fromisoformat(params["date_from"][0])
+        end_date = datetime.date.fromisoformat(params["date_to"][0])
+        limit = int(params["limit"][0])
+        offset = int(params["offset"][0])
+
+        prices = [
+            {
+                "close": 10.0,
+                "symbol": symbol,
+                "exchange": "XNAS",
+                "date": f"{date}T00:00:00+0000",
+            }
+            for symbol in symbols
+            for date in _business_days(start_date, end_date)
+        ]
+
+        with self._lock:
+            self.requests.append((symbols, start_date, end_date))
+
+        return json.dumps(
+            {
+                "pagination": {
+                    "limit": limit,
+                    "offset": offset,
+                    "count": len(prices[offset : offset + limit]),
+                    "total": len(prices),
+                },
+                "data": prices[offset : offset + limit],
+            }
+        )
+
+
+def _business_days(start_date, end_date):
+    return [
+        start_date + datetime.timedelta(days=day)
+        for day in range((end_date - start_date).days + 1)
+        if (start_date + datetime.timedelta(days=day)).weekday() < 5
+    ]
+
+
+def _settings(**settings):
+    return dict(
+        scheduler.DEFAULT_SETTINGS,
+        **dict({"marketstack_rate": 0, "exchangeratesapi_rate": 0}, **settings),
+    )
+
+
+@pytest.fixture
+def simulated_provider(requests_mock):
+    provider = SimulatedProvider(rate=20, burst=2)
+
+    requests_mock.get("http://api.marketstack.com/v1/eod", text=provider.eod)
+
+    return provider
+
+
+def test_token_bucket_paces_acquisitions():
+    bucket = scheduler.TokenBucket(rate=50, capacity=2)
+
+    start_time = time.monotonic()
+
+    for _ in range(6):
+        bucket.acquire()
+
+    # The first two tokens are available right away
+    assert time.monotonic() - start_time >= 4 / 50 * 0.9
+
+
+def test_token_bucket_serves_refresh_before_backfill():
+    bucket = scheduler.TokenBucket(rate=20, capacity=1)
+    bucket.acquire()
+
+    acquired = []
+
+    def acquire(priority):
+        bucket.acquire(priority)
+        acquired.append(priority)
+
+    backfill = threading.Thread(target=acquire, args=(scheduler.BACKFILL,))
+    backfill.start()
+    time.sleep(0.01)
+
+    refresh = threading.Thread(target=acquire, args=(scheduler.REFRESH,))
+    refresh.start()
+
+    backfill.join()
+    refresh.join()
+
+    assert acquired == [scheduler.REFRESH, scheduler.BACKFILL]
+
+
+def test_quota_keeps_share_for_refreshes(db_sessionmaker):
+    settings = _settings(marketstack_monthly_quota=4, backfill_share=0.5)
+    scheduler.configure(db_sessionmaker, settings)
+
+    with scheduler.priority(scheduler.BACKFILL):
+        scheduler.acquire("marketstack")
+        scheduler.acquire("marketstack")
+
+        with pytest.raises(scheduler.QuotaExceeded):
+            scheduler.acquire("marketstack")
+
+    scheduler.acquire("marketstack")
+    scheduler.acquire("marketstack")
+
+    with pytest.raises(scheduler.QuotaExceeded):
+        scheduler.acquire("marketstack")
+
+    # The usage is kept in the database
+    scheduler.configure(db_sessionmaker, settings)
+
+    with pytest.raises(scheduler.QuotaExceeded):
+        scheduler.acquire("marketstack")
+
+    assert scheduler.usage_stats()["marketstack"]["requests"] == 4
+
+
+def test_backfill_ending_today_stops_at_its_quota_share(
+    simulated_provider, db_sessionmaker
+):
+    scheduler.configure(
+        db_sessionmaker, _settings(marketstack_monthly_quota=2, backfill_share=0.5)
+    )
+
+    refresh_dates = _business_days(scheduler.refresh_start_date(), TODAY)
+
+    fetch_queue = stock.FetchQueue(db_sessionmaker)
+    fetch_queue.add(["AAPL"], datetime.date(2021, 1, 4), TODAY)
+
+    with pytest.raises(scheduler.QuotaExceeded):
+        fetch_queue.run()
+
+    # Only the recent dates of the range were fetched as a refresh
+    assert simulated_provider.requests == [
+        (["AAPL"], refresh_dates[0], refresh_dates[-1])
+    ]
+
+
+def test_memory_usage_added_to_database(db_sessionmaker):
+    # Worker processes without a quota count their requests in memory, and
+    # the loading process adds them to the persisted usage
+    scheduler.configure(settings=_settings())
+
+    assert not scheduler.has_monthly_quota()
+
+    scheduler.acquire("marketstack")
+    scheduler.acquire("marketstack")
+
+    usage = scheduler.take_usage()
+    period = scheduler.usage_stats()["marketstack"]["period"]
+
+    assert usage == {("marketstack", period): 2}
+    assert scheduler.take_usage() == {}
+
+    scheduler.configure(db_sessionmaker, _settings(marketstack_monthly_quota=10))
+
+    assert scheduler.has_monthly_quota()
+    assert scheduler.take_usage() == {}
+
+    scheduler.add_usage(usage)
+    scheduler.acquire("marketstack")
+
+    assert scheduler.usage_stats()["marketstack"]["requests"] == 3
+
+def test_priority_for():
+    assert scheduler.priority_for(TODAY) == scheduler.REFRESH
+    assert (
+        scheduler.priority_for(TODAY - datetime.timedelta(days=scheduler.REFRESH_DAYS))
+        == scheduler.REFRESH
+    )
+    assert scheduler.priority_for(datetime.date(2021, 4, 8)) == scheduler.BACKFILL
+
+
+def test_fetch_queue_coalesces_and_orders_fetches(simulated_provider, db_sessionmaker):
+    scheduler.configure(
+        db_sessionmaker, _settings(marketstack_rate=15, marketstack_burst=2)
+    )
+
+    refresh_dates = _business_days(
+        TODAY - datetime.timedelta(days=7), TODAY - datetime.timedelta(days=1)
+    )
+    refresh_start_date, refresh_end_date = refresh_dates[0], refresh_dates[-1]
+
+    fetch_queue = stock.FetchQueue(db_sessionmaker)
+    fetch_queue.add(
+        ["AAPL", "MSFT"], datetime.date(2021, 1, 4), datetime.date(2021, 3, 31)
+    )
+    fetch_queue.add(["AAPL"], datetime.date(2021, 4, 1), datetime.date(2021, 4, 30))
+    fetch_queue.add(["AAPL", "MSFT"], refresh_start_date, refresh_end_date)
+    fetch_queue.run()
+
+    # The recent dates are fetched first, and the backfills of both symbols
+    # share a single request
+    assert simulated_provider.requests == [
+        (["AAPL", "MSFT"], refresh_start_date, refresh_end_date),
+        (["AAPL", "MSFT"], datetime.date(2021, 1, 4), datetime.date(2021, 4, 30)),
+    ]
+    assert simulated_provider.num_rejected == 0
+
+    with db_sessionmaker.begin() as session:
+        assert session.query(StockPrice).count() == (
+            2 * len(_business_days(refresh_start_date, refresh_end_date))
+            + 2
+            * len(_business_days(datetime.date(2021, 1, 4), datetime.date(2021, 3, 31)))
+            + len(_business_days(datetime.date(2021, 4, 1), datetime.date(2021, 4, 30)))
+        )
+
+
+def test_rate_limit_of_provider_is_respected(simulated_provider, db_sessionmaker):
+    scheduler.configure(
+        db_sessionmaker, _settings(marketstack_rate=15, marketstack_burst=2)
+    )
+
+    # A request per symbol, as their missing dates don't overlap
+    fetch_queue = stock.FetchQueue(db_sessionmaker, concurrency=4)
+
+    for index in range(6):
+        start_date = datetime.date(2000 + 4 * index, 1, 3)
+        date = _business_days(start_date, start_date + datetime.timedelta(days=6))[0]
+        fetch_queue.add([f"SYM{index}"], date, date)
+
+    fetch_queue.run()
+
+    assert len(simulated_provider.requests) == 6
+    assert simulated_provider.num_rejected == 0
+
+
+def test_backfill_stops_at_its_quota_share(simulated_provider, db_sessionmaker):
+    scheduler.configure(
+        db_sessionmaker, _settings(marketstack_monthly_quota=2, backfill_share=0.5)
+    )
+
+    refresh_dates = _business_days(
+        TODAY - datetime.timedelta(days=7), TODAY - datetime.timedelta(days=1)
+    )
+    refresh_start_date, refresh_end_date = refresh_dates[0], refresh_dates[-1]
+
+    fetch_queue = stock.FetchQueue(db_sessionmaker)
+    fetch_queue.add(["AAPL"], datetime.date(2021, 1, 4), datetime.date(2021, 3, 31))
+    fetch_queue.add(["AAPL"], refresh_start_date, refresh_end_date)
+
+    with pytest.raises(scheduler.QuotaExceeded):
+        fetch_queue.run()
+
+    # The refresh was fetched before the backfill ran out of quota
+    assert simulated_provider.requests == [
+        (["AAPL"], refresh_start_date, refresh_end_date)
+    ]
@@ -0,0 +1,147 @@
+import datetime
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from market_data_loader import frame_cache, server
+
+# The dates of the 'cached_db_sessionmaker' fixture
+DATES = [datetime.date(2021, 4, 8), datetime.date(2021, 4, 9)]
+
+
+@pytest.fixture
+def server_url(cached_db_sessionmaker):
+    http_server = server.Server(("127.0.0.1", 0), cached_db_sessionmaker)
+    thread = threading.Thread(target=http_server.serve_forever)
+    thread.start()
+
+    yield "http://%s:%d" % http_server.server_address[:2]
+
+    http_server.shutdown()
+    thread.join()
+    http_server.server_close()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, response.headers, response.read().decode()
+    except urllib.error.HTTPError as err:
+        return err.code, err.headers, err.read().decode()
+
+
+def test_prices_json(requests_mock, server_url):
+    status, headers, body = _get(
+        f"{server_url}/prices?symbols=AAPL,MSFT&currency=GBP"
+        f"&start_date={DATES[0]}&end_date={DATES[-1]}"
+    )
+
+    assert status == 200
+    assert headers["Content-Type"] == "application/json"
+    assert "Server-Timing" in headers
+    assert requests_mock.call_count == 0
+
+    prices = json.loads(body)
+
+    assert [price["date"] for price in prices] == [str(date) for date in DATES] * 2
+    assert [price["symbol"] for price in prices] == ["AAPL", "AAPL", "MSFT", "MSFT"]
+    assert [price["close_price"] for price in prices] == pytest.approx(
+        [6.0, 6.6, 12.0, 12.6]
+    )
+
+
+def test_prices_csv(requests_mock, server_url):
+    status, headers, body = _get(
+        f"{server_url}/prices?symbol=AAPL&currency=USD"
+        f"&start_date={DATES[0]}&end_date={DATES[-1]}&format=csv"
+    )
+
+    assert status == 200
+    assert headers["Content-Type"] == "text/csv"
+    assert body.splitlines() == [
+        "date,symbol,currency,close_price",
+        "2021-04-08,AAPL,USD,10.0",
+        "2021-04-09,AAPL,USD,11.0",
+    ]
+
+
+def test_bad_request(server_url):
+    status, _, body = _get(f"{server_url}/prices?symbol=AAPL")
+
+    assert status == 400
+    assert json.loads(body) == {"error": "Missing parameter 'currency'"}
+
+    status, _, _ = _get(f"{server_url}/unknown")
+
+    assert status == 404
+
+
+def test_stats(server_url):
+    _get(f"{server_url}/health")
+
+    status, _, body = _get(f"{server_url}/stats")
+
+    assert status == 200
+    assert json.loads(body)["requests"]["/health"]["count"] == 1
+
+
+def test_currency_is_case_insensitive(requests_mock, server_url):
+    status, _, body = _get(
+        f"{server_url}/prices?symbol=AAPL&currency=gbp"
+        f"&start_date={DATES[0]}&end_date={DATES[-1]}"
+    )
+
+    assert status == 200
+    assert [price["currency"] for price in json.loads(body)] == ["GBP", "GBP"]
+
+
+def test_unsupported_currency(requests_mock, server_url):
+    requests_mock.get(
+        "http://api.exchangeratesapi.io/v1/symbols",
+        text=json.dumps({"symbols": {"USD": "", "GBP": ""}}),
+    )
+
+    status, _, body = _get(
+        f"{server_url}/prices?symbol=AAPL&currency=XYZ"
+        f"&start_date={DATES[0]}&end_date={DATES[-1]}"
+    )
+
+    assert status == 400
+    assert json.loads(body) == {"error": "Target currency 'XYZ' is not supported"}
+
+
+def test_internal_error(server_url, monkeypatch):
+    def fail(*args):
+        raise KeyError("close")
+
+    monkeypatch.setattr(server.conversion, "get_converted_stock_prices", fail)
+
+    status, _, body = _get(f"{server_url}/prices?symbol=AAPL&currency=GBP")
+
+    assert status == 500
+    assert json.loads(body) == {"error": "Internal server error"}
+
+    _, _, body = _get(f"{server_url}/stats")
+
+    assert json.loads(body)["requests"]["/prices"]["count"] == 1
+
+
+def test_prices_served_from_frame_cache(requests_mock, server_url):
+    frame_cache.CACHE.clear()
+    initial_stats = frame_cache.CACHE.stats()
+
+    for _ in range(3):
+        _get(
+            f"{server_url}/prices?symbols=AAPL,MSFT&currency=GBP"
+            f"&start_date={DATES[0]}&end_date={DATES[-1]}"
+        )
+
+    _, _, body = _get(f"{server_url}/stats")
+    stats = json.loads(body)["frame_cache"]
+
+    # The two symbols and two currency legs are only read by the first request
+    assert stats["misses"] - initial_stats["misses"] == 4
+    assert stats["hits"] - initial_stats["hits"] == 8
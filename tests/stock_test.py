@@ -0,0 +1,238 @@
+import datetime
+import json
+
+from market_data_loader import stock, trading_calendar
+from market_data_loader.models import ExcludedDate, StockPrice, StockPriceCoverage
+
+
+def _eod_response(rows):
+    return json.dumps(
+        {
+            "pagination": {
+                "limit": 1000,
+                "offset": 0,
+                "count": len(rows),
+                "total": len(rows),
+            },
+            "data": [
+                {
+                    "close": close,
+                    "symbol": symbol,
+                    "exchange": "XNAS",
+                    "date": f"{date}T00:00:00+0000",
+                }
+                for symbol, date, close in rows
+            ],
+        }
+    )
+
+
+def test_batch_shares_request(requests_mock, db_sessionmaker):
+    start_date = datetime.date(2021, 4, 5)
+    end_date = datetime.date(2021, 4, 6)
+
+    eod = requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        text=_eod_response(
+            [
+                ("AAPL", "2021-04-05", 10.1),
+                ("MSFT", "2021-04-05", 20.2),
+                ("AAPL", "2021-04-06", 11.1),
+                ("MSFT", "2021-04-06", 21.2),
+            ]
+        ),
+    )
+
+    stock_prices_df = stock.get_stock_prices_batch(
+        db_sessionmaker, ["AAPL", "MSFT"], start_date, end_date
+    )
+
+    assert eod.call_count == 1
+    assert eod.last_request.qs["symbols"] == ["aapl,msft"]
+
+    assert list(stock_prices_df["symbol"]) == ["AAPL", "AAPL", "MSFT", "MSFT"]
+    assert list(stock_prices_df["close_price"]) == [10.1, 11.1, 20.2, 21.2]
+
+    # Everything is cached now
+    stock.get_stock_prices_batch(
+        db_sessionmaker, ["AAPL", "MSFT"], start_date, end_date
+    )
+
+    assert eod.call_count == 1
+
+
+def test_batch_excludes_dates_per_symbol(requests_mock, db_sessionmaker):
+    start_date = datetime.date(2021, 4, 5)
+    end_date = datetime.date(2021, 4, 6)
+
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        text=_eod_response(
+            [
+                ("AAPL", "2021-04-05", 10.1),
+                ("AAPL", "2021-04-06", 11.1),
+                ("MSFT", "2021-04-06", 21.2),
+            ]
+        ),
+    )
+
+    stock.get_stock_prices_batch(
+        db_sessionmaker, ["AAPL", "MSFT"], start_date, end_date
+    )
+
+    with db_sessionmaker.begin() as session:
+        excluded = session.query(ExcludedDate.symbol, ExcludedDate.date).all()
+        num_prices = session.query(StockPrice).count()
+
+    assert excluded == [("MSFT", datetime.date(2021, 4, 5))]
+    assert num_prices == 3
+
+
+def test_covered_range_skips_cache_scan(requests_mock, db_sessionmaker, monkeypatch):
+    # Thursday to Friday
+    start_date = datetime.date(2021, 4, 8)
+    end_date = datetime.date(2021, 4, 9)
+
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        text=_eod_response(
+            [
+                ("AAPL", "2021-04-08", 10.1),
+                ("AAPL", "2021-04-09", 11.1),
+            ]
+        ),
+    )
+
+    stock.get_stock_prices(db_sessionmaker, "AAPL", start_date, end_date)
+
+    with db_sessionmaker.begin() as session:
+        intervals = session.query(
+            StockPriceCoverage.start_date, StockPriceCoverage.end_date
+        ).all()
+
+    # Extended over the following weekend
+    assert intervals == [(start_date, datetime.date(2021, 4, 11))]
+
+    def fail(*args):
+        raise AssertionError("cached dates queried")
+
+    monkeypatch.setattr(stock, "_query_cached_dates", fail)
+
+    stock_prices_df = stock.get_stock_prices(
+        db_sessionmaker, "AAPL", start_date, datetime.date(2021, 4, 10)
+    )
+
+    assert list(stock_prices_df["close_price"]) == [10.1, 11.1]
+
+
+def test_holidays_not_fetched_or_excluded(requests_mock, db_sessionmaker):
+    start_date = datetime.date(2021, 4, 1)
+    end_date = datetime.date(2021, 4, 6)
+
+    with db_sessionmaker.begin() as session:
+        trading_calendar.seed_holidays(session)
+
+    eod = requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        text=_eod_response(
+            [
+                ("AAPL", "2021-04-01", 10.1),
+                ("AAPL", "2021-04-05", 11.1),
+                ("AAPL", "2021-04-06", 12.1),
+            ]
+        ),
+    )
+
+    stock.get_stock_prices(db_sessionmaker, "AAPL", start_date, end_date)
+
+    with db_sessionmaker.begin() as session:
+        assert session.query(ExcludedDate).count() == 0
+
+    # Good Friday is known to be a holiday, so nothing is missing
+    cached_dates = stock._query_cached_dates(
+        db_sessionmaker, ["AAPL"], start_date, end_date
+    )
+
+    assert (
+        stock._find_missing_dates(
+            db_sessionmaker, ["AAPL"], cached_dates, start_date, end_date
+        )
+        == {}
+    )
+
+
+def test_fill_invalidates_cached_prices(requests_mock, db_sessionmaker):
+    start_date = datetime.date(2021, 4, 8)
+    end_date = datetime.date(2021, 4, 9)
+
+    requests_mock.get(
+        "http://api.marketstack.com/v1/eod",
+        text=_eod_response([("AAPL", "2021-04-09", 11.1)]),
+    )
+
+    # Nothing is loaded yet, but an empty result is cached for the range
+    stock_prices_df = stock._query_stock_prices_as_dataframe(
+        db_sessionmaker, ["AAPL"], start_date, end_date
+    )
+
+    assert stock_prices_df.empty
+
+    stock.get_stock_prices(db_sessionmaker, "AAPL", end_date, end_date)
+
+    stock_prices_df = stock._query_stock_prices_as_dataframe(
+        db_sessionmaker, ["AAPL"], start_date, end_date
+    )
+
+    assert list(stock_prices_df["close_price"]) == [11.1]
+
+
+def test_stock_price_rows():
+    prices = json.loads(
+        _eod_response(
+            [
+                ("AAPL", "2021-04-06", 10.2),
+                ("MSFT", "2021-04-05", 20.1),
+                ("AAPL", "2021-04-05", 10.1),
+                # Duplicates and prices of dates that aren't missing are skipped
+                ("AAPL", "2021-04-05", 10.9),
+                ("MSFT", "2021-04-06", 20.2),
+                ("TSLA", "2021-04-05", 30.1),
+            ]
+        )
+    )["data"]
+    # The date is the calendar day of the exchange, whatever the offset
+    prices[0]["date"] = "2021-04-06T00:00:00-0400"
+
+    missing_dates_by_symbol = {
+        "AAPL": {datetime.date(2021, 4, 5), datetime.date(2021, 4, 6)},
+        "MSFT": {datetime.date(2021, 4, 5), datetime.date(2021, 4, 7)},
+    }
+
+    columns = stock._price_columns(prices)
+
+    assert stock._stock_price_rows(columns, missing_dates_by_symbol) == [
+        {
+            "date": datetime.date(2021, 4, 6),
+            "symbol": "AAPL",
+            "close_price": 10.2,
+            "exchange": "XNAS",
+        },
+        {
+            "date": datetime.date(2021, 4, 5),
+            "symbol": "MSFT",
+            "close_price": 20.1,
+            "exchange": "XNAS",
+        },
+        {
+            "date": datetime.date(2021, 4, 5),
+            "symbol": "AAPL",
+            "close_price": 10.1,
+            "exchange": "XNAS",
+        },
+    ]
+    assert missing_dates_by_symbol == {
+        "AAPL": set(),
+        "MSFT": {datetime.date(2021, 4, 7)},
+    }
+
+    assert stock._stock_price_rows(stock._price_columns([]), {"AAPL": set()}) == []
@@ -0,0 +1,94 @@
+import datetime
+
+from market_data_loader import stock, trading_calendar
+from market_data_loader.models import ExchangeHoliday
+
+
+def _price(symbol, date, exchange="XNAS"):
+    return {
+        "close": 10.1,
+        "symbol": symbol,
+        "exchange": exchange,
+        "date": f"{date}T00:00:00+0000",
+    }
+
+
+def _update(trading_dates, prices):
+    trading_dates.update_columns(stock._price_columns(prices))
+
+
+def test_holidays_learned_from_multiple_symbols():
+    trading_dates = trading_calendar.TradingDates()
+
+    # Good Friday is missing for both symbols
+    _update(
+        trading_dates,
+        [
+            _price("AAPL", "2021-04-01"),
+            _price("MSFT", "2021-04-01"),
+            _price("AAPL", "2021-04-05"),
+        ],
+    )
+    _update(trading_dates, [_price("MSFT", "2021-04-05")])
+
+    assert trading_dates.holiday_rows() == [
+        {"exchange": "XNAS", "date": datetime.date(2021, 4, 2)}
+    ]
+    assert sorted(
+        (row["symbol"], row["exchange"]) for row in trading_dates.symbol_exchange_rows()
+    ) == [("AAPL", "XNAS"), ("MSFT", "XNAS")]
+
+
+def test_holidays_not_learned_from_single_symbol():
+    trading_dates = trading_calendar.TradingDates()
+
+    _update(trading_dates, [_price("AAPL", "2021-04-01"), _price("AAPL", "2021-04-05")])
+
+    assert trading_dates.holiday_rows() == []
+
+
+def test_seed_holidays(db_sessionmaker):
+    with db_sessionmaker.begin() as session:
+        num_holidays = trading_calendar.seed_holidays(session)
+
+        holidays = trading_calendar.query_holidays(
+            session, ["XNYS"], datetime.date(2021, 1, 1), datetime.date(2021, 12, 31)
+        )
+
+        assert num_holidays == session.query(ExchangeHoliday).count()
+
+    assert sorted(holidays["XNYS"]) == [
+        datetime.date(2021, 1, 1),
+        datetime.date(2021, 1, 18),
+        datetime.date(2021, 2, 15),
+        datetime.date(2021, 4, 2),
+        datetime.date(2021, 5, 31),
+        datetime.date(2021, 7, 5),
+        datetime.date(2021, 9, 6),
+        datetime.date(2021, 11, 25),
+        datetime.date(2021, 12, 24),
+    ]
+
+
+def test_exchanges_learned_separately():
+    trading_dates = trading_calendar.TradingDates()
+
+    _update(
+        trading_dates,
+        [
+            _price("AAPL", "2021-04-01"),
+            _price("MSFT", "2021-04-01"),
+            _price("AAPL", "2021-04-05"),
+            _price("MSFT", "2021-04-05"),
+            _price("SAP", "2021-04-01", "XETR"),
+            # A symbol that moved keeps its last exchange
+            _price("SAP", "2021-04-06", "XFRA"),
+        ],
+    )
+
+    assert trading_dates.holiday_rows() == [
+        {"exchange": "XNAS", "date": datetime.date(2021, 4, 2)}
+    ]
+    assert sorted(
+        (row["symbol"], row["exchange"]) for row in trading_dates.symbol_exchange_rows()
+    ) == [("AAPL", "XNAS"), ("MSFT", "XNAS"), ("SAP", "XFRA")]